@@ -0,0 +1,328 @@
+"""执行器热点路径的基准测试。
+
+启动一个本地桩 HTTP 服务（可配置延迟、body 大小与状态码），通过 Flask test client 驱动应用：
+- 微基准：变量替换、模板渲染、curl 命令解析、响应头 / -v 轨迹解析、断言求值、单次 curl 脚本执行（每次调用的微秒数）
+- 批量：写入 N 行 CSV 后调用 /execute_batch，记录 rows/s 与峰值内存（运行期间进程 RSS 相对开始时的最大增量；
+  tracemalloc 会让吞吐下降一半左右，所以不用它）
+
+结果以 JSON 输出，可保存为基线，之后用 --compare 对比，超出容差时以退出码 1 结束：
+
+    python benchmarks/bench.py                          # 1000,10000,100000 行
+    python benchmarks/bench.py --rows 1000 --save-baseline
+    python benchmarks/bench.py --compare --tolerance 0.25
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import timeit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+# ==== 桩 HTTP 服务 ====
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """默认按服务端配置返回；查询参数 latency_ms / bytes / status 可覆盖单个请求"""
+    protocol_version = 'HTTP/1.1'
+
+    def _respond(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        config = self.server.config
+        query = parse_qs(urlsplit(self.path).query)
+        latency = float(query.get('latency_ms', [config['latency_ms']])[0]) / 1000
+        size = int(query.get('bytes', [config['body_bytes']])[0])
+        if 'status' in query:
+            status = int(query['status'][0])
+        else:
+            status = next(self.server.statuses)
+        if latency:
+            time.sleep(latency)
+        body = self.server.body(size)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = _respond
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, latency_ms: float = 0, body_bytes: int = 256, statuses=(200,)):
+        super().__init__(('127.0.0.1', 0), _StubHandler)
+        self.config = {'latency_ms': latency_ms, 'body_bytes': body_bytes}
+        self.statuses = itertools.cycle(statuses)
+        self._bodies = {}
+
+    def body(self, size: int) -> bytes:
+        # 合法的 JSON body，按大小缓存
+        data = self._bodies.get(size)
+        if data is None:
+            prefix = b'{"ok": true, "pad": "'
+            data = self._bodies[size] = prefix + b'x' * max(0, size - len(prefix) - 2) + b'"}'
+        return data
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+# ==== 微基准 ====
+
+def _per_call_us(fn, min_time: float = 0.2) -> float:
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    runs = max(1, int(min_time / max(timer.timeit(number) / number, 1e-9)))
+    return round(min(timer.repeat(repeat=3, number=runs)) / runs * 1e6, 3)
+
+
+def run_micro(ce, stub: StubServer, curl_runs: int = 20) -> dict:
+    url = stub.url
+    command = (f"curl -X POST '{url}/api/{{{{user}}}}?page={{{{page}}}}' -H 'Content-Type: application/json' "
+               f"-H 'Authorization: Bearer {{{{token}}}}' -d '{{\"name\": \"{{{{name}}}}\", \"tags\": {{{{tags}}}}}}'")
+    variables = {'user': 'u-42', 'page': 3, 'token': 'abc.def.ghi', 'name': 'alice', 'tags': ['a', 'b']}
+    rendered = ce.replace_variables(command, variables)
+    template = ce._compile_template(command)
+    header_text = ('HTTP/1.1 301 Moved Permanently\r\nLocation: /next\r\n\r\n'
+                   'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: 256\r\n'
+                   'X-Request-Id: 1234\r\nCache-Control: no-cache\r\n\r\n')
+    trace = ('*   Trying 127.0.0.1:8080...\n* Connected to 127.0.0.1\n> POST /api HTTP/1.1\n> Host: x\n>\n'
+             '< HTTP/1.1 200 OK\n< Content-Type: application/json\n< Content-Length: 256\n<\n'
+             '* Connection #0 left intact\n')
+    response = {'code': 200, 'headers': {'Content-Type': 'application/json'}, 'body': stub.body(1024).decode(),
+                'stderr': '', 'returncode': 0, 'timing': {'total': 0.01}}
+    assertion = "response.code == 200 and response.json['ok'] is True and 'pad' in response.body"
+    compiled = ce._compile_assertions([assertion])
+
+    micro = {
+        'replace_variables': _per_call_us(lambda: ce.replace_variables(command, variables)),
+        'template_prepare': _per_call_us(lambda: template.prepare(variables)),
+        'replace_then_parse': _per_call_us(lambda: ce._parse_curl_request(ce.replace_variables(command, variables))),
+        'parse_curl_request': _per_call_us(lambda: ce._parse_curl_request(rendered)),
+        'parse_header_block': _per_call_us(lambda: ce._parse_header_block(header_text)),
+        'parse_verbose_trace': _per_call_us(lambda: ce._parse_verbose_trace(trace)),
+        'evaluate_assertion': _per_call_us(lambda: ce.evaluate_assertion(assertion, response)),
+        'evaluate_assertions_compiled': _per_call_us(lambda: ce._evaluate_assertions(compiled, response)),
+    }
+    # 单次 curl 脚本执行包含进程创建，次数固定
+    curl_cmd = f"curl -s '{url}/bench'"
+    ce._run_curl_script(curl_cmd)
+    started = time.perf_counter()
+    for _ in range(curl_runs):
+        ce._run_curl_script(curl_cmd)
+    micro['run_curl_script'] = round((time.perf_counter() - started) / curl_runs * 1e6, 3)
+    return {name: {'us_per_op': value} for name, value in micro.items()}
+
+
+# ==== 批量 ====
+
+class _RssSampler:
+    """后台线程每 10ms 采样一次进程 RSS（Linux 读 /proc/self/statm，其他平台退化为 ru_maxrss）"""
+
+    def __init__(self):
+        self.start_bytes = self.peak_bytes = self._rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    @staticmethod
+    def _rss() -> int:
+        try:
+            with open('/proc/self/statm', 'rb') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError, AttributeError):
+            import resource
+            scale = 1 if sys.platform == 'darwin' else 1024
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+    def _sample(self):
+        while not self._stop.wait(0.01):
+            self.peak_bytes = max(self.peak_bytes, self._rss())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_bytes = max(self.peak_bytes, self._rss())
+
+    @property
+    def peak_mb(self) -> float:
+        return round((self.peak_bytes - self.start_bytes) / 1e6, 2)
+
+
+def run_batch(ce, client, stub: StubServer, rows: int, engine: str, concurrency: int) -> dict:
+    name = f'bench_{rows}.csv'
+    path = os.path.join(ce.app.config['UPLOAD_FOLDER'], name)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id', 'name', 'amount'])
+        for i in range(rows):
+            writer.writerow([i, f'user-{i}', i * 1.5])
+
+    payload = {
+        'excel_file': name,
+        'curl_command': f"curl -s '{stub.url}/items/{{{{id}}}}?name={{{{name}}}}&amount={{{{amount}}}}'",
+        'assertions': ['response.status_code == 200'],
+        'engine': engine,
+        'concurrency': concurrency,
+        'iterations': rows,
+    }
+    with _RssSampler() as memory:
+        started = time.perf_counter()
+        response = client.post('/execute_batch', json=payload)
+        elapsed = time.perf_counter() - started
+    data = response.get_json()
+    if not data or not data.get('success'):
+        raise RuntimeError(f'/execute_batch failed for {rows} rows: {data}')
+    return {
+        'rows': data['total_rows'],
+        'success_count': data['success_count'],
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(data['total_rows'] / elapsed, 1),
+        'peak_mb': memory.peak_mb,
+    }
+
+
+# ==== 基线对比 ====
+
+# 每个指标越大越好（True）还是越小越好（False）
+_HIGHER_IS_BETTER = {'us_per_op': False, 'rows_per_second': True, 'peak_mb': False}
+
+
+def compare(current: dict, baseline: dict, tolerance: float):
+    """返回超出容差的退化列表 [(指标路径, 基线值, 当前值)]"""
+    regressions = []
+    for section in ('micro', 'batch'):
+        for name, metrics in (baseline.get(section) or {}).items():
+            for metric, higher_is_better in _HIGHER_IS_BETTER.items():
+                old = metrics.get(metric)
+                new = ((current.get(section) or {}).get(name) or {}).get(metric)
+                if not isinstance(old, (int, float)) or not isinstance(new, (int, float)) or old <= 0:
+                    continue
+                worse = new < old * (1 - tolerance) if higher_is_better else new > old * (1 + tolerance)
+                if worse:
+                    regressions.append((f'{section}.{name}.{metric}', old, new))
+    return regressions
+
+
+def _curl_version() -> str:
+    try:
+        return subprocess.run(['curl', '--version'], capture_output=True, text=True).stdout.split('\n')[0]
+    except OSError:
+        return ''
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the curl executor hot paths against a local stub server')
+    parser.add_argument('--rows', default='1000,10000,100000',
+                        help='comma separated batch sizes (default: 1000,10000,100000)')
+    parser.add_argument('--engine', default='native', choices=('curl', 'native', 'parallel'),
+                        help='engine used for the batch runs (default: native)')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--latency-ms', type=float, default=0, help='stub server latency per request')
+    parser.add_argument('--body-bytes', type=int, default=256, help='stub server response body size')
+    parser.add_argument('--status', default='200', help='comma separated status codes returned in turn')
+    parser.add_argument('--skip-micro', action='store_true')
+    parser.add_argument('--skip-batch', action='store_true')
+    parser.add_argument('--output', help='write the results JSON to this file')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--compare', action='store_true', help='compare with the baseline, exit 1 on regression')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative change (default: 0.2)')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='curl-executor-bench-')
+    import curl_executor as ce
+    # 结果与上传写到临时目录，不影响本地数据
+    ce.app.config.update(
+        UPLOAD_FOLDER=os.path.join(workdir, 'uploads'),
+        RESULTS_FOLDER=os.path.join(workdir, 'results'),
+        BLOB_FOLDER=os.path.join(workdir, 'results', 'blobs'),
+        UPLOAD_CACHE_FOLDER=os.path.join(workdir, 'uploads', '.cache'),
+        RESULTS_INDEX='',
+        MAX_CONCURRENCY=max(ce.app.config['MAX_CONCURRENCY'], args.concurrency),
+    )
+    os.makedirs(ce.app.config['UPLOAD_FOLDER'])
+    os.makedirs(ce.app.config['RESULTS_FOLDER'])
+    client = ce.app.test_client()
+    stub = StubServer(args.latency_ms, args.body_bytes, [int(s) for s in args.status.split(',')]).start()
+
+    results = {
+        'meta': {
+            'timestamp': time.time(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'curl': _curl_version(),
+            'engine': args.engine,
+            'concurrency': args.concurrency,
+            'latency_ms': args.latency_ms,
+            'body_bytes': args.body_bytes,
+        },
+        'micro': {},
+        'batch': {},
+    }
+    if not args.skip_micro:
+        results['micro'] = run_micro(ce, stub)
+        for name, metrics in results['micro'].items():
+            print(f"{name:32s} {metrics['us_per_op']:>12.3f} us/op", file=sys.stderr)
+    if not args.skip_batch:
+        for rows in (int(r) for r in args.rows.split(',') if r.strip()):
+            stats = results['batch'][str(rows)] = run_batch(ce, client, stub, rows, args.engine, args.concurrency)
+            print(f"batch {rows:>8d} rows {stats['seconds']:>9.2f}s {stats['rows_per_second']:>10.1f} rows/s "
+                  f"peak {stats['peak_mb']:>8.2f} MB", file=sys.stderr)
+    stub.shutdown()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    if args.compare:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        for key in ('engine', 'concurrency', 'latency_ms', 'body_bytes'):
+            if baseline.get('meta', {}).get(key) != results['meta'][key]:
+                print(f"warning: {key} differs from the baseline ({baseline.get('meta', {}).get(key)} vs "
+                      f"{results['meta'][key]})", file=sys.stderr)
+        regressions = compare(results, baseline, args.tolerance)
+        for metric, old, new in regressions:
+            print(f'REGRESSION {metric}: baseline {old} -> {new}', file=sys.stderr)
+        if regressions:
+            return 1
+        print(f'no regressions beyond {args.tolerance:.0%}', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
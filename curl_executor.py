@@ -1,22 +1,148 @@
-from flask import Flask, request, jsonify, render_template, send_from_directory
 import json
+import csv
 import re
 import subprocess
-import pandas as pd
 import os
+import sys
 import tempfile
 import uuid
 import time
-from werkzeug.utils import secure_filename
+import threading
+import shlex
+import socket
+import ssl
+import zlib
+import http.client
+import functools
+import itertools
+import queue
+import shutil
+import sqlite3
+import hashlib
+import hmac
+import math
+import bisect
+import random
+import signal
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from collections import OrderedDict
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+import urllib.request
 
-app = Flask(__name__, static_folder='static')
+try:  # 仅 POSIX：结果文件的跨进程写锁
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:  # 可选：更快的 JSON 解析，用于断言中的 response.json
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# 无界面命令行（python -m curl_executor run ...）不需要 Web 服务：用只提供 config / logger 的轻量对象代替 Flask，
+# 路由等装饰器原样返回函数，整个进程不导入 Flask / Werkzeug
+_HEADLESS = __name__ == '__main__' and sys.argv[1:2] == ['run']
+if _HEADLESS:
+    import logging
+
+    class _HeadlessApp:
+        def __init__(self, name: str):
+            self.config = {}
+            self.logger = logging.getLogger(name)
+
+        def route(self, *args, **kwargs):
+            return lambda fn: fn
+
+        def after_request(self, fn):
+            return fn
+
+        before_request = after_request
+
+    app = _HeadlessApp(__name__)
+else:
+    from flask import Flask, request, jsonify, render_template, send_from_directory
+    from werkzeug.utils import secure_filename
+
+    app = Flask(__name__, static_folder='static')
 app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
 app.config['RESULTS_FOLDER'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
 app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0  # 禁用静态文件缓存
+# 批量执行并发：默认顺序执行，可通过请求参数 concurrency 提升，上限为 MAX_CONCURRENCY
+app.config['DEFAULT_CONCURRENCY'] = int(os.environ.get('CURL_EXECUTOR_CONCURRENCY', '1'))
+app.config['MAX_CONCURRENCY'] = int(os.environ.get('CURL_EXECUTOR_MAX_CONCURRENCY', '64'))
+# 执行引擎：curl（每行一个 bash+curl 子进程）或 native（进程内 keep-alive 连接池，不支持的参数自动回退 curl）
+app.config['DEFAULT_ENGINE'] = os.environ.get('CURL_EXECUTOR_ENGINE', 'curl')
+# parallel 引擎：每个 curl 进程最多合并的命令数、--parallel-max、攒批等待秒数、同时运行的 curl 进程数
+app.config['PARALLEL_CHUNK_SIZE'] = int(os.environ.get('CURL_EXECUTOR_PARALLEL_CHUNK', '64'))
+app.config['PARALLEL_MAX'] = int(os.environ.get('CURL_EXECUTOR_PARALLEL_MAX', '50'))
+app.config['PARALLEL_LINGER'] = float(os.environ.get('CURL_EXECUTOR_PARALLEL_LINGER', '0.02'))
+app.config['PARALLEL_PROCESSES'] = int(os.environ.get('CURL_EXECUTOR_PARALLEL_PROCESSES', '4'))
+# 后台任务队列：工作线程数、排队上限、保留的已结束任务数
+app.config['JOB_WORKERS'] = int(os.environ.get('CURL_EXECUTOR_JOB_WORKERS', '2'))
+app.config['JOB_QUEUE_SIZE'] = int(os.environ.get('CURL_EXECUTOR_JOB_QUEUE_SIZE', '100'))
+app.config['JOB_HISTORY'] = int(os.environ.get('CURL_EXECUTOR_JOB_HISTORY', '200'))
+# 单行执行超时（秒，0 表示不限制）：超时后杀掉整个进程组，该行记为 timeout
+app.config['ROW_TIMEOUT'] = float(os.environ.get('CURL_EXECUTOR_ROW_TIMEOUT', '300'))
+# 批量执行的按主机熔断（请求体传 circuit_breaker 时才启用）：连续失败 BREAKER_THRESHOLD 次后熔断，
+# BREAKER_COOLDOWN 秒后放行一个探测请求；BREAKER_THRESHOLD 为 0 时启用的熔断使用默认阈值 5
+app.config['BREAKER_THRESHOLD'] = int(os.environ.get('CURL_EXECUTOR_BREAKER_THRESHOLD', '0'))
+app.config['BREAKER_COOLDOWN'] = float(os.environ.get('CURL_EXECUTOR_BREAKER_COOLDOWN', '10'))
+# 幂等请求失败重试的退避：第 n 次重试前随机等待 [0, min(RETRY_MAX_BACKOFF, RETRY_BACKOFF * 2^n)] 秒
+app.config['RETRY_BACKOFF'] = float(os.environ.get('CURL_EXECUTOR_RETRY_BACKOFF', '0.2'))
+app.config['RETRY_MAX_BACKOFF'] = float(os.environ.get('CURL_EXECUTOR_RETRY_MAX_BACKOFF', '5'))
+# 压测模式（load）单次最多发送的请求数
+app.config['LOAD_MAX_REQUESTS'] = int(os.environ.get('CURL_EXECUTOR_LOAD_MAX_REQUESTS', '100000'))
 
-# 确保上传和结果目录存在
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-os.makedirs(app.config['RESULTS_FOLDER'], exist_ok=True)
+# 结果汇总索引（SQLite）路径；为空时使用 results 目录下的 .results_index.sqlite3
+app.config['RESULTS_INDEX'] = os.environ.get('CURL_EXECUTOR_RESULTS_INDEX', '')
+# /get_result/<id>/rows 单页最多返回的行数
+app.config['MAX_ROWS_PAGE'] = int(os.environ.get('CURL_EXECUTOR_MAX_ROWS_PAGE', '1000'))
+# 超过该字节数的响应 body 写入 blob 目录（按 sha256 去重），结果文件只保存引用
+app.config['BODY_INLINE_LIMIT'] = int(os.environ.get('CURL_EXECUTOR_BODY_INLINE_LIMIT', str(64 * 1024)))
+app.config['BLOB_FOLDER'] = os.path.join(app.config['RESULTS_FOLDER'], 'blobs')
+# 上传数据文件的列式缓存目录及总大小上限（MB），超出时按最近使用时间淘汰
+app.config['UPLOAD_CACHE_FOLDER'] = os.path.join(app.config['UPLOAD_FOLDER'], '.cache')
+app.config['UPLOAD_CACHE_MAX_BYTES'] = int(os.environ.get('CURL_EXECUTOR_UPLOAD_CACHE_MB', '512')) * 1024 * 1024
+# 任务进度事件流（SSE）在没有新进度时发送心跳的间隔（秒）
+app.config['SSE_HEARTBEAT'] = float(os.environ.get('CURL_EXECUTOR_SSE_HEARTBEAT', '15'))
+# 分布式执行（distributed=true）：工作队列库路径（为空时在 results 目录下）、每块行数、
+# 未合并分块上限、worker 租约秒数、本机自动启动的 worker 进程数（0 表示只使用外部 worker）
+app.config['WORK_QUEUE'] = os.environ.get('CURL_EXECUTOR_WORK_QUEUE', '')
+app.config['WORK_CHUNK_ROWS'] = int(os.environ.get('CURL_EXECUTOR_WORK_CHUNK_ROWS', '50'))
+app.config['WORK_MAX_PENDING'] = int(os.environ.get('CURL_EXECUTOR_WORK_MAX_PENDING', '64'))
+app.config['WORK_LEASE'] = float(os.environ.get('CURL_EXECUTOR_WORK_LEASE', '30'))
+app.config['LOCAL_WORKERS'] = int(os.environ.get('CURL_EXECUTOR_LOCAL_WORKERS', '2'))
+# 同一分块最多被租用的次数（worker 反复在该分块上崩溃时，超过后整块记为失败）；
+# 没有任何 worker 租用分块、也没有分块完成的最长等待秒数，超过后整批失败（可 resume 续跑）
+app.config['WORK_MAX_ATTEMPTS'] = int(os.environ.get('CURL_EXECUTOR_WORK_MAX_ATTEMPTS', '3'))
+app.config['WORK_IDLE_TIMEOUT'] = float(os.environ.get('CURL_EXECUTOR_WORK_IDLE_TIMEOUT', '60'))
+# 远程 worker 访问 /work/* 接口使用的共享令牌（请求头 Authorization: Bearer <令牌>）；为空时这些接口不可用，
+# 只能使用直接读写本机工作队列的 worker
+app.config['WORK_TOKEN'] = os.environ.get('CURL_EXECUTOR_WORK_TOKEN', '')
+# 生产模式（python curl_executor.py serve）：监听地址、worker 进程数（0 表示按 CPU 数）、每个进程的线程数
+app.config['SERVER_BIND'] = os.environ.get('CURL_EXECUTOR_BIND', '0.0.0.0:5000')
+app.config['SERVER_WORKERS'] = int(os.environ.get('CURL_EXECUTOR_SERVER_WORKERS', '0'))
+app.config['SERVER_THREADS'] = int(os.environ.get('CURL_EXECUTOR_SERVER_THREADS', '16'))
+
+
+_data_folders_ready = False
+
+
+def _ensure_data_folders():
+    """确保上传和结果目录存在；在服务启动与第一个请求时调用，导入模块本身不写磁盘"""
+    global _data_folders_ready
+    if not _data_folders_ready:
+        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+        os.makedirs(app.config['RESULTS_FOLDER'], exist_ok=True)
+        _data_folders_ready = True
+
+
+@app.before_request
+def _prepare_data_folders():
+    # 由外部 WSGI 服务器（如 gunicorn curl_executor:app）直接加载时同样会在处理请求前建好目录
+    _ensure_data_folders()
 
 
 @app.route('/')
@@ -48,6 +174,425 @@ def result_file(filename):
     return send_from_directory(app.config['RESULTS_FOLDER'], filename)
 
 
+# ==== 运行指标（/metrics，Prometheus 文本格式）====
+# 进程内的计数器、仪表与直方图。每次记录只是一次加锁的字典更新（直方图多一次二分查找），
+# 相对一次 HTTP 请求或子进程创建可以忽略。多进程部署时每个进程各自导出。
+
+_METRIC_HELP = {
+    'curl_executor_subprocesses_in_flight': ('gauge', 'curl script subprocesses currently running'),
+    'curl_executor_subprocess_spawn_seconds': ('histogram', 'Time to spawn a curl script subprocess'),
+    'curl_executor_subprocess_seconds': ('histogram', 'Wall time of a curl script subprocess'),
+    'curl_executor_request_duration_seconds': ('histogram', 'Duration of a request by engine'),
+    'curl_executor_requests_total': ('counter', 'Requests executed by target host and status code'),
+    'curl_executor_rows_total': ('counter', 'Batch rows executed by target host and outcome'),
+    'curl_executor_assertion_seconds': ('histogram', 'Time to evaluate the assertions of one response'),
+    'curl_executor_assertions_total': ('counter', 'Assertions evaluated by result'),
+    'curl_executor_result_write_seconds': ('histogram', 'Time to persist a result record'),
+    'curl_executor_persisted_bytes_total': ('counter', 'Bytes written to result files and blobs'),
+    'curl_executor_active_batches': ('gauge', 'Batches currently executing'),
+    'curl_executor_job_queue_depth': ('gauge', 'Background batch jobs waiting in the queue'),
+    'curl_executor_jobs': ('gauge', 'Background batch jobs by status'),
+    'curl_executor_local_workers': ('gauge', 'Local distributed worker processes alive'),
+}
+
+
+class _Metrics:
+    BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}  # (名称, 标签) -> 计数器 / 仪表的值
+        self._histograms = {}  # (名称, 标签) -> [各桶计数..., +Inf 桶, 总和]
+
+    def inc(self, name: str, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        index = bisect.bisect_left(self.BUCKETS, value)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(self.BUCKETS) + 1) + [0.0]
+            histogram[index] += 1
+            histogram[-1] += value
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    @contextmanager
+    def in_flight(self, name: str, **labels):
+        self.inc(name, 1, **labels)
+        try:
+            yield
+        finally:
+            self.inc(name, -1, **labels)
+
+    def render(self, extra=()) -> str:
+        """导出为 Prometheus 文本格式；extra 为抓取时计算的 (名称, 标签, 值)"""
+        with self._lock:
+            values = dict(self._values)
+            histograms = {key: list(h) for key, h in self._histograms.items()}
+        for name, labels, value in extra:
+            values[(name, tuple(sorted(labels.items())))] = value
+        samples = {}
+        for (name, labels), value in sorted(values.items(), key=str):
+            samples.setdefault(name, []).append(f'{name}{_metric_labels(labels)} {value}')
+        # 直方图的桶按 le 递增输出
+        for (name, labels), histogram in sorted(histograms.items(), key=str):
+            lines = samples.setdefault(name, [])
+            cumulative = 0
+            for bound, count in zip(self.BUCKETS + ('+Inf',), histogram):
+                cumulative += count
+                lines.append(f'{name}_bucket{_metric_labels(labels + (("le", str(bound)),))} {cumulative}')
+            lines.append(f'{name}_sum{_metric_labels(labels)} {histogram[-1]:.6f}')
+            lines.append(f'{name}_count{_metric_labels(labels)} {cumulative}')
+        out = []
+        for name in sorted(samples):
+            kind, help_text = _METRIC_HELP.get(name, ('untyped', ''))
+            out.append(f'# HELP {name} {help_text}')
+            out.append(f'# TYPE {name} {kind}')
+            out.extend(samples[name])
+        return '\n'.join(out) + '\n'
+
+
+def _metric_labels(labels) -> str:
+    if not labels:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in labels)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + '}'
+
+
+_metrics = _Metrics()
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    extra = [('curl_executor_job_queue_depth', {}, _job_queue.depth()),
+             ('curl_executor_local_workers', {}, sum(1 for p in _local_workers if p.poll() is None))]
+    statuses = {}
+    for job in _job_queue.list():
+        statuses[job.status] = statuses.get(job.status, 0) + 1
+    for status in ('queued', 'running', 'completed', 'cancelled', 'failed'):
+        extra.append(('curl_executor_jobs', {'status': status}, statuses.get(status, 0)))
+    return app.response_class(_metrics.render(extra), mimetype='text/plain; version=0.0.4')
+
+
+# ==== 批量数据源 ====
+# 上传的数据文件（Excel / CSV / JSON Lines）与 JSON 数组变量统一包装为行数据源：
+# 逐行惰性产出变量字典，内存占用与总行数无关；总行数尽量取自文件元数据，不做第二次完整解析。
+_ROW_SOURCE_EXTENSIONS = ('.xlsx', '.xlsm', '.xls', '.csv', '.jsonl', '.ndjson')
+
+
+class _RowSource:
+    """行数据源基类：columns 为列名，total_rows 为总行数（未知时为 None），
+    rows(limit, offset) 跳过前 offset 行后逐行产出最多 limit 行 {列名: 值}"""
+    columns = ()
+    total_rows = None
+
+    def rows(self, limit=None, offset: int = 0):
+        raise NotImplementedError
+
+    def items(self, limit=None, offset: int = 0):
+        """按执行器需要的 (row_index, variables) 产出，row_index 为数据行号（从 1 开始）"""
+        return enumerate(self.rows(limit, offset), start=offset + 1)
+
+    def preview(self, n: int = 5):
+        return list(self.rows(n))
+
+    def count(self, limit=None, offset: int = 0):
+        """offset / limit 截断后的行数；总行数未知时返回 None"""
+        if self.total_rows is None:
+            return None
+        remaining = max(0, self.total_rows - offset)
+        return min(remaining, limit) if limit else remaining
+
+
+class _ListRowSource(_RowSource):
+    """execute_curl 的 JSON 数组变量"""
+
+    def __init__(self, records):
+        self._records = records
+        self.total_rows = len(records)
+        first = next((r for r in records if isinstance(r, dict)), {})
+        self.columns = list(first)
+
+    def rows(self, limit=None, offset: int = 0):
+        return itertools.islice(self._records, offset, offset + limit if limit else None)
+
+
+def _column_names(header):
+    # 与 pandas 一致：空表头记为 Unnamed: <序号>
+    return [str(h) if h is not None and str(h) != '' else f'Unnamed: {i}' for i, h in enumerate(header)]
+
+
+def _non_blank_rows(values_iter):
+    # 跳过只有格式没有内容的空行；行数统计与逐行读取共用，保证两者一致
+    return (values for values in values_iter if not all(v is None for v in values))
+
+
+class _ExcelRowSource(_RowSource):
+    """openpyxl 只读模式流式读取第一个工作表；总行数在打开时流式数一遍非空行
+    （dimension 元数据的 max_row 会把只有格式的空行也算进去，只能作为上限）"""
+
+    def __init__(self, path: str):
+        import openpyxl  # pandas 读取 xlsx 同样依赖 openpyxl
+        self._openpyxl = openpyxl
+        self.path = path
+        wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            ws = wb.worksheets[0]
+            values_iter = ws.iter_rows(values_only=True)
+            self.columns = _column_names(next(values_iter, ()))
+            # 只判断是否为空行，不构造行字典
+            self.total_rows = sum(1 for _ in _non_blank_rows(values_iter))
+        finally:
+            wb.close()
+
+    def rows(self, limit=None, offset: int = 0):
+        wb = self._openpyxl.load_workbook(self.path, read_only=True, data_only=True)
+        try:
+            width = len(self.columns)
+            values_iter = _non_blank_rows(wb.worksheets[0].iter_rows(min_row=2, values_only=True))
+            for values in itertools.islice(values_iter, offset, offset + limit if limit else None):
+                # 空单元格记为空字符串，不再像 DataFrame 那样变成 NaN、整数列变成浮点
+                yield {name: ('' if v is None else v)
+                       for name, v in zip(self.columns, itertools.chain(values, itertools.repeat(None, width)))}
+        finally:
+            wb.close()
+
+
+class _FrameRowSource(_RowSource):
+    """openpyxl 不支持的旧版 .xls 仍由 pandas 整表读取"""
+
+    def __init__(self, df):
+        self._df = df.astype(object).where(df.notna(), '')
+        self.columns = [str(c) for c in df.columns]
+        self.total_rows = len(df)
+
+    def rows(self, limit=None, offset: int = 0):
+        df = self._df.iloc[offset:offset + limit if limit else None]
+        for values in df.itertuples(index=False, name=None):
+            yield dict(zip(self.columns, values))
+
+
+class _CsvRowSource(_RowSource):
+    """csv 模块流式读取，首行为表头；值均为字符串"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            reader = csv.reader(f)
+            self.columns = _column_names(next(reader, []))
+            # 只做 csv 切分计数，不构造行字典
+            self.total_rows = sum(1 for _ in reader)
+
+    def rows(self, limit=None, offset: int = 0):
+        with open(self.path, 'r', encoding='utf-8-sig', newline='') as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            for values in itertools.islice(reader, offset, offset + limit if limit else None):
+                yield dict(itertools.zip_longest(self.columns, values, fillvalue=''))
+
+
+class _JsonlRowSource(_RowSource):
+    """JSON Lines：每行一个 JSON 对象，列名取第一行的键"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.total_rows = 0
+        self.columns = []
+        with open(path, 'rb') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                if not self.total_rows:
+                    first = json.loads(line)
+                    self.columns = list(first) if isinstance(first, dict) else []
+                self.total_rows += 1
+
+    def rows(self, limit=None, offset: int = 0):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            lines = (line for line in f if line.strip())
+            for line in itertools.islice(lines, offset, offset + limit if limit else None):
+                yield json.loads(line)
+
+
+def _open_row_source(path: str) -> _RowSource:
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        return _CsvRowSource(path)
+    if ext in ('.jsonl', '.ndjson'):
+        return _JsonlRowSource(path)
+    if ext == '.xls':
+        import pandas as pd  # 只在读取旧版 .xls 时才加载
+        return _FrameRowSource(pd.read_excel(path))
+    return _ExcelRowSource(path)
+
+
+# ==== 上传文件的列式缓存 ====
+# 数据文件第一次被读取时转换为列式缓存（安装了 pyarrow 时为可内存映射的 Arrow IPC 文件，否则退化为 JSON Lines），
+# 以文件内容的 sha256 为键：同一文件之后的预览、行数、iterations 截断与 offset 切片都直接读缓存，
+# 文件被替换后内容哈希随之变化，旧缓存不再命中并按 LRU 淘汰。缓存目录总大小不超过 UPLOAD_CACHE_MAX_BYTES。
+_pyarrow_module = []  # 首次使用时导入 pyarrow（未安装时为 None），避免拖慢启动
+
+
+def _pyarrow():
+    if not _pyarrow_module:
+        try:
+            import pyarrow
+            import pyarrow.ipc  # noqa: F401
+        except ImportError:
+            pyarrow = None
+        _pyarrow_module.append(pyarrow)
+    return _pyarrow_module[0]
+
+_digest_lock = threading.Lock()
+_digest_memo = {}  # (路径, 大小, mtime_ns) -> sha256，文件未变时不重复计算哈希
+
+
+def _file_digest(path: str) -> str:
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    with _digest_lock:
+        digest = _digest_memo.get(key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        digest = h.hexdigest()
+        with _digest_lock:
+            _digest_memo[key] = digest
+    return digest
+
+
+def _arrow_column(values):
+    """尽量保留列的原始类型（整数、浮点、字符串）；混合类型的列统一转为字符串，空值记为 null"""
+    pa = _pyarrow()
+    values = [None if v == '' else v for v in values]
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, ValueError, OverflowError):
+        return pa.array([None if v is None else str(v) for v in values], type=pa.string())
+
+
+def _write_upload_cache(source: _RowSource, path: str):
+    pa = _pyarrow()
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        if pa is not None:
+            # 一次性按列收集后写出，只在首次转换时发生
+            columns = {name: [] for name in source.columns}
+            for row in source.rows():
+                for name in source.columns:
+                    columns[name].append(row.get(name, ''))
+            table = pa.table({name: _arrow_column(values) for name, values in columns.items()})
+            table = table.replace_schema_metadata({'columns': json.dumps(source.columns, ensure_ascii=False)})
+            with pa.OSFile(tmp_path, 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table, max_chunksize=8192)
+        else:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(json.dumps({'columns': source.columns}, ensure_ascii=False) + '\n')
+                for row in source.rows():
+                    f.write(json.dumps(row, ensure_ascii=False, default=str) + '\n')
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+
+class _CachedRowSource(_RowSource):
+    """从列式缓存读取：行数取自文件元数据，offset / limit 切片不需要扫描前面的行（Arrow 格式）"""
+
+    def __init__(self, path: str):
+        self.path = path
+        if path.endswith('.arrow'):
+            pa = _pyarrow()
+            with pa.memory_map(path, 'r') as source:
+                reader = pa.ipc.open_file(source)
+                metadata = reader.schema.metadata or {}
+                self.columns = json.loads(metadata.get(b'columns', b'[]')) or reader.schema.names
+                self.total_rows = sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+        else:
+            with open(path, 'r', encoding='utf-8') as f:
+                self.columns = json.loads(f.readline())['columns']
+                self.total_rows = sum(1 for _ in f)
+
+    def rows(self, limit=None, offset: int = 0):
+        if not self.path.endswith('.arrow'):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                f.readline()
+                for line in itertools.islice(f, offset, offset + limit if limit else None):
+                    yield json.loads(line)
+            return
+        pa = _pyarrow()
+        with pa.memory_map(self.path, 'r') as source:
+            table = pa.ipc.open_file(source).read_all()  # 内存映射，零拷贝
+            stop = self.total_rows if not limit else min(self.total_rows, offset + limit)
+            sliced = table.slice(offset, max(0, stop - offset))
+            names = sliced.schema.names
+            for batch in sliced.to_batches(max_chunksize=1024):
+                # 按小批转换为 Python 对象，内存占用与总行数无关
+                for row in batch.to_pylist():
+                    yield {name: ('' if row[name] is None else row[name]) for name in names}
+
+
+def _upload_cache_path(digest: str) -> str:
+    return os.path.join(app.config['UPLOAD_CACHE_FOLDER'], digest + ('.arrow' if _pyarrow() is not None else '.jsonl'))
+
+
+def _evict_upload_cache(keep: str):
+    """按最近使用时间（mtime）淘汰缓存文件，直到总大小不超过上限"""
+    folder = app.config['UPLOAD_CACHE_FOLDER']
+    entries = []
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        if name.endswith('.tmp') or not os.path.isfile(path):
+            continue
+        st = os.stat(path)
+        entries.append((st.st_mtime, st.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= app.config['UPLOAD_CACHE_MAX_BYTES']:
+            break
+        if path == keep:
+            continue
+        try:
+            os.unlink(path)
+            total -= size
+        except OSError:
+            pass
+
+
+def _cached_row_source(path: str) -> _RowSource:
+    """返回上传文件的行数据源：优先读取列式缓存，未命中时解析原文件并写入缓存；缓存不可用时直接读原文件"""
+    try:
+        cache_path = _upload_cache_path(_file_digest(path))
+        if os.path.exists(cache_path):
+            os.utime(cache_path)  # 记录最近使用，用于 LRU 淘汰
+        else:
+            os.makedirs(app.config['UPLOAD_CACHE_FOLDER'], exist_ok=True)
+            _write_upload_cache(_open_row_source(path), cache_path)
+            _evict_upload_cache(keep=cache_path)
+        return _CachedRowSource(cache_path)
+    except Exception:
+        return _open_row_source(path)
+
+
+def _uploaded_file_path(name) -> str:
+    """请求里的 excel_file 对应的上传文件路径；与 /upload_excel 保存时一样经过 secure_filename，不能跳出上传目录"""
+    return os.path.join(app.config['UPLOAD_FOLDER'], secure_filename(str(name)))
+
+
 @app.route('/upload_excel', methods=['POST'])
 def upload_excel():
     if 'file' not in request.files:
@@ -57,31 +602,34 @@ def upload_excel():
     if file.filename == '':
         return jsonify({'error': 'No selected file'}), 400
 
-    if not file.filename.endswith(('.xlsx', '.xls')):
-        return jsonify({'error': 'File must be an Excel file'}), 400
+    if not file.filename.lower().endswith(_ROW_SOURCE_EXTENSIONS):
+        return jsonify({'error': 'File must be an Excel, CSV or JSON Lines file'}), 400
 
     filename = secure_filename(file.filename)
     filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    file.save(filepath)
-
-    # 读取Excel文件的前几行预览
+    # 先保存为临时文件再替换，同名文件并发上传时不会读到写了一半的内容
+    fd, tmp_path = tempfile.mkstemp(dir=app.config['UPLOAD_FOLDER'], prefix=f'.{filename}.', suffix='.tmp')
     try:
-        df = pd.read_excel(filepath, nrows=5)
-        preview = df.to_dict('records')
-        columns = df.columns.tolist()
-        # 计算总行数
+        with os.fdopen(fd, 'wb') as f:
+            file.save(f)
+        os.replace(tmp_path, filepath)
+    except BaseException:
         try:
-            df_all = pd.read_excel(filepath)
-            total_rows = len(df_all)
-        except Exception:
-            total_rows = None
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    # 上传时即转换为列式缓存，预览与总行数都从缓存读取
+    try:
+        source = _cached_row_source(filepath)
         return jsonify({
             'success': True,
             'filename': filename,
             'filepath': filepath,
-            'preview': preview,
-            'columns': columns,
-            'total_rows': total_rows
+            'preview': source.preview(5),
+            'columns': source.columns,
+            'total_rows': source.total_rows
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -98,77 +646,124 @@ def upload_excel():
 #         return match.group(0)  # 如果变量不存在，保持原样
 
 #     return re.sub(pattern, replace_match, text)
+# 匹配 {{变量名}}
+_PLACEHOLDER_RE = re.compile(r'\{\{(\w+)\}\}')
+
+
+# 判断文本整体属于 CMD 还是 Bash 风格
+def _detect_shell_type(cmd: str) -> str:
+    if re.search(r"\^(\s|$)|\^\"", cmd):
+        return "cmd"
+    if re.search(r"\\(\s|$)|'(.*?)'", cmd):
+        return "bash"
+    return "bash"  # 默认当成 bash
+
+
+def _escape_value(value, shell_type: str) -> str:
+    # 如果是 dict/list，先转 JSON
+    if isinstance(value, (dict, list)):
+        json_text = json.dumps(value, ensure_ascii=False)
+        if shell_type == "cmd":
+            return f'^"{json_text.replace("\"", "\\\"")}^"'
+        else:
+            return f"'{json_text}'"
+    else:
+        # 普通字符串，直接返回
+        return str(value)
+
+
 def replace_variables(text, variables):
     """
     替换 {{变量名}}，并自动对 JSON 值做 CMD/Bash 兼容转义
     """
+    return _compile_template(text).render(variables)
 
-    # 判断文本整体属于 CMD 还是 Bash 风格
-    def detect_shell_type(cmd: str) -> str:
-        if re.search(r"\^(\s|$)|\^\"", cmd):
-            return "cmd"
-        if re.search(r"\\(\s|$)|'(.*?)'", cmd):
-            return "bash"
-        return "bash"  # 默认当成 bash
-
-    shell_type = detect_shell_type(text)
-
-    def escape_value(value):
-        # 如果是 dict/list，先转 JSON
-        if isinstance(value, (dict, list)):
-            json_text = json.dumps(value, ensure_ascii=False)
-            if shell_type == "cmd":
-                return f'^"{json_text.replace("\"", "\\\"")}^"'
-            else:
-                return f"'{json_text}'"
-        else:
-            # 普通字符串，直接返回
-            return str(value)
 
-    # 匹配 {{变量名}}
-    pattern = r'\{\{(\w+)\}\}'
+# 创建一个安全的内置函数子集
+_SAFE_BUILTINS = {
+    'len': len,
+    'str': str,
+    'int': int,
+    'float': float,
+    'bool': bool,
+    'list': list,
+    'dict': dict,
+    'set': set,
+    'max': max,
+    'min': min,
+    'sum': sum,
+    'abs': abs,
+    'round': round,
+    'all': all,
+    'any': any
+}
+_ASSERTION_GLOBALS = {"__builtins__": _SAFE_BUILTINS}
+_UNSET = object()
 
-    def replace_match(match):
-        var_name = match.group(1)
-        if var_name in variables:
-            return escape_value(variables[var_name])
-        return match.group(0)  # 不存在保持原样
 
-    return re.sub(pattern, replace_match, text)
+class _AssertionResponse:
+    """断言里的 response 对象：常用字段放在 __slots__ 中，其余字段按需从原始字典读取；
+    stdout / raw 现算，response.json 首次访问时解析 body 并在同一行的所有断言间复用。
+    """
+    __slots__ = ('_data', '_json', 'code', 'status_code', 'headers', 'body', 'stderr', 'returncode', 'timing')
 
+    def __init__(self, data: dict):
+        self._data = data
+        self._json = _UNSET
+        self.code = data.get('code', data.get('status_code'))
+        self.status_code = self.code
+        self.headers = data.get('headers')
+        self.body = data.get('body')
+        self.stderr = data.get('stderr')
+        self.returncode = data.get('returncode')
+        self.timing = _TimingView(data.get('timing') or {})
 
-def evaluate_assertion(assertion, response_data):
-    # 简单的断言评估器：暴露 response 对象和安全的内置函数
+    @property
+    def stdout(self):
+        # 响应不再重复保存 stdout / raw，断言用到时再由 body / stderr 计算
+        return self.body or ''
+
+    @property
+    def raw(self):
+        return _response_raw(self._data)
+
+    @property
+    def json(self):
+        if self._json is _UNSET:
+            self._json = _json_loads(self.body or '')
+        return self._json
+
+    def __getattr__(self, name):
+        try:
+            return self._data[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+
+@functools.lru_cache(maxsize=1024)
+def _compile_assertion(assertion: str):
+    return compile(assertion.strip(), '<assertion>', 'eval')
+
+
+def _compile_assertions(assertions):
+    """把断言列表编译为 [(源码, code object)]，忽略空白断言；存在语法错误时抛出 ValueError"""
+    compiled = []
+    errors = []
+    for assertion in assertions or []:
+        if not (isinstance(assertion, str) and assertion.strip()):
+            continue
+        try:
+            compiled.append((assertion, _compile_assertion(assertion)))
+        except SyntaxError as e:
+            errors.append(f"{assertion!r}: {e.msg}")
+    if errors:
+        raise ValueError('Invalid assertion ' + '; '.join(errors))
+    return tuple(compiled)
+
+
+def _run_assertion(assertion: str, code, response):
     try:
-        # 创建一个类来支持点表示法
-        class DotDict:
-            def __init__(self, data):
-                self.__dict__.update(data)
-        
-        # 将字典转换为支持点表示法的对象
-        dot_response = DotDict(response_data)
-        
-        # 创建一个安全的内置函数子集
-        safe_builtins = {
-            'len': len,
-            'str': str,
-            'int': int,
-            'float': float,
-            'bool': bool,
-            'list': list,
-            'dict': dict,
-            'set': set,
-            'max': max,
-            'min': min,
-            'sum': sum,
-            'abs': abs,
-            'round': round,
-            'all': all,
-            'any': any
-        }
-        
-        local_vars = {'response': dot_response}
-        result = eval(assertion, {"__builtins__": safe_builtins}, local_vars)
+        result = eval(code, _ASSERTION_GLOBALS, {'response': response})
         return {
             'assertion': assertion,
             'result': bool(result),
@@ -183,16 +778,215 @@ def evaluate_assertion(assertion, response_data):
         }
 
 
+def evaluate_assertion(assertion, response_data):
+    # 简单的断言评估器：暴露 response 对象和安全的内置函数
+    try:
+        code = _compile_assertion(assertion)
+    except Exception as e:
+        return {
+            'assertion': assertion,
+            'result': False,
+            'error': str(e),
+            'success': False
+        }
+    return _run_assertion(assertion, code, _AssertionResponse(response_data))
+
+
 def _ensure_verbose(curl_cmd: str) -> str:
     # 如果没有 -v / --verbose，则加上 -v
     if (' -v' not in curl_cmd) and (' --verbose' not in curl_cmd):
-        return curl_cmd.replace('curl', 'curl -v', 1)
+        return _insert_curl_options(curl_cmd, '-v')
+    return curl_cmd
+
+
+# 每次执行通过 --write-out 把各阶段耗时（秒，均从请求开始累计）与收发字节数写到 stderr 末尾的一行，
+# 解析为 response_data['timing'] 后从 stderr 中移除。命令自带 -w / --write-out 时不注入，timing 为空。
+_TIMING_MARKER = 'CURLX-TIMING'
+_TIMING_FIELDS = (
+    ('dns', 'time_namelookup'),
+    ('connect', 'time_connect'),
+    ('tls', 'time_appconnect'),
+    ('ttfb', 'time_starttransfer'),
+    ('total', 'time_total'),
+    ('bytes_up', 'size_upload'),
+    ('bytes_down', 'size_download'),
+)
+_TIMING_PHASES = ('dns', 'connect', 'tls', 'ttfb', 'total')
+_TIMING_WRITE_OUT = ' '.join(f"%{{{var}}}" for _, var in _TIMING_FIELDS)
+_TIMING_LINE_RE = re.compile(rf'^{_TIMING_MARKER} ((?:[\d.,]+ ?)+)$\n?', re.M)
+_WRITE_OUT_RE = re.compile(r'(?:^|\s)(?:-w|--write-out)(?:\s|=|$)')
+
+
+def _ensure_timing(curl_cmd: str) -> str:
+    if _WRITE_OUT_RE.search(curl_cmd):
+        return curl_cmd
+    fmt = f"%{{stderr}}\\n{_TIMING_MARKER} {_TIMING_WRITE_OUT}\\n"
+    if os.name == 'nt':
+        fmt = fmt.replace('%', '%%')  # .bat 中 % 需要转义
+    return _insert_curl_options(curl_cmd, f'-w "{fmt}"')
+
+
+def _timing_from_values(values):
+    """把 --write-out 输出的数值按 _TIMING_FIELDS 顺序转换为 timing 字典"""
+    timing = {}
+    for (name, _), value in zip(_TIMING_FIELDS, values):
+        try:
+            number = float(value.replace(',', '.'))
+        except ValueError:
+            continue
+        timing[name] = int(number) if name.startswith('bytes_') else number
+    return timing
+
+
+def _pop_timing(stderr: str):
+    """从 stderr 中取出最后一行耗时记录，返回 (timing 或 None, 去掉该行后的 stderr)"""
+    match = None
+    for match in _TIMING_LINE_RE.finditer(stderr):
+        pass
+    if match is None:
+        return None, stderr
+    head = stderr[:match.start()]
+    if head.endswith('\n'):
+        head = head[:-1]  # 注入的格式以换行开头
+    return _timing_from_values(match.group(1).split()), head + stderr[match.end():]
+
+
+class _TimingView(dict):
+    """断言中的 response.timing：支持 response.timing.total 与 response.timing['total'] 两种写法"""
+    __slots__ = ()
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+
+# 默认的结构化采集：-D 把响应头写到单独的文件、--write-out 回报耗时、body 直接按字节读 stdout，
+# 状态码与响应头从头文件一次解析得到，不再扫描 -v 轨迹。
+# 调用方请求 verbose，或命令本身带 -v / -D / --trace 时，沿用 -v 轨迹方式采集。
+# 正则只做快速预筛（没有命中时一定不需要），命中后再按 shell 规则切分逐个选项确认
+_VERBOSE_CAPTURE_RE = re.compile(
+    r'(?:^|\s)(?:-[A-Za-z]*v[A-Za-z]*|--verbose|-D\S*|--dump-header|--trace(?:-ascii|-time)?)(?=\s|=|$)')
+_VERBOSE_CAPTURE_LONG = {'--verbose', '--dump-header', '--trace', '--trace-ascii', '--trace-time'}
+# 取不到 curl --help 选项表时使用：带参数的短选项，合并写法里其后的字符都是参数值（-dvalue=1 不含 -v）
+_CURL_SHORT_ARG_FLAGS = frozenset('AbcCdDeEFHKmoPQrtTuUwxXyYz')
+
+
+def _curl_option_names(curl_cmd: str) -> set:
+    """命令中出现的 curl 选项名（短选项拆开为 -x 形式，长选项不含 =值）；选项参数值不会被当成选项"""
+    tokens = _shell_tokens(curl_cmd)
+    if tokens is None:
+        tokens = [_unquote(t) for t in _CURL_TOKEN_RE.findall(curl_cmd)]
+    table = _curl_option_table()
+    names = set()
+    i = 1
+    while i < len(tokens):
+        t = tokens[i]
+        i += 1
+        if t.startswith('--'):
+            name = t.split('=', 1)[0]
+            names.add(name)
+            if '=' not in t and table.get(name):
+                i += 1  # 跳过参数值
+        elif t.startswith('-') and len(t) > 1:
+            for j in range(1, len(t)):
+                flag = '-' + t[j]
+                names.add(flag)
+                if table.get(flag, t[j] in _CURL_SHORT_ARG_FLAGS):
+                    if j == len(t) - 1:
+                        i += 1  # 参数值是下一个 token
+                    break
+    return names
+
+
+def _wants_verbose_capture(curl_cmd: str) -> bool:
+    """命令本身是否带 -v / -D / --trace 等需要走 -v 轨迹采集的选项；选项参数值里的 v 不算"""
+    if not _VERBOSE_CAPTURE_RE.search(curl_cmd):
+        return False
+    names = _curl_option_names(curl_cmd)
+    return '-v' in names or '-D' in names or not names.isdisjoint(_VERBOSE_CAPTURE_LONG)
+
+
+# 命令 token：curl、curl.exe 或带路径的 curl（不含 URL）
+_CURL_PROGRAM_RE = re.compile(r'(?:.*[\\/])?curl(?:\.exe)?', re.I)
+# 命令自带这些选项时不再注入 -sS，保留调用方对进度条 / 错误输出的设置
+_CURL_OUTPUT_FLAGS = {'-s', '--silent', '-S', '--show-error', '-#', '--progress-bar', '--no-progress-meter'}
+
+
+def _insert_curl_options(curl_cmd: str, options: str) -> str:
+    """在命令 token 之后插入选项；脚本中命令之前出现的 curl 字样（注释、echo 的参数、URL 等）不受影响"""
+    comment_end = -1
+    for m in _CURL_TOKEN_RE.finditer(curl_cmd):
+        if m.start() < comment_end:
+            continue
+        token = _unquote(m.group(0))
+        if token.startswith(('#', '::')) or token.lower() == 'rem':
+            # 注释行（bash 的 #，.bat 的 rem / ::）跳到行尾
+            comment_end = curl_cmd.find('\n', m.start())
+            if comment_end == -1:
+                break
+            continue
+        if '://' not in token and _CURL_PROGRAM_RE.fullmatch(token):
+            return f"{curl_cmd[:m.end()]} {options}{curl_cmd[m.end():]}"
     return curl_cmd
 
 
-def _run_curl_script(curl_cmd: str):
-    """创建临时脚本执行 curl，返回 subprocess.CompletedProcess"""
-    curl_cmd = _ensure_verbose(curl_cmd)
+def _parse_header_block(header_text: str):
+    """解析 -D 头文件，返回最后一个响应（重定向、100-continue 之后）的 (状态码, 响应头)"""
+    status_code = None
+    headers = {}
+    for line in header_text.splitlines():
+        if line.startswith('HTTP/'):
+            parts = line.split(None, 2)
+            status_code = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else None
+            headers = {}
+        elif ':' in line:
+            k, v = line.split(':', 1)
+            headers[k.strip()] = v.strip()
+    return status_code, headers
+
+
+def _kill_process_group(proc):
+    """杀掉脚本进程及其派生的 curl 等子进程"""
+    try:
+        if os.name == 'nt':
+            subprocess.run(['taskkill', '/F', '/T', '/PID', str(proc.pid)], capture_output=True)
+        else:
+            os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError, OSError):
+        proc.kill()
+
+
+def _wait_process(proc, timeout=None, cancel=None):
+    """等待子进程结束并读取输出；超过 timeout 秒或 cancel 被置位时杀掉进程组。
+    返回 (stdout, stderr, 终止原因)，终止原因为 None / 'timeout' / 'cancelled'。
+    """
+    deadline = time.monotonic() + timeout if timeout else None
+    while True:
+        wait = 0.25 if cancel is not None else None
+        if deadline is not None:
+            remaining = max(0.0, deadline - time.monotonic())
+            wait = remaining if wait is None else min(wait, remaining)
+        try:
+            stdout, stderr = proc.communicate(timeout=wait)
+            return stdout, stderr, None
+        except subprocess.TimeoutExpired:
+            if cancel is not None and cancel.is_set():
+                reason = 'cancelled'
+            elif deadline is not None and time.monotonic() >= deadline:
+                reason = 'timeout'
+            else:
+                continue
+            _kill_process_group(proc)
+            stdout, stderr = proc.communicate()
+            return stdout, stderr, reason
+
+
+def _run_script(curl_cmd: str, timeout=None, cancel=None):
+    """把命令写入临时脚本并执行，stdout / stderr 以字节返回。
+    脚本在独立的进程组中运行；超时或取消时整组杀掉，返回的 CompletedProcess 带 killed 属性（None / 'timeout' / 'cancelled'）。
+    """
     temp_name = None
     try:
         # 创建临时脚本
@@ -210,13 +1004,27 @@ def _run_curl_script(curl_cmd: str):
             os.chmod(temp_name, 0o755)
 
         # 执行
-        proc = subprocess.run(
-            temp_name if os.name == 'nt' else ['/bin/bash', temp_name],
-            shell=True if os.name == 'nt' else False,
-            capture_output=True,
-            text=True
-        )
-        return proc
+        started = time.monotonic()
+        with _metrics.in_flight('curl_executor_subprocesses_in_flight'):
+            proc = subprocess.Popen(
+                temp_name if os.name == 'nt' else ['/bin/bash', temp_name],
+                shell=True if os.name == 'nt' else False,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                start_new_session=(os.name != 'nt'),
+                creationflags=(subprocess.CREATE_NEW_PROCESS_GROUP if os.name == 'nt' else 0)
+            )
+            _metrics.observe('curl_executor_subprocess_spawn_seconds', time.monotonic() - started)
+            stdout, stderr, killed = _wait_process(proc, timeout, cancel)
+        _metrics.observe('curl_executor_subprocess_seconds', time.monotonic() - started)
+        if killed == 'timeout':
+            # 与 curl 自身超时一致的退出码 28
+            stderr += (f"curl: (28) Operation timed out after {time.monotonic() - started:.3f} seconds, "
+                       f"process group killed\n").encode()
+        result = subprocess.CompletedProcess(proc.args, 28 if killed == 'timeout' else proc.returncode,
+                                             stdout, stderr)
+        result.killed = killed
+        return result
     finally:
         if temp_name:
             try:
@@ -225,57 +1033,169 @@ def _run_curl_script(curl_cmd: str):
                 pass
 
 
-def _extract_status_code(stdout: str, stderr: str):
-    # 从输出中提取所有 HTTP 行，取最后一个状态码（处理重定向、多次握手）
-    combined = f"{stderr or ''}\n{stdout or ''}"
-    codes = re.findall(r'HTTP/\d\.\d\s+(\d{3})', combined)
-    return int(codes[-1]) if codes else None
+def _run_curl_script(curl_cmd: str, verbose: bool = False, timeout=None, cancel=None):
+    """创建临时脚本执行 curl，返回 subprocess.CompletedProcess（附带 timing 属性）。
+    结构化采集时另附 status_code / headers 属性；verbose 采集时 stderr 为完整的 -v 轨迹，由调用方解析。
+    """
+    if verbose or _wants_verbose_capture(curl_cmd):
+        proc = _run_script(_ensure_timing(_ensure_verbose(curl_cmd)), timeout, cancel)
+        proc.stdout = proc.stdout.decode('utf-8', errors='replace')
+        proc.timing, proc.stderr = _pop_timing(proc.stderr.decode('utf-8', errors='replace'))
+        return proc
+
+    fd, head_path = tempfile.mkstemp(suffix='.head')
+    os.close(fd)
+    try:
+        # 没有自带 -s / -S / 进度条相关选项时加 -sS：不输出进度条，但保留错误信息
+        quiet = '' if _curl_option_names(curl_cmd) & _CURL_OUTPUT_FLAGS else '-sS '
+        proc = _run_script(_ensure_timing(_insert_curl_options(curl_cmd, f'{quiet}-D "{head_path}"')), timeout, cancel)
+        with open(head_path, 'rb') as f:
+            header_text = f.read().decode('utf-8', errors='replace')
+    finally:
+        try:
+            os.unlink(head_path)
+        except Exception:
+            pass
+    proc.stdout = proc.stdout.decode('utf-8', errors='replace')
+    proc.timing, proc.stderr = _pop_timing(proc.stderr.decode('utf-8', errors='replace'))
+    proc.status_code, proc.headers = _parse_header_block(header_text)
+    return proc
+
+
+_id_lock = threading.Lock()
+_id_last = [0, 0]  # 上一个 ID 的 [毫秒时间戳, 同一毫秒内的序号]
+_id_node = uuid.uuid4().hex[:8]
 
 
-_seq_counter = 0
+def _reset_id_node():
+    # fork 出的子进程（如 gunicorn worker）各自重新生成节点标识，不与父进程共用
+    global _id_node
+    _id_node = uuid.uuid4().hex[:8]
+    _id_last[:] = [0, 0]
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_id_node)
+
 
 def _generate_result_id(is_batch: bool = False) -> str:
-    """生成 ID：时间格式 YYYYHHMM-XXX，例如 20251712-009；batch 前缀保留。"""
-    global _seq_counter
-    _seq_counter = (_seq_counter + 1) % 1000
-    t = time.localtime()
-    base = f"{t.tm_year}{t.tm_mon:02d}{t.tm_mday:02d}-{t.tm_hour:02d}{t.tm_min:02d}{t.tm_sec:02d}-{_seq_counter:03d}"
+    """生成 ID：YYYYMMDD-HHMMSS-毫秒+序号-节点，例如 20251017-115431-123000-9f3a1c2e；batch 前缀保留。
+    同一进程内按 (毫秒, 序号) 严格递增，时钟回拨时沿用上一个时间戳；节点标识每个进程随机生成，
+    多线程、多进程、多主机同时生成也不会重复。
+    """
+    with _id_lock:
+        ms = int(time.time() * 1000)
+        last_ms, last_seq = _id_last
+        if ms > last_ms:
+            seq = 0
+        else:
+            ms, seq = last_ms, last_seq + 1
+            if seq >= 1000:
+                ms, seq = ms + 1, 0
+        _id_last[:] = [ms, seq]
+        node = _id_node
+    t = time.localtime(ms // 1000)
+    base = (f"{t.tm_year}{t.tm_mon:02d}{t.tm_mday:02d}-{t.tm_hour:02d}{t.tm_min:02d}{t.tm_sec:02d}"
+            f"-{ms % 1000:03d}{seq:03d}-{node}")
     return (f"BATCH{base}" if is_batch else base)
 
-def _parse_curl_request(curl_cmd: str):
-    """从 curl 命令里解析请求信息: method/url/headers/body/query params"""
-    method = 'GET'
-    url = ''
-    headers = {}
-    body_parts = []
+def _atomic_write_text(path: str, text: str):
+    """先写同目录下的临时文件、fsync 后 os.replace：读者只会看到旧内容或完整的新内容，并发写入也不会交错"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
 
-    # 简单切分，考虑引号包裹
-    # 注意：这不是完全可靠的 shell 解析，但对常见用法有效
-    token_pattern = r"(?:'[^']*'|\"[^\"]*\"|[^\s])+"
-    tokens = re.findall(token_pattern, curl_cmd)
 
-    # 去掉引号的辅助函数
-    def unquote(s: str):
-        if (s.startswith("'") and s.endswith("'")) or (s.startswith('"') and s.endswith('"')):
-            return s[1:-1]
-        return s
+def _create_exclusive_text(path: str, text: str) -> bool:
+    """原子地创建带初始内容的新文件：先写临时文件再硬链接到目标名，目标已存在时返回 False 而不是覆盖"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.link(tmp_path, path)
+        return True
+    except FileExistsError:
+        return False
+    finally:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+
+
+def _lock_file_exclusive(f):
+    """对打开的文件加非阻塞排他锁（跨线程、跨进程）；已被其他写入者持有时抛 RuntimeError。不支持 flock 的平台跳过"""
+    if fcntl is None:
+        return
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        raise RuntimeError(f'{os.path.basename(f.name)} is being written by another worker')
+
+
+_CURL_TOKEN_RE = re.compile(r"(?:'[^']*'|\"[^\"]*\"|[^\s])+")
+_CURL_DATA_FLAGS = ('-d', '--data', '--data-raw', '--data-binary')
+
+
+# 去掉引号的辅助函数
+def _unquote(s: str):
+    if (s.startswith("'") and s.endswith("'")) or (s.startswith('"') and s.endswith('"')):
+        return s[1:-1]
+    return s
+
 
+def _curl_request_entries(tokens):
+    """按 token 顺序找出与请求相关的位置，返回 [(kind, token 下标)]"""
+    entries = []
+    n = len(tokens)
     # 找到 URL（第一个非 - 开头且包含 :// 的 token，或紧随 --url 之后）
     for i, t in enumerate(tokens):
-        if t in ('-X', '--request') and i + 1 < len(tokens):
-            method = unquote(tokens[i + 1]).upper()
-        if t in ('--url',) and i + 1 < len(tokens):
-            url = unquote(tokens[i + 1])
-        if not url and not t.startswith('-') and '://' in t:
-            url = unquote(t)
-        if t in ('-H', '--header') and i + 1 < len(tokens):
-            header_raw = unquote(tokens[i + 1])
-            if ':' in header_raw:
-                k, v = header_raw.split(':', 1)
+        if t in ('-X', '--request') and i + 1 < n:
+            entries.append(('method', i + 1))
+        if t in ('--url',) and i + 1 < n:
+            entries.append(('url', i + 1))
+        if not t.startswith('-') and '://' in t:
+            entries.append(('url_bare', i))
+        if t in ('-H', '--header') and i + 1 < n:
+            entries.append(('header', i + 1))
+        if t in _CURL_DATA_FLAGS and i + 1 < n:
+            entries.append(('data', i + 1))
+    return entries
+
+
+def _build_parsed_request(entries):
+    """由 [(kind, 去引号后的值)] 组装 method/url/headers/body/query params"""
+    method = 'GET'
+    url = ''
+    headers = {}
+    body_parts = []
+    for kind, value in entries:
+        if kind == 'method':
+            method = value.upper()
+        elif kind == 'url':
+            url = value
+        elif kind == 'url_bare':
+            if not url:
+                url = value
+        elif kind == 'header':
+            if ':' in value:
+                k, v = value.split(':', 1)
                 headers[k.strip()] = v.strip()
-        if t in ('-d', '--data', '--data-raw', '--data-binary') and i + 1 < len(tokens):
-            body_parts.append(unquote(tokens[i + 1]))
-            method='POST'
+        elif kind == 'data':
+            body_parts.append(value)
+            method = 'POST'
 
     body = '\n'.join([p for p in body_parts if p is not None]) if body_parts else ''
 
@@ -301,220 +1221,3054 @@ def _parse_curl_request(curl_cmd: str):
     }
 
 
-def _parse_response_parts(stdout: str, stderr: str):
-    """从 curl -v 输出中提取最后一次响应 header 与响应 body。
+def _parse_curl_request(curl_cmd: str):
+    """从 curl 命令里解析请求信息: method/url/headers/body/query params"""
+    # 简单切分，考虑引号包裹
+    # 注意：这不是完全可靠的 shell 解析，但对常见用法有效
+    tokens = _CURL_TOKEN_RE.findall(curl_cmd)
+    return _build_parsed_request([(kind, _unquote(tokens[i])) for kind, i in _curl_request_entries(tokens)])
+
+
+class _CompiledTemplate:
+    """编译后的 curl 模板：每个批量只做一次 shell 类型检测和占位符切分，逐行渲染只是把字面量片段与转义后的变量值拼接。
+    请求结构由 _parse_curl_request 解析渲染结果。
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.shell_type = _detect_shell_type(text)
+        parts = _PLACEHOLDER_RE.split(text)
+        self.literals = parts[0::2]
+        self.names = parts[1::2]
+        self.slot_names = tuple(dict.fromkeys(self.names))
+
+    def _escaped(self, variables):
+        values = {}
+        for name in self.slot_names:
+            if name in variables:
+                value = variables[name]
+                values[name] = value if type(value) is str else _escape_value(value, self.shell_type)
+        return values
+
+    def _join(self, values) -> str:
+        literals = self.literals
+        out = [literals[0]]
+        for name, literal in zip(self.names, literals[1:]):
+            out.append(values[name] if name in values else '{{' + name + '}}')
+            out.append(literal)
+        return ''.join(out)
+
+    def render(self, variables) -> str:
+        return self._join(self._escaped(variables))
+
+    def prepare(self, variables):
+        """渲染一行并解析请求，返回 (curl 命令, parsed_req)"""
+        rendered = self._join(self._escaped(variables))
+        return rendered, _parse_curl_request(rendered)
+
+    def render_rows(self, columns, rows):
+        """按列一次性渲染所有行（columns 为列名，rows 为行字典列表），返回与行顺序一致的 [(curl 命令, parsed_req)]"""
+        names = [name for name in self.slot_names if name in columns]
+        escaped = [[_escape_value(row.get(name, ''), self.shell_type) for row in rows] for name in names]
+        prepared = []
+        for row in zip(*escaped) if escaped else ([()] * len(rows)):
+            rendered = self._join(dict(zip(names, row)))
+            prepared.append((rendered, _parse_curl_request(rendered)))
+        return prepared
+
+
+@functools.lru_cache(maxsize=128)
+def _compile_template(text: str) -> _CompiledTemplate:
+    return _CompiledTemplate(text)
+
+
+def _parse_verbose_trace(stderr: str):
+    """从 curl -v 轨迹中解析最后一次响应的 (状态码, 响应头)。
     curl -v 会在 stderr 打印形如：
       < HTTP/1.1 200 OK
       < Content-Type: application/json
-    我们基于以 "< " 开头的行解析最后一个响应头块。
+    从最后一个 "< HTTP/" 状态行开始向后读取连续的 "< " 行，不拆分整个 stderr，也不扫描 body。
     """
+    start = stderr.rfind('\n< HTTP/') + 1
+    if start == 0 and not stderr.startswith('< HTTP/'):
+        return None, {}
+    end = stderr.find('\n', start)
+    status_parts = stderr[start + 2:end if end != -1 else len(stderr)].split(None, 2)
+    status_code = int(status_parts[1]) if len(status_parts) > 1 and status_parts[1].isdigit() else None
+
     response_headers = {}
-    lines = (stderr or '').splitlines()
-    # 收集所有以"< HTTP"开头的位置，选择最后一个
-    status_indices = [i for i, line in enumerate(lines) if line.startswith('< HTTP/')]
-    start_idx = status_indices[-1] if status_indices else None
-    if start_idx is not None:
-        # 从状态行之后的下一行开始，直到遇到空行或非"< "开头
-        for j in range(start_idx + 1, len(lines)):
-            line = lines[j]
-            if not line.startswith('< '):
-                # 可能是空行或其它，视为 header 结束
-                if line.strip() == '':
-                    break
-                else:
-                    break
-            header_line = line[2:]  # 去掉前缀"< "
-            if ':' in header_line:
-                k, v = header_line.split(':', 1)
-                response_headers[k.strip()] = v.strip()
+    while end != -1:
+        line_start = end + 1
+        end = stderr.find('\n', line_start)
+        line = stderr[line_start:end if end != -1 else len(stderr)]
+        if not line.startswith('< '):
+            break  # 空行 "<" 或其它输出，视为 header 结束
+        header_line = line[2:].rstrip('\r')
+        if ':' in header_line:
+            k, v = header_line.split(':', 1)
+            response_headers[k.strip()] = v.strip()
+    return status_code, response_headers
 
-    # body 在 stdout；若因 Windows echo 污染，这里已通过 @echo off 规避
-    response_body = stdout or ''
-    return response_headers, response_body
 
+# ==== 原生 HTTP 引擎（engine="native"）====
+# 对可以完整表达的 curl 命令，直接用连接池里的 keep-alive 连接发请求，
+# 省去写临时脚本、fork bash/curl 以及每行一次的 TCP/TLS 握手；
+# 无法表达的命令（管道、变量展开、cmd 风格、未知参数等）返回 None，由调用方回退到子进程执行。
 
-@app.route('/execute_curl', methods=['POST'])
-def execute_curl():
-    data = request.json or {}
-    curl_command = data.get('curl_command', '')
-    variables = data.get('variables', {})
+_NATIVE_ARG_FLAGS = {
+    '-X': 'method', '--request': 'method',
+    '-H': 'header', '--header': 'header',
+    '-d': 'data', '--data': 'data', '--data-raw': 'data', '--data-binary': 'data', '--data-ascii': 'data',
+    '--url': 'url',
+    '-m': 'max_time', '--max-time': 'max_time',
+    '--connect-timeout': 'connect_timeout',
+}
+_NATIVE_BOOL_FLAGS = {
+    '-s': None, '--silent': None, '-S': None, '--show-error': None,
+    '-v': None, '--verbose': None,
+    '-k': 'insecure', '--insecure': 'insecure',
+    '--compressed': 'compressed',
+}
+_NATIVE_SHORT_BOOL = {'s', 'S', 'v', 'k'}
+
+
+def _shell_tokens(curl_cmd: str):
+    """按 bash 规则切分单条 curl 命令；含 cmd 转义、变量/命令展开或管道等时返回 None"""
+    if '^' in curl_cmd or '$' in curl_cmd or '`' in curl_cmd:
+        return None
+    try:
+        lexer = shlex.shlex(curl_cmd.replace('\\\r\n', ' ').replace('\\\n', ' '),
+                            posix=True, punctuation_chars=True)
+        lexer.whitespace_split = True
+        tokens = list(lexer)
+    except ValueError:
+        return None
+    if not tokens or tokens[0] not in ('curl', 'curl.exe'):
+        return None
+    if any(t and set(t) <= set('();<>|&') for t in tokens):
+        return None
+    return tokens
+
+
+def _native_request_spec(curl_cmd: str):
+    """把 curl 命令转换为原生请求描述；遇到无法等价表达的写法返回 None"""
+    tokens = _shell_tokens(curl_cmd)
+    if tokens is None:
+        return None
+
+    spec = {
+        'method': None, 'url': '', 'headers': [], 'data': [],
+        'max_time': None, 'connect_timeout': None,
+        'insecure': False, 'compressed': False,
+    }
+
+    def apply(kind, value):
+        if kind == 'method':
+            spec['method'] = value.upper()
+        elif kind == 'header':
+            spec['headers'].append(value)
+        elif kind == 'data':
+            if value.startswith('@'):
+                raise ValueError('file data')
+            spec['data'].append(value)
+        elif kind == 'url':
+            spec['url'] = value
+        else:
+            spec[kind] = float(value)
+
+    i = 1
+    try:
+        while i < len(tokens):
+            t = tokens[i]
+            if t in _NATIVE_ARG_FLAGS:
+                if i + 1 >= len(tokens):
+                    return None
+                apply(_NATIVE_ARG_FLAGS[t], tokens[i + 1])
+                i += 2
+                continue
+            if t in _NATIVE_BOOL_FLAGS:
+                if _NATIVE_BOOL_FLAGS[t]:
+                    spec[_NATIVE_BOOL_FLAGS[t]] = True
+            elif t.startswith('-') and not t.startswith('--') and len(t) > 2:
+                # -XPOST / -HFoo:bar / -sSk 之类的紧凑写法
+                if t[:2] in ('-X', '-H', '-d', '-m'):
+                    apply(_NATIVE_ARG_FLAGS[t[:2]], t[2:])
+                elif set(t[1:]) <= _NATIVE_SHORT_BOOL:
+                    if 'k' in t:
+                        spec['insecure'] = True
+                else:
+                    return None
+            elif t.startswith('-'):
+                return None
+            elif spec['url']:
+                return None  # 多个 URL 交给 curl 处理
+            else:
+                spec['url'] = t
+            i += 1
+    except ValueError:
+        return None
+
+    if not spec['url']:
+        return None
+    if '://' not in spec['url']:
+        spec['url'] = 'http://' + spec['url']
+    parts = urlsplit(spec['url'])
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        return None
+
+    headers = {}
+    for raw in spec['headers']:
+        if ':' not in raw:
+            return None  # "Name;" 等清空/空值写法交给 curl
+        k, v = raw.split(':', 1)
+        if v.strip():
+            headers[k.strip()] = v.strip()
+        else:
+            headers.pop(k.strip(), None)
+
+    body = None
+    if spec['data']:
+        body = '&'.join(spec['data']).encode('utf-8')
+        if not any(k.lower() == 'content-type' for k in headers):
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+    method = spec['method'] or ('POST' if body is not None else 'GET')
+    if not any(k.lower() == 'accept' for k in headers):
+        headers['Accept'] = '*/*'
+    if spec['compressed'] and not any(k.lower() == 'accept-encoding' for k in headers):
+        headers['Accept-Encoding'] = 'gzip, deflate'
+
+    return {
+        'method': method,
+        'url': spec['url'],
+        'scheme': parts.scheme,
+        'host': parts.hostname,
+        'port': parts.port or (443 if parts.scheme == 'https' else 80),
+        'path': (parts.path or '/') + (f"?{parts.query}" if parts.query else ''),
+        'headers': headers,
+        'body': body,
+        'timeout': spec['connect_timeout'] or spec['max_time'],
+        'max_time': spec['max_time'],
+        'insecure': spec['insecure'],
+        'compressed': spec['compressed'],
+    }
+
+
+class _NativeConnectionPool:
+    """按 (scheme, host, port, insecure) 缓存空闲 keep-alive 连接，线程间共享"""
+
+    def __init__(self, max_idle_per_host: int = 16):
+        self.max_idle_per_host = max_idle_per_host
+        self._lock = threading.Lock()
+        self._idle = {}
+
+    def acquire(self, spec):
+        key = (spec['scheme'], spec['host'], spec['port'], spec['insecure'])
+        with self._lock:
+            conns = self._idle.get(key)
+            if conns:
+                return key, conns.pop(), True
+        if spec['scheme'] == 'https':
+            context = ssl.create_default_context()
+            if spec['insecure']:
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+            conn = http.client.HTTPSConnection(spec['host'], spec['port'], timeout=spec['timeout'], context=context)
+        else:
+            conn = http.client.HTTPConnection(spec['host'], spec['port'], timeout=spec['timeout'])
+        return key, conn, False
+
+    def release(self, key, conn):
+        with self._lock:
+            conns = self._idle.setdefault(key, [])
+            if len(conns) < self.max_idle_per_host:
+                conns.append(conn)
+                return
+        conn.close()
+
+
+_native_pool = _NativeConnectionPool()
+
+
+def _native_error(spec, exc):
+    """把连接异常映射成与 curl 一致的退出码和错误信息"""
+    if isinstance(exc, socket.gaierror):
+        return 6, f"curl: (6) Could not resolve host: {spec['host']}"
+    if isinstance(exc, (socket.timeout, TimeoutError)):
+        return 28, f"curl: (28) Operation timed out: {exc}"
+    if isinstance(exc, ConnectionRefusedError):
+        return 7, f"curl: (7) Failed to connect to {spec['host']} port {spec['port']}: Connection refused"
+    if isinstance(exc, ssl.SSLError):
+        return 35, f"curl: (35) {exc}"
+    return 56, f"curl: (56) Failure when receiving data from the peer: {exc}"
+
+
+def _native_failure(spec, exc, curl_cmd, trace, timing, start, verbose):
+    code, msg = _native_error(spec, exc)
+    proc = subprocess.CompletedProcess(curl_cmd, code, '', '\n'.join((trace if verbose else []) + [msg]) + '\n')
+    proc.timing = {**timing, 'total': time.perf_counter() - start}
+    proc.status_code, proc.headers = None, {}
+    return proc
+
+
+def _run_native_request(spec, curl_cmd: str = '', verbose: bool = False, timeout=None):
+    """用连接池执行请求，返回与 _run_curl_script 相同形状的 CompletedProcess（附带 status_code / headers / timing）。
+    verbose 时 stderr 按 curl -v 的格式合成请求与响应轨迹，否则只包含错误信息。
+    timeout 为单行超时，与命令中的 --connect-timeout / --max-time 取较小者作为 socket 超时。
+    """
+    if timeout:
+        spec = {**spec, 'timeout': min(spec['timeout'] or timeout, timeout)}
+    trace = [f"> {spec['method']} {spec['path']} HTTP/1.1", f"> Host: {spec['host']}"]
+    trace += [f"> {k}: {v}" for k, v in spec['headers'].items()]
+    trace.append('>')
+    # 与 curl 的 timing 字段对应；DNS 与 TLS 握手包含在 connect 中，复用连接时 connect 为 0
+    timing = {'dns': None, 'connect': 0.0, 'tls': None, 'ttfb': None, 'total': None,
+              'bytes_up': len(spec['body'] or b''), 'bytes_down': 0}
+    start = time.perf_counter()
+
+    for attempt in range(2):
+        key, conn, reused = _native_pool.acquire(spec)
+        conn.timeout = spec['timeout']
+        if conn.sock is not None and spec['timeout']:
+            conn.sock.settimeout(spec['timeout'])
+        try:
+            if conn.sock is None:
+                connect_start = time.perf_counter()
+                conn.connect()
+                timing['connect'] = time.perf_counter() - connect_start
+            conn.request(spec['method'], spec['path'], body=spec['body'], headers=spec['headers'])
+            resp = conn.getresponse()
+            timing['ttfb'] = time.perf_counter() - start
+            payload = resp.read()
+            timing['total'] = time.perf_counter() - start
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+            conn.close()
+            if reused and attempt == 0:
+                continue  # 空闲连接已被服务端关闭，换一条新连接重试一次
+            return _native_failure(spec, e, curl_cmd, trace, timing, start, verbose)
+        except Exception as e:
+            conn.close()
+            return _native_failure(spec, e, curl_cmd, trace, timing, start, verbose)
+        break
+    timing['bytes_down'] = len(payload)
+
+    if resp.will_close:
+        conn.close()
+    else:
+        _native_pool.release(key, conn)
+
+    if spec['compressed']:
+        encoding = (resp.getheader('Content-Encoding') or '').lower()
+        if encoding in ('gzip', 'x-gzip'):
+            payload = zlib.decompress(payload, 16 + zlib.MAX_WBITS)
+        elif encoding == 'deflate':
+            payload = zlib.decompress(payload)
+
+    stderr = ''
+    if verbose:
+        version = 'HTTP/1.0' if resp.version == 10 else 'HTTP/1.1'
+        trace.append(f"< {version} {resp.status} {resp.reason}")
+        trace += [f"< {k}: {v}" for k, v in resp.getheaders()]
+        trace.append('<')
+        stderr = '\n'.join(trace) + '\n'
+    proc = subprocess.CompletedProcess(curl_cmd, 0, payload.decode('utf-8', errors='replace'), stderr)
+    proc.timing = timing
+    proc.status_code, proc.headers = resp.status, dict(resp.getheaders())
+    return proc
+
+
+# ==== curl --parallel 多路复用（engine="parallel"）====
+# 保留 curl 自身语义，但把并发提交的多条命令合并成块：每块生成一个 -K 配置文件（各命令之间用 --next 分隔），
+# 由一个 curl --parallel 进程执行，进程启动与连接复用在块内共享。
+# 每个传输单独写 -D 头文件与 -o 响应体文件，并通过 --write-out 标记行回报状态码与退出码，再拆回逐行结果。
+
+# 这些参数会与逐传输的输出拆分冲突，遇到时回退到单独执行
+_MULTIPLEX_RESERVED = {
+    '-o', '--output', '-O', '--remote-name', '--remote-name-all', '--output-dir', '-J', '--remote-header-name',
+    '-D', '--dump-header', '-w', '--write-out', '-i', '--include',
+    '-K', '--config', '-q', '--disable', '-:', '--next',
+    '-Z', '--parallel', '--parallel-max', '--parallel-immediate',
+    '--trace', '--trace-ascii', '--stderr',
+}
+# 这些是全局输出选项，由多路复用进程统一设置
+_MULTIPLEX_DROPPED = {'-v', '--verbose', '-s', '--silent', '-S', '--show-error'}
+
+
+@functools.lru_cache(maxsize=1)
+def _curl_option_table():
+    """解析 `curl --help all`，返回 {选项: 是否需要参数}；curl 不可用时返回空表"""
+    try:
+        out = subprocess.run(['curl', '--help', 'all'], capture_output=True, text=True, timeout=10).stdout
+    except Exception:
+        return {}
+    table = {}
+    for m in re.finditer(r'^\s*(?:(-\S),\s+)?(--[\w.-]+)(\s+<)?', out or '', re.M):
+        takes_arg = bool(m.group(3))
+        table[m.group(2)] = takes_arg
+        if m.group(1):
+            table[m.group(1)] = takes_arg
+        if not takes_arg and not m.group(2).startswith('--no-'):
+            table['--no-' + m.group(2)[2:]] = False
+    return table
+
+
+def _curl_config_quote(value: str) -> str:
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"')
+               .replace('\n', '\\n').replace('\r', '\\r').replace('\t', '\\t'))
+    return f'"{escaped}"'
+
+
+def _multiplex_config_block(curl_cmd: str):
+    """把单条 curl 命令转换为 -K 配置文件中的一段（选项行列表）；无法安全转换时返回 None"""
+    tokens = _shell_tokens(curl_cmd)
+    table = _curl_option_table()
+    if tokens is None or not table:
+        return None
+
+    options = []
+    i = 1
+    while i < len(tokens):
+        t = tokens[i]
+        if t.startswith('--'):
+            if t not in table:
+                return None
+            if table[t]:
+                if i + 1 >= len(tokens):
+                    return None
+                options.append((t, tokens[i + 1]))
+                i += 2
+                continue
+            options.append((t, None))
+        elif t.startswith('-') and len(t) > 1:
+            # 短选项，可能是 -sSk 或 -XPOST 这样的合并写法
+            for j in range(1, len(t)):
+                flag = '-' + t[j]
+                if flag not in table:
+                    return None
+                if table[flag]:
+                    value = t[j + 1:]
+                    if not value:
+                        if i + 1 >= len(tokens):
+                            return None
+                        i += 1
+                        value = tokens[i]
+                    options.append((flag, value))
+                    break
+                options.append((flag, None))
+        else:
+            options.append(('--url', t))
+        i += 1
+
+    if any(name in _MULTIPLEX_RESERVED for name, _ in options):
+        return None
+    if sum(1 for name, _ in options if name == '--url') != 1:
+        return None  # 每段必须恰好对应一个传输
+    return [name if value is None else f"{name} {_curl_config_quote(value)}"
+            for name, value in options if name not in _MULTIPLEX_DROPPED]
+
+
+def _headers_to_verbose(header_text: str) -> str:
+    """把 -D 头文件内容转换为 curl -v 风格的 "< " 行，便于复用现有解析函数"""
+    lines = []
+    for line in header_text.splitlines():
+        lines.append(f"< {line}" if line.strip() else '<')
+    return '\n'.join(lines) + ('\n' if lines else '')
+
+
+def _run_curl_parallel(blocks, curl_cmds, verbose=None, timeout=None, cancel=None):
+    """用一个 curl --parallel 进程执行多段配置，按输入顺序返回 CompletedProcess 列表；
+    verbose[idx] 为真的传输在 stderr 中附带 "< " 风格的响应头轨迹。
+    与单独的 curl 子进程一样经 _wait_process 等待：超过 timeout 秒或 cancel 被置位时杀掉整个进程组，
+    尚未回报的传输带上 killed 属性（'timeout' / 'cancelled'）"""
+    workdir = tempfile.mkdtemp(prefix='curlx-')
+    marker = f"CURLX-{uuid.uuid4().hex}"
+    try:
+        cfg_lines = []
+        for idx, block in enumerate(blocks):
+            if idx:
+                cfg_lines.append('--next')
+            cfg_lines.extend(block)
+            cfg_lines.append(f"--output {_curl_config_quote(os.path.join(workdir, f'{idx}.body'))}")
+            cfg_lines.append(f"--dump-header {_curl_config_quote(os.path.join(workdir, f'{idx}.head'))}")
+            cfg_lines.append(f"--write-out {_curl_config_quote(f'{marker} {idx} %{{http_code}} %{{exitcode}} {_TIMING_WRITE_OUT} %{{errormsg}}' + chr(10))}")
+        cfg_path = os.path.join(workdir, 'transfers.cfg')
+        with open(cfg_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(cfg_lines) + '\n')
+
+        parallel_max = max(1, min(len(blocks), app.config['PARALLEL_MAX']))
+        proc = subprocess.Popen(
+            ['curl', '-sS', '--parallel', '--parallel-immediate', '--parallel-max', str(parallel_max), '-K', cfg_path],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            start_new_session=(os.name != 'nt'),
+            creationflags=(subprocess.CREATE_NEW_PROCESS_GROUP if os.name == 'nt' else 0)
+        )
+        stdout, proc_stderr, killed = _wait_process(proc, timeout, cancel)
+
+        reported = {}
+        line_re = rf'^{marker} (\d+) (\d+) (\d+) ((?:\S+ ){{{len(_TIMING_FIELDS)}}})(.*)$'
+        for m in re.finditer(line_re, stdout or '', re.M):
+            reported[int(m.group(1))] = (int(m.group(3)), m.group(5).strip(), _timing_from_values(m.group(4).split()))
+
+        results = []
+        for idx, curl_cmd in enumerate(curl_cmds):
+            body_path = os.path.join(workdir, f'{idx}.body')
+            head_path = os.path.join(workdir, f'{idx}.head')
+            body = ''
+            headers = ''
+            if os.path.exists(body_path):
+                with open(body_path, 'r', encoding='utf-8', errors='replace') as f:
+                    body = f.read()
+            if os.path.exists(head_path):
+                with open(head_path, 'r', encoding='utf-8', errors='replace') as f:
+                    headers = f.read()
+            stderr = _headers_to_verbose(headers) if verbose and verbose[idx] else ''
+            timing = None
+            if idx in reported:
+                exitcode, errormsg, timing = reported[idx]
+                if exitcode:
+                    stderr += f"curl: ({exitcode}) {errormsg}\n"
+            elif killed:
+                # 进程组被杀掉时仍在进行的传输，与 _run_script 一致：超时记为退出码 28
+                exitcode = 28 if killed == 'timeout' else 1
+                stderr += (proc_stderr or '') + f"curl: process group killed ({killed})\n"
+            else:
+                # 传输未回报标记（curl 提前退出等），使用进程级结果
+                exitcode = proc.returncode or 1
+                stderr += proc_stderr or ''
+            result = subprocess.CompletedProcess(curl_cmd, exitcode, body, stderr)
+            result.killed = None if idx in reported else killed
+            result.timing = timing
+            result.status_code, result.headers = _parse_header_block(headers)
+            results.append(result)
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# 多路复用进程在块内最晚的截止时间之后再等多少秒才整组杀掉
+_PARALLEL_KILL_GRACE = 1.0
+
+
+class _ChunkCancel:
+    """多路复用块的取消条件：块内所有传输的取消事件都已置位（只取消同一块里其他批量的传输不会被牵连）"""
+
+    def __init__(self, events):
+        self._events = events
+
+    def is_set(self) -> bool:
+        return all(event.is_set() for event in self._events)
+
+
+class _CurlMultiplexer:
+    """收集各工作线程并发提交的命令，攒满一块或等待 PARALLEL_LINGER 秒后交给一个 curl 进程执行"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._pending = []
+        self._thread = None
+        self._runner = None
+
+    def submit(self, block, curl_cmd, verbose: bool = False, timeout=None, cancel=None) -> Future:
+        future = Future()
+        deadline = time.monotonic() + timeout if timeout else None
+        with self._cond:
+            self._pending.append((block, curl_cmd, verbose, deadline, cancel, future))
+            if self._thread is None:
+                self._runner = ThreadPoolExecutor(max_workers=app.config['PARALLEL_PROCESSES'],
+                                                  thread_name_prefix='curl-multiplex')
+                self._thread = threading.Thread(target=self._loop, name='curl-multiplex-collector', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return future
+
+    def _loop(self):
+        while True:
+            chunk_size = app.config['PARALLEL_CHUNK_SIZE']
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                deadline = time.monotonic() + app.config['PARALLEL_LINGER']
+                while len(self._pending) < chunk_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                chunk = self._pending[:chunk_size]
+                del self._pending[:chunk_size]
+            self._runner.submit(self._run_chunk, chunk)
+
+    @staticmethod
+    def _run_chunk(chunk):
+        # 进程的期限取块内最晚的截止时间（有任一传输不限时则不限），并留出余量让 curl 自己的 --max-time 先生效；
+        # 取消事件来自各行所属批量
+        deadlines = [c[3] for c in chunk]
+        timeout = (None if None in deadlines
+                   else max(0.001, max(deadlines) - time.monotonic() + _PARALLEL_KILL_GRACE))
+        events = [c[4] for c in chunk]
+        cancel = _ChunkCancel(events) if None not in events else None
+        try:
+            results = _run_curl_parallel([c[0] for c in chunk], [c[1] for c in chunk], [c[2] for c in chunk],
+                                         timeout, cancel)
+        except Exception as e:
+            for *_, future in chunk:
+                future.set_exception(e)
+            return
+        for (*_, future), result in zip(chunk, results):
+            future.set_result(result)
+
+
+_curl_multiplexer = _CurlMultiplexer()
+
+
+def _run_request(curl_cmd: str, engine: str = 'curl', verbose: bool = False, timeout=None, cancel=None):
+    """按引擎执行请求；native / parallel 无法表达的命令自动回退到单独的 curl 子进程。
+    timeout 为单行超时秒数；cancel（threading.Event）被置位时尽快终止 curl 子进程。
+    """
+    verbose = verbose or _wants_verbose_capture(curl_cmd)
+    with _metrics.timer('curl_executor_request_duration_seconds', engine=engine):
+        if engine == 'native':
+            spec = _native_request_spec(curl_cmd)
+            if spec is not None:
+                return _run_native_request(spec, curl_cmd, verbose, timeout)
+        elif engine == 'parallel':
+            block = _multiplex_config_block(curl_cmd)
+            if block is not None:
+                if timeout and not any(line.split(' ', 1)[0] in ('-m', '--max-time') for line in block):
+                    # 多路复用进程内无法单独杀掉某个传输，交给 curl 自身的 --max-time 控制
+                    block.append(f"--max-time {timeout:.3f}")
+                return _curl_multiplexer.submit(block, curl_cmd, verbose, timeout, cancel).result()
+        return _run_curl_script(curl_cmd, verbose, timeout, cancel)
+
+
+def _evaluate_assertions(compiled_assertions, response_data):
+    """依次执行已编译的断言（见 _compile_assertions），同一行共用一个 response 对象"""
+    if not compiled_assertions:
+        return []
+    with _metrics.timer('curl_executor_assertion_seconds'):
+        response = _AssertionResponse(response_data)
+        results = [_run_assertion(assertion, code, response) for assertion, code in compiled_assertions]
+    for r in results:
+        _metrics.inc('curl_executor_assertions_total',
+                     result='error' if 'error' in r else ('pass' if r['success'] else 'fail'))
+    return results
+
+
+def _assertions_passed(assertion_results):
+    return all(a.get('success', False) for a in assertion_results) if assertion_results else None
+
+
+def _execute_rendered(current_cmd: str, assertions, limiter=None, parsed_req=None, engine: str = 'curl',
+                      verbose: bool = False, timeout=None, cancel=None):
+    """执行已替换变量的 curl 命令并评估断言（assertions 为 _compile_assertions 的结果），
+    返回 (CompletedProcess, response_data, assertion_results)"""
+    if limiter is not None:
+        if parsed_req is None:
+            parsed_req = _parse_curl_request(current_cmd)
+        with limiter.slot(parsed_req.get('url')):
+            result = _run_request(current_cmd, engine, verbose, timeout, cancel)
+    else:
+        result = _run_request(current_cmd, engine, verbose, timeout, cancel)
+
+    stderr = result.stderr or ''
+    if hasattr(result, 'headers'):
+        status_code, resp_headers = result.status_code, result.headers
+    else:
+        status_code, resp_headers = _parse_verbose_trace(stderr)
+    _metrics.inc('curl_executor_requests_total', host=_host_key((parsed_req or {}).get('url')) or 'unknown',
+                 code=status_code if status_code is not None else 'none')
+    # body 即 stdout，只保存一份；stdout / raw 在断言或展示需要时再计算
+    response_data = {
+        'code': status_code,
+        'stderr': stderr,
+        'returncode': result.returncode,
+        'headers': resp_headers,
+        'body': result.stdout or '',
+        'timing': getattr(result, 'timing', None)
+    }
+    return result, response_data, _evaluate_assertions(assertions, response_data)
+
+
+def _host_key(url: str) -> str:
+    parts = urlsplit(url or '')
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+class _HostLimiter:
+    """按目标主机（scheme://host:port）限制同时在途的请求数；limit <= 0 表示不限制"""
+
+    def __init__(self, limit: int = 0):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._semaphores = {}
+
+    def _semaphore(self, url: str):
+        key = _host_key(url)
+        with self._lock:
+            sem = self._semaphores.get(key)
+            if sem is None:
+                sem = self._semaphores[key] = threading.BoundedSemaphore(self.limit)
+            return sem
+
+    @contextmanager
+    def slot(self, url: str):
+        if self.limit <= 0:
+            yield
+            return
+        sem = self._semaphore(url)
+        with sem:
+            yield
+
+
+class _CircuitBreaker:
+    """按目标主机的熔断器：连续 threshold 次失败后熔断（open），cooldown 秒后放行一个探测请求（half_open），
+    探测成功则恢复（closed），失败则重新计时。"""
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._hosts = {}  # host -> {'failures', 'opened_at', 'probing'}
+
+    def _try(self, key: str):
+        """返回 (状态, 建议等待秒数)；状态为 half_open 时调用方即为本轮的探测请求"""
+        with self._lock:
+            host = self._hosts.get(key)
+            if host is None or host['opened_at'] is None:
+                return 'closed', 0.0
+            waited = time.monotonic() - host['opened_at']
+            if waited >= self.cooldown and not host['probing']:
+                host['probing'] = True
+                return 'half_open', 0.0
+            return 'open', (self.cooldown - waited) if waited < self.cooldown else 0.05
+
+    def acquire(self, url: str, defer: bool = False, budget=None) -> str:
+        """请求前检查熔断状态；defer 时等待到可以探测（或截止时间、取消）为止，否则熔断时立即返回 open"""
+        key = _host_key(url)
+        while True:
+            state, wait = self._try(key)
+            if state != 'open' or not defer:
+                return state
+            if budget is not None and budget.deadline is not None:
+                wait = min(wait, max(0.0, budget.deadline - time.monotonic()))
+            if budget is not None and budget.cancel_event is not None:
+                if budget.cancel_event.wait(wait):
+                    return 'open'
+            else:
+                time.sleep(wait)
+            if budget is not None and budget.expired():
+                return 'open'
+
+    def record(self, url: str, ok: bool):
+        key = _host_key(url)
+        with self._lock:
+            host = self._hosts.setdefault(key, {'failures': 0, 'opened_at': None, 'probing': False})
+            if ok:
+                host.update(failures=0, opened_at=None, probing=False)
+                return
+            host['failures'] += 1
+            if host['probing'] or host['failures'] >= self.threshold:
+                host['opened_at'] = time.monotonic()
+            host['probing'] = False
+
+
+_IDEMPOTENT_METHODS = {'GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS', 'TRACE'}
+
+
+def _is_transient_failure(result, response_data) -> bool:
+    """连接错误、超时（curl 非 0 退出且没有状态码，或退出码 28）与 5xx 计为熔断 / 重试意义上的失败"""
+    code = response_data.get('code')
+    if result.returncode == 28 or getattr(result, 'killed', None) == 'timeout':
+        return True
+    if code is None:
+        return result.returncode != 0
+    return code >= 500
+
+
+def _option_number(data, key: str, default, cast=float):
+    try:
+        return cast(data[key]) if data.get(key) is not None else default
+    except (TypeError, ValueError):
+        return default
+
+
+def _batch_options(data):
+    """读取批量执行参数：concurrency / per_host_concurrency / engine / verbose / timeout / deadline /
+    retries / circuit_breaker，并按配置上限截断"""
+    max_workers = app.config['MAX_CONCURRENCY']
+    try:
+        concurrency = int(data.get('concurrency') or app.config['DEFAULT_CONCURRENCY'])
+    except (TypeError, ValueError):
+        concurrency = app.config['DEFAULT_CONCURRENCY']
+    try:
+        per_host = int(data.get('per_host_concurrency') or 0)
+    except (TypeError, ValueError):
+        per_host = 0
+    # timeout：单行超时秒数（缺省取 ROW_TIMEOUT，0 表示不限制）；deadline：整批截止秒数（0 表示不限制）
+    try:
+        timeout = float(data['timeout']) if data.get('timeout') is not None else app.config['ROW_TIMEOUT']
+    except (TypeError, ValueError):
+        timeout = app.config['ROW_TIMEOUT']
+    try:
+        deadline = float(data.get('deadline') or 0)
+    except (TypeError, ValueError):
+        deadline = 0.0
+    # 执行引擎：curl（默认，子进程）、native（进程内连接池）或 parallel（curl --parallel 多路复用）
+    engine = (data.get('engine') or app.config['DEFAULT_ENGINE'] or 'curl').lower()
+    return {
+        'concurrency': max(1, min(concurrency, max_workers)),
+        'per_host': max(0, per_host),
+        'engine': engine if engine in ('curl', 'native', 'parallel') else 'curl',
+        # verbose=true 时保留 curl -v 轨迹（stderr），默认只采集状态码、响应头、body 与耗时
+        'verbose': bool(data.get('verbose')),
+        'timeout': max(0.0, timeout),
+        'deadline': max(0.0, deadline),
+        # retries：幂等请求（GET/HEAD/PUT/DELETE/OPTIONS）遇到连接错误、超时或 5xx 时的最多重试次数
+        'retries': max(0, _option_number(data, 'retries', 0, int)),
+        'retry_backoff': max(0.0, _option_number(data, 'retry_backoff', app.config['RETRY_BACKOFF'])),
+        # circuit_breaker：{threshold, cooldown, mode}；mode 为 fail（熔断时立即失败）或 defer（等待探测放行）
+        'breaker': _breaker_options(data.get('circuit_breaker')),
+        # distributed：把行分块交给 worker 进程执行（concurrency 为每个 worker 的并发数）
+        'distributed': bool(data.get('distributed')),
+    }
+
+
+def _breaker_options(config):
+    # 熔断默认关闭：circuit_breaker 为 true 或对象（可为空对象）时才启用
+    if config is None or config is False:
+        return {'threshold': 0, 'cooldown': 0.0, 'mode': 'fail'}
+    config = config if isinstance(config, dict) else {}
+    return {
+        'threshold': max(0, _option_number(config, 'threshold', app.config['BREAKER_THRESHOLD'] or 5, int)),
+        'cooldown': max(0.0, _option_number(config, 'cooldown', app.config['BREAKER_COOLDOWN'])),
+        'mode': 'defer' if config.get('mode') == 'defer' else 'fail',
+    }
+
+
+class _RowBudget:
+    """批量执行的时间预算：单行超时、整批截止时间与取消事件"""
+
+    def __init__(self, row_timeout: float = 0, deadline: float = 0, cancel_event=None):
+        self.row_timeout = row_timeout or None
+        self.deadline = time.monotonic() + deadline if deadline else None
+        self.cancel_event = cancel_event
+
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def timeout(self):
+        """当前行可用的秒数：单行超时与距截止时间的剩余秒数中较小者；None 表示不限制"""
+        if self.deadline is None:
+            return self.row_timeout
+        remaining = max(0.001, self.deadline - time.monotonic())
+        return min(self.row_timeout, remaining) if self.row_timeout else remaining
+
+
+def _skipped_row(row_index, variables):
+    # 截止时间已过、尚未开始的行记为 skipped（续跑时会重新执行）
+    return {
+        'row_index': row_index,
+        'variables': variables,
+        'status': 'skipped',
+        'error': 'Batch deadline exceeded before the row started',
+        'success': False
+    }
+
+
+def _run_rows(items, row_fn, concurrency: int = 1, per_host: int = 0, job=None, sink=None, collect: bool = True,
+              budget=None):
+    """执行批量行并按 row_index 排序返回结果。
+
+    items 为 (row_index, variables) 序列；row_fn(row_index, variables, limiter, budget) 返回单行结果字典。
+    concurrency == 1 时在当前线程顺序执行，与原有行为一致。
+    传入 job 时逐行上报进度；job 被取消后尚未开始的行不再执行，执行中的行被终止后同样不记录（续跑时重新执行）。
+    budget（_RowBudget）的截止时间过后，尚未开始的行记为 skipped。
+    sink(row_result) 在每行完成时调用（如追加写入结果文件）；collect 为 False 时不保留行结果，返回空列表。
+    """
+    limiter = _HostLimiter(per_host)
+    budget = budget or _RowBudget(cancel_event=job.cancel_event if job is not None else None)
+
+    def run(row_index, variables):
+        if job is not None and job.cancel_event.is_set():
+            return None
+        if budget.expired():
+            row_result = _skipped_row(row_index, variables)
+        else:
+            row_result = row_fn(row_index, variables, limiter, budget)
+            if row_result.get('status') == 'cancelled':
+                return None
+        if sink is not None:
+            sink(row_result)
+        if job is not None:
+            job.record(row_result)
+        return row_result if collect else None
+
+    if concurrency <= 1:
+        results = [r for r in (run(row_index, variables) for row_index, variables in items) if r is not None]
+    else:
+        # items 可能是流式数据源：最多预取 2 * concurrency 行，其余行在有空位时才读取
+        window = threading.BoundedSemaphore(concurrency * 2)
+        errors = []
+        futures = []
+
+        def done(future):
+            window.release()
+            if future.exception() is not None:
+                errors.append(future.exception())
+
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='curl-row') as pool:
+            for row_index, variables in items:
+                window.acquire()
+                if errors:
+                    break
+                future = pool.submit(run, row_index, variables)
+                future.add_done_callback(done)
+                if collect:
+                    futures.append(future)
+        if errors:
+            raise errors[0]
+        results = [r for r in (f.result() for f in futures) if r is not None]
+    results.sort(key=lambda r: r.get('row_index', 0))
+    return results
+
+
+# ==== 开放模型压测 ====
+# 按固定时钟（目标 RPS，可线性爬坡）发送请求，不等待上一个请求完成；
+# 延迟从计划发送时刻算起，工作线程占满时的排队时间也计入，避免协调遗漏（coordinated omission）。
+
+class _LatencyHistogram:
+    """HDR 风格的对数-线性直方图：以微秒记录，每个 2 的幂区间细分 64 档（相对误差 < 1.6%），内存与样本数无关"""
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    @staticmethod
+    def _index(value: int) -> int:
+        if value < 128:
+            return value
+        shift = value.bit_length() - 7
+        return 128 + (shift - 1) * 64 + ((value >> shift) - 64)
+
+    @staticmethod
+    def _value(index: int) -> int:
+        # 桶内的最大值，百分位按上界报告
+        if index < 128:
+            return index
+        shift = (index - 128) // 64 + 1
+        sub = (index - 128) % 64 + 64
+        return ((sub + 1) << shift) - 1
+
+    def record(self, seconds: float):
+        value = max(0, int(seconds * 1_000_000))
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = max(self.max, value)
+
+    def percentile(self, p: float) -> int:
+        if not self.count:
+            return 0
+        rank = max(1, math.ceil(self.count * p / 100))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self._value(index), self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        """汇总为毫秒；buckets 为 [桶上界微秒, 次数]，可用于合并或绘图"""
+        def ms(us):
+            return round(us / 1000, 3)
+
+        return {
+            'count': self.count,
+            'min': ms(self.min or 0),
+            'mean': ms(self.total / self.count) if self.count else 0.0,
+            'p50': ms(self.percentile(50)),
+            'p90': ms(self.percentile(90)),
+            'p99': ms(self.percentile(99)),
+            'p999': ms(self.percentile(99.9)),
+            'max': ms(self.max),
+            'buckets': [[self._value(i), self.counts[i]] for i in sorted(self.counts)],
+        }
+
+
+def _load_offset(k: int, rate: float, ramp_up: float) -> float:
+    """第 k 个请求（从 0 开始）相对开始时刻的计划发送时间：ramp_up 秒内速率从 0 线性升到 rate，之后保持恒定"""
+    ramp_count = rate * ramp_up / 2
+    if k < ramp_count:
+        return math.sqrt(2 * ramp_up * k / rate)
+    return ramp_up + (k - ramp_count) / rate
+
+
+def _load_request_count(rate: float, ramp_up: float, duration: float) -> int:
+    """duration 秒内按计划应发送的请求数"""
+    if duration <= 0:
+        return 0
+    if duration <= ramp_up:
+        return math.ceil(rate * duration * duration / (2 * ramp_up))
+    return math.ceil(rate * ramp_up / 2 + (duration - ramp_up) * rate)
+
+
+def _load_options(data):
+    """读取压测参数 load: {rate, duration 或 requests, ramp_up}；未开启压测时返回 None，参数非法时抛出 ValueError"""
+    load = data.get('load')
+    if not load:
+        return None
+    if not isinstance(load, dict):
+        raise ValueError('load must be an object')
+    rate = float(load.get('rate') or 0)
+    if rate <= 0:
+        raise ValueError('rate must be greater than 0')
+    ramp_up = max(0.0, float(load.get('ramp_up') or 0))
+    duration = float(load['duration']) if load.get('duration') else None
+    if load.get('requests'):
+        total = int(load['requests'])
+    elif duration:
+        total = _load_request_count(rate, ramp_up, duration)
+    else:
+        raise ValueError('duration or requests is required')
+    return {
+        'rate': rate,
+        'ramp_up': ramp_up,
+        'duration': duration,
+        'requests': max(1, min(total, app.config['LOAD_MAX_REQUESTS'])),
+    }
+
+
+def _run_load(items, row_fn, load: dict, concurrency: int, per_host: int = 0, job=None, sink=None,
+              collect: bool = True, budget=None):
+    """按 load 的计划时刻依次提交 items，最多 concurrency 个请求同时在途；返回 (按 row_index 排序的结果, 压测统计)。
+
+    每行追加 load_timing：scheduled（计划发送时刻，相对开始）、latency（自计划时刻起的延迟）、service_time（实际执行耗时）。
+    budget 的截止时间过后不再按计划等待，剩余的行记为 skipped，不计入延迟统计。
+    """
+    limiter = _HostLimiter(per_host)
+    histogram = _LatencyHistogram()
+    timeline = {}
+    lock = threading.Lock()
+    cancel = job.cancel_event if job is not None else threading.Event()
+    budget = budget or _RowBudget(cancel_event=cancel)
+    start = time.perf_counter()
+
+    def run(row_index, variables, intended):
+        if budget.expired():
+            row_result = _skipped_row(row_index, variables)
+            if sink is not None:
+                sink(row_result)
+            if job is not None:
+                job.record(row_result)
+            return row_result if collect else None
+        begin = time.perf_counter()
+        row_result = row_fn(row_index, variables, limiter, budget)
+        if row_result.get('status') == 'cancelled':
+            return None
+        end = time.perf_counter()
+        row_result['load_timing'] = {
+            'scheduled': round(intended - start, 6),
+            'latency': round(end - intended, 6),
+            'service_time': round(end - begin, 6),
+        }
+        with lock:
+            histogram.record(end - intended)
+            second = int(intended - start)
+            slot = timeline.get(second)
+            if slot is None:
+                slot = timeline[second] = {'second': second, 'completed': 0, 'success': 0, 'failure': 0, 'error': 0}
+            slot['completed'] += 1
+            # error：执行异常、没有拿到状态码或 HTTP 状态码 >= 400；failure：断言未通过
+            code = _row_status_code(row_result)
+            if 'error' in row_result or code is None or code >= 400:
+                slot['error'] += 1
+            if row_result.get('success', False):
+                slot['success'] += 1
+            elif row_result.get('success') is False:
+                slot['failure'] += 1
+        if sink is not None:
+            sink(row_result)
+        if job is not None:
+            job.record(row_result)
+        return row_result if collect else None
+
+    futures = []
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='curl-load') as pool:
+        for k, (row_index, variables) in enumerate(items):
+            intended = start + _load_offset(k, load['rate'], load['ramp_up'])
+            delay = 0.0 if budget.expired() else intended - time.perf_counter()
+            if cancel.wait(max(0.0, delay)):
+                break
+            futures.append(pool.submit(run, row_index, variables, intended))
+        results = [f.result() for f in futures]
+    elapsed = time.perf_counter() - start
+
+    for slot in timeline.values():
+        slot['error_rate'] = round(slot['error'] / slot['completed'], 4) if slot['completed'] else 0.0
+    stats = {
+        'target_rps': load['rate'],
+        'ramp_up': load['ramp_up'],
+        'max_in_flight': concurrency,
+        'scheduled': len(futures),
+        'completed': histogram.count,
+        'errors': sum(slot['error'] for slot in timeline.values()),
+        'elapsed': round(elapsed, 3),
+        'achieved_rps': round(histogram.count / elapsed, 3) if elapsed > 0 else 0.0,
+        'latency_ms': histogram.to_dict(),
+        'timeline': [timeline[s] for s in sorted(timeline)],
+    }
+    results = [r for r in results if r is not None]
+    results.sort(key=lambda r: r.get('row_index', 0))
+    return results, stats
+
+
+def _batch_counters(batch_results):
+    return {
+        'total_rows': len(batch_results),
+        'success_count': sum(1 for r in batch_results if r.get('success', False)),
+        'failure_count': sum(1 for r in batch_results if r.get('success') is False)
+    }
+
+
+def _excel_response_view(result, response_data):
+    # Excel 批量沿用原有的 response 字段（status_code，不含 raw）
+    return {
+        'stderr': response_data['stderr'],
+        'returncode': result.returncode,
+        'status_code': response_data['code'],
+        'headers': response_data['headers'],
+        'body': response_data['body'],
+        'timing': response_data['timing']
+    }
+
+
+# worker 进程按名称还原 response_view
+_RESPONSE_VIEWS = {'excel': _excel_response_view}
+
+
+def _row_outcome(row_result) -> str:
+    # timeout / circuit_open / skipped 等状态优先，其次是执行异常与断言结果
+    if row_result.get('status'):
+        return row_result['status']
+    if 'error' in row_result:
+        return 'error'
+    success = row_result.get('success')
+    return 'none' if success is None else ('passed' if success else 'failed')
+
+
+def _make_row_fn(curl_command, assertions, options, response_view=None, capture_errors: bool = True,
+                 prepared=None):
+    """生成单行执行函数：替换变量 → 执行 → 断言；capture_errors 时把异常记录为该行的 error。
+    模板与断言在这里各编译一次；prepared 为 {row_index: (curl 命令, parsed_req)} 时直接使用预先渲染好的结果。
+    options 为 _batch_options 的结果：按主机熔断（整批共用一个熔断器），幂等请求按抖动指数退避重试。
+    """
+    template = _compile_template(curl_command)
+    assertions = _compile_assertions(assertions)
+    engine, verbose = options['engine'], options['verbose']
+    breaker_options = options['breaker']
+    breaker = (_CircuitBreaker(breaker_options['threshold'], breaker_options['cooldown'])
+               if breaker_options['threshold'] else None)
+
+    def execute(current_cmd, parsed_req, limiter, budget):
+        """执行一行（含熔断检查与重试），返回 (result, response_data, assertion_results, 附加字段)"""
+        url = (parsed_req or {}).get('url')
+        retries = options['retries'] if (parsed_req or {}).get('method', 'GET') in _IDEMPOTENT_METHODS else 0
+        extra = {}
+        attempt = 0
+        while True:
+            if breaker is not None:
+                state = breaker.acquire(url, breaker_options['mode'] == 'defer', budget)
+                extra['breaker'] = state
+                if state == 'open':
+                    return None, None, None, extra
+            result, response_data, assertion_results = _execute_rendered(
+                current_cmd, assertions, limiter, parsed_req, engine, verbose,
+                budget.timeout() if budget else None, budget.cancel_event if budget else None)
+            if getattr(result, 'killed', None) == 'cancelled':
+                return result, response_data, assertion_results, extra
+            # 断言明确接受的响应（例如期望 500 的用例）不计为失败，既不触发熔断也不重试
+            failed = _is_transient_failure(result, response_data) and not (
+                response_data.get('code') is not None and assertion_results
+                and _assertions_passed(assertion_results))
+            if breaker is not None:
+                breaker.record(url, not failed)
+            if not failed or attempt >= retries or (budget is not None and budget.expired()):
+                return result, response_data, assertion_results, extra
+            # 全抖动指数退避
+            delay = random.uniform(0, min(app.config['RETRY_MAX_BACKOFF'], options['retry_backoff'] * 2 ** attempt))
+            cancel = budget.cancel_event if budget is not None else None
+            if cancel is None:
+                time.sleep(delay)
+            elif cancel.wait(delay):
+                return result, response_data, assertion_results, extra
+            attempt += 1
+            extra['retries'] = attempt
+
+    def execute_row(row_index, variables, limiter, budget):
+        try:
+            if prepared is not None and row_index in prepared:
+                current_cmd, parsed_req = prepared[row_index]
+            else:
+                current_cmd, parsed_req = template.prepare(variables)
+            started = time.monotonic()
+            result, response_data, assertion_results, extra = execute(current_cmd, parsed_req, limiter, budget)
+            if result is None:
+                # 熔断：不发请求直接失败；defer 模式下等待期间被取消或超过截止时间
+                if budget is not None and budget.cancel_event is not None and budget.cancel_event.is_set():
+                    return {'row_index': row_index, 'status': 'cancelled'}
+                if budget is not None and budget.expired():
+                    return {**_skipped_row(row_index, variables), **extra}
+                return {
+                    'row_index': row_index,
+                    'variables': variables,
+                    'curl_command': current_cmd,
+                    'request': parsed_req,
+                    'status': 'circuit_open',
+                    'error': f"Circuit breaker open for {_host_key((parsed_req or {}).get('url'))}",
+                    'success': False,
+                    **extra
+                }
+            row_result = {
+                'row_index': row_index,
+                'variables': variables,
+                'curl_command': current_cmd,
+                'request': parsed_req,
+                'response': response_view(result, response_data) if response_view else response_data,
+                'assertions': assertion_results,
+                'success': _assertions_passed(assertion_results),
+                **extra
+            }
+            killed = getattr(result, 'killed', None)
+            if killed == 'cancelled':
+                row_result['status'] = 'cancelled'
+            elif killed == 'timeout' or result.returncode == 28:
+                # 被单行超时 / 整批截止时间终止，或 curl 自身的 --max-time 超时
+                row_result['status'] = 'timeout'
+                row_result['elapsed'] = round(time.monotonic() - started, 3)
+                row_result['success'] = False
+            return row_result
+        except Exception as e:
+            if not capture_errors:
+                raise
+            return {
+                'row_index': row_index,
+                'variables': variables,
+                'error': str(e),
+                'success': False
+            }
+
+    def run_row(row_index, variables, limiter, budget=None):
+        row_result = execute_row(row_index, variables, limiter, budget)
+        if row_result.get('status') != 'cancelled':
+            _metrics.inc('curl_executor_rows_total',
+                         host=_host_key((row_result.get('request') or {}).get('url')) or 'unknown',
+                         outcome=_row_outcome(row_result))
+        return row_result
+
+    # 分布式执行时 worker 据此重建同样的执行函数（预渲染的命令不下发）
+    run_row.task = None if prepared is not None else {
+        'curl_command': curl_command,
+        'assertions': [source for source, _ in assertions],
+        'options': options,
+        'view': next((name for name, view in _RESPONSE_VIEWS.items() if view is response_view), None),
+        'capture_errors': capture_errors,
+    }
+    return run_row
+
+
+# ==== 多步场景 ====
+# 场景由若干步骤组成，每步是一个 curl 模板，可以从响应中提取值（extract）作为后续步骤的 {{变量}}。
+# 步骤的依赖由 depends_on 显式声明，或从模板引用的变量自动推断（引用了哪个步骤提取的变量就依赖哪个步骤）；
+# 同一行内互不依赖的步骤并发执行，行与行之间照常并发，只在真实的依赖上等待。依赖失败的步骤记为 skipped。
+# cache 为 true（整批有效）或秒数（TTL）的步骤按渲染后的命令缓存提取结果：不同行渲染出相同的命令
+# （例如同一账号登录）时直接复用，同一时刻只有一行真正发请求，其余行等待它的结果。
+#
+# {"steps": [
+#   {"name": "login", "curl": "curl ... -d '{\"user\": \"{{user}}\"}'", "cache": 300,
+#    "extract": {"token": "json:data.token", "session": {"header": "Set-Cookie", "regex": "sid=([^;]+)"}}},
+#   {"name": "create", "curl": "curl ... -H 'Authorization: Bearer {{token}}'", "extract": {"item_id": "json:id"},
+#    "assertions": ["response.code == 201"]},
+#   {"name": "fetch", "curl": "curl .../items/{{item_id}} -H 'Authorization: Bearer {{token}}'"}
+# ]}
+#
+# 提取规则：json:<路径>（如 data.items[0].id，可带 $. 前缀）、header:<响应头名>、regex:<正则>（作用于 body，
+# 有分组时取第一组）；对象形式 {"json"|"header": ..., "regex": ..., "default": ...} 可以先取值再套正则，
+# 取不到值且没有 default 时该步骤失败。
+
+_JSON_PATH_SEGMENT_RE = re.compile(r'([^\[\]]*)((?:\[-?\d+\])*)')
+
+
+def _json_path_get(data, path: str):
+    """按 a.b[0].c 形式的路径取值；取不到时抛 LookupError"""
+    path = path.strip()
+    if path.startswith('$'):
+        path = path[1:].lstrip('.')
+    for segment in path.split('.') if path else []:
+        match = _JSON_PATH_SEGMENT_RE.fullmatch(segment)
+        if match is None:
+            raise LookupError(f'invalid JSON path {path!r}')
+        key, indexes = match.groups()
+        if key:
+            if isinstance(data, list) and key.lstrip('-').isdigit():
+                data = data[int(key)]
+            elif isinstance(data, dict) and key in data:
+                data = data[key]
+            else:
+                raise LookupError(key)
+        for index in re.findall(r'-?\d+', indexes):
+            if not isinstance(data, list):
+                raise LookupError(f'[{index}]')
+            data = data[int(index)]
+    return data
+
+
+class _Extractor:
+    """一条提取规则：先按 json 路径或响应头取值（都没有时取 body），再可选地套用正则"""
+
+    def __init__(self, spec):
+        if isinstance(spec, str):
+            kind, sep, arg = spec.partition(':')
+            if not sep or kind not in ('json', 'header', 'regex'):
+                raise ValueError(f'invalid extract rule {spec!r}, expected json:<path>, header:<name> or regex:<pattern>')
+            spec = {kind: arg}
+        if not isinstance(spec, dict) or ('json' in spec and 'header' in spec):
+            raise ValueError(f'invalid extract rule {spec!r}')
+        self.json_path = spec.get('json')
+        self.header = spec.get('header')
+        self.has_default = 'default' in spec
+        self.default = spec.get('default')
+        try:
+            self.regex = re.compile(spec['regex']) if spec.get('regex') else None
+        except re.error as e:
+            raise ValueError(f"invalid regex {spec['regex']!r}: {e}")
+
+    def extract(self, response: _AssertionResponse):
+        try:
+            if self.json_path is not None:
+                value = _json_path_get(response.json, self.json_path)
+            elif self.header is not None:
+                name = self.header.lower()
+                value = next(v for k, v in (response.headers or {}).items() if k.lower() == name)
+            else:
+                value = response.body or ''
+            if self.regex is not None:
+                match = self.regex.search(value if isinstance(value, str) else json.dumps(value, ensure_ascii=False))
+                if match is None:
+                    raise LookupError(self.regex.pattern)
+                value = match.group(1) if self.regex.groups else match.group(0)
+            return value
+        except (LookupError, StopIteration, ValueError, TypeError):
+            if self.has_default:
+                return self.default
+            raise LookupError(self.describe())
+
+    def describe(self) -> str:
+        source = (f'json:{self.json_path}' if self.json_path is not None
+                  else f'header:{self.header}' if self.header is not None else 'body')
+        return f'{source} regex:{self.regex.pattern}' if self.regex is not None else source
+
+
+class _ScenarioStep:
+    def __init__(self, spec: dict, index: int):
+        if not isinstance(spec, dict):
+            raise ValueError(f'step {index + 1} must be an object')
+        self.name = str(spec.get('name') or f'step{index + 1}')
+        self.curl_command = spec.get('curl') or spec.get('curl_command')
+        if not isinstance(self.curl_command, str) or not self.curl_command.strip():
+            raise ValueError(f'step {self.name!r} has no curl command')
+        self.assertions = spec.get('assertions') or []
+        _compile_assertions(self.assertions)
+        extract = spec.get('extract') or {}
+        if not isinstance(extract, dict):
+            raise ValueError(f'extract of step {self.name!r} must be an object')
+        for name in extract:
+            if not re.fullmatch(r'\w+', name):
+                raise ValueError(f'invalid variable name {name!r} in step {self.name!r}')
+        self.extractors = {name: _Extractor(rule) for name, rule in extract.items()}
+        depends_on = spec.get('depends_on') or []
+        self.depends_on = [depends_on] if isinstance(depends_on, str) else list(depends_on)
+        cache = spec.get('cache')
+        if cache is True:
+            self.cache_ttl = math.inf
+        elif isinstance(cache, (int, float)) and not isinstance(cache, bool) and cache > 0:
+            self.cache_ttl = float(cache)
+        else:
+            self.cache_ttl = None
+        self.template = _compile_template(self.curl_command)
+        self.deps = set()
+
+
+class _Scenario:
+    """校验并编译场景定义：步骤名唯一、变量只由一个步骤提取、依赖无环；order 为拓扑序"""
+
+    def __init__(self, definition):
+        if not isinstance(definition, dict) or not isinstance(definition.get('steps'), list) \
+                or not definition['steps']:
+            raise ValueError('scenario must be an object with a non-empty "steps" array')
+        self.definition = definition
+        steps = [_ScenarioStep(spec, i) for i, spec in enumerate(definition['steps'])]
+        by_name = {}
+        producers = {}
+        for step in steps:
+            if step.name in by_name:
+                raise ValueError(f'duplicate step name {step.name!r}')
+            by_name[step.name] = step
+            for name in step.extractors:
+                if name in producers:
+                    raise ValueError(f'variable {name!r} is extracted by both {producers[name]!r} and {step.name!r}')
+                producers[name] = step.name
+        for step in steps:
+            for dep in step.depends_on:
+                if dep not in by_name:
+                    raise ValueError(f'step {step.name!r} depends on unknown step {dep!r}')
+            step.deps = set(step.depends_on) | {producers[name] for name in step.template.slot_names
+                                                 if name in producers}
+            if step.name in step.deps:
+                raise ValueError(f'step {step.name!r} depends on itself')
+        # Kahn 拓扑排序，剩下的节点即在环上
+        order = []
+        remaining = {step.name: set(step.deps) for step in steps}
+        while remaining:
+            ready = [step for step in steps if step.name in remaining and not remaining[step.name]]
+            if not ready:
+                raise ValueError('scenario steps have a dependency cycle: ' + ', '.join(sorted(remaining)))
+            for step in ready:
+                order.append(step)
+                del remaining[step.name]
+            for deps in remaining.values():
+                deps.difference_update(step.name for step in ready)
+        self.steps = steps
+        self.order = order
+
+    def signature(self) -> str:
+        return json.dumps(self.definition, ensure_ascii=False, sort_keys=True)
+
+
+class _StepCache:
+    """可缓存步骤的执行结果（同一批量内跨行共享）：同一个 key 同一时刻只有一行在执行，其余行等待它的结果；
+    只缓存成功的结果（断言通过，或没有断言且正常完成），其余（失败、取消、跳过、超时）不缓存，等待的行改为自己执行。
+    等待中的行遵守自己的预算：批量被取消或截止时间已过时不再等待，返回 (None, False)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}  # key -> [完成事件, 步骤结果, 过期时间]
+
+    def get_or_run(self, key, ttl: float, fn, budget=None):
+        """返回 (步骤结果, 是否命中缓存)"""
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[1] is not None and entry[2] > time.monotonic():
+                    return entry[1], True
+                if entry is None or entry[1] is not None:
+                    entry = self._entries[key] = [threading.Event(), None, 0.0]
+                    owner = True
+                else:
+                    owner = False
+            if not owner:
+                while not entry[0].wait(0.25 if budget is not None else None):
+                    if (budget.cancel_event is not None and budget.cancel_event.is_set()) or budget.expired():
+                        return None, False
+                continue
+            result = None
+            try:
+                result = fn()
+            finally:
+                with self._lock:
+                    if _cacheable_step_result(result):
+                        entry[1], entry[2] = result, time.monotonic() + ttl
+                    elif self._entries.get(key) is entry:
+                        del self._entries[key]
+                entry[0].set()
+            return result, False
+
+
+def _cacheable_step_result(result) -> bool:
+    # success 为 None 只说明没有断言；带 status（cancelled/skipped/timeout/circuit_open）或 error 的结果同样不能复用
+    if result is None:
+        return False
+    if result.get('success') is True:
+        return True
+    return result.get('success') is None and not result.get('status') and 'error' not in result
+
+
+def _scenario_success(steps):
+    # 与单请求行一致：有步骤失败为 False，有断言通过的步骤为 True，所有步骤都没有断言时为 None（未校验）
+    outcomes = [r.get('success') for r in steps]
+    if False in outcomes:
+        return False
+    return True if True in outcomes else None
+
+
+_scenario_step_pool_ref = []
+_scenario_step_pool_lock = threading.Lock()
+
+
+def _scenario_step_pool() -> ThreadPoolExecutor:
+    """同一行内可并行的步骤共用的有界线程池（所有批量共享，上限 MAX_CONCURRENCY）"""
+    with _scenario_step_pool_lock:
+        if not _scenario_step_pool_ref:
+            _scenario_step_pool_ref.append(ThreadPoolExecutor(max_workers=app.config['MAX_CONCURRENCY'],
+                                                              thread_name_prefix='scenario-step'))
+        return _scenario_step_pool_ref[0]
+
+
+def _make_scenario_row_fn(scenario: _Scenario, options):
+    """生成场景的单行执行函数，签名与 _make_row_fn 的结果相同，可直接交给 _run_rows / 后台任务 / 分布式 worker。
+    行结果的 steps 按定义顺序记录每一步（请求、响应、断言、extracted），extracted 汇总所有提取到的变量。
+    """
+    step_fns = {step.name: _make_row_fn(step.curl_command, step.assertions, options) for step in scenario.steps}
+    cache = _StepCache()
+
+    def run_step(step, row_index, values, limiter, budget):
+        step_result = step_fns[step.name](row_index, values, limiter, budget)
+        step_result = {'name': step.name, **{k: v for k, v in step_result.items()
+                                            if k not in ('row_index', 'variables')}}
+        if step_result.get('status') or 'error' in step_result or step_result.get('success') is False \
+                or not step.extractors:
+            return step_result
+        response = _AssertionResponse(step_result.get('response') or {})
+        extracted = {}
+        for name, extractor in step.extractors.items():
+            try:
+                extracted[name] = extractor.extract(response)
+            except LookupError as e:
+                step_result['error'] = f'Failed to extract {name!r} from {e}'
+                step_result['success'] = False
+                return step_result
+        step_result['extracted'] = extracted
+        return step_result
+
+    def execute_step(step, row_index, values, limiter, budget):
+        if budget is not None and budget.expired():
+            return {'name': step.name, 'status': 'skipped', 'error': 'Batch deadline exceeded before the step started',
+                    'success': False}
+        if step.cache_ttl is None:
+            return run_step(step, row_index, values, limiter, budget)
+        key = (step.name, step.template.render(values))
+        step_result, hit = cache.get_or_run(key, step.cache_ttl,
+                                            lambda: run_step(step, row_index, values, limiter, budget), budget)
+        if step_result is None:
+            # 等待其他行执行同一步骤期间批量被取消或超过截止时间
+            if budget.cancel_event is not None and budget.cancel_event.is_set():
+                return {'name': step.name, 'status': 'cancelled'}
+            return {'name': step.name, 'status': 'skipped', 'success': False,
+                    'error': 'Batch deadline exceeded while waiting for the cached step'}
+        if not hit:
+            return step_result
+        # 命中缓存的步骤只记录提取到的值，不重复保存响应
+        return {'name': step.name, 'cached': True, 'curl_command': step_result.get('curl_command'),
+                'extracted': step_result.get('extracted', {}), 'success': step_result.get('success')}
+
+    def run_row(row_index, variables, limiter, budget=None):
+        values = dict(variables) if isinstance(variables, dict) else {}
+        results = {}
+        pending = {step.name for step in scenario.order}
+        in_flight = {}  # 已提交到步骤线程池的 future -> (步骤, 变量快照)
+
+        def work(step, snapshot):
+            try:
+                return execute_step(step, row_index, snapshot, limiter, budget)
+            except Exception as e:
+                return {'name': step.name, 'error': str(e), 'success': False}
+
+        def finish(step, step_result):
+            results[step.name] = step_result
+            values.update(step_result.get('extracted') or {})
+
+        while pending or in_flight:
+            ready = []
+            skipped = False
+            for step in scenario.order:
+                if step.name not in pending or not step.deps <= results.keys():
+                    continue
+                pending.discard(step.name)
+                failed = [dep for dep in step.deps if results[dep].get('success') is False
+                          or results[dep].get('status')]
+                if failed:
+                    # 依赖失败时不再执行；后续依赖本步骤的步骤在下一轮同样被跳过
+                    results[step.name] = {'name': step.name, 'status': 'skipped', 'success': False,
+                                          'error': f"Dependency {', '.join(sorted(failed))} failed"}
+                    skipped = True
+                else:
+                    ready.append(step)
+            if not ready and not in_flight:
+                if skipped:
+                    continue  # 本轮有步骤被跳过，重新检查依赖它们的步骤
+                break
+            if len(ready) == 1 and not in_flight:
+                # 只有一个可执行步骤且没有其他在途步骤时直接在当前线程执行（纯链式场景不占用线程池）
+                finish(ready[0], work(ready[0], dict(values)))
+                continue
+            pool = _scenario_step_pool()
+            for step in ready:
+                snapshot = dict(values)
+                in_flight[pool.submit(work, step, snapshot)] = (step, snapshot)
+            done = next((future for future in in_flight if future.done()), None)
+            if done is None:
+                # 线程池还没开始执行的步骤收回到本线程执行：池被占满时行线程仍能推进，缓存的等待方不会互相卡住
+                for future in list(in_flight):
+                    if future.cancel():
+                        step, snapshot = in_flight.pop(future)
+                        finish(step, work(step, snapshot))
+                        break
+                else:
+                    done = next(iter(wait(in_flight, return_when=FIRST_COMPLETED)[0]))
+            if done is not None:
+                step, _ = in_flight.pop(done)
+                finish(step, done.result())
+
+        if any(r.get('status') == 'cancelled' for r in results.values()):
+            return {'row_index': row_index, 'status': 'cancelled'}
+        steps = [results[step.name] for step in scenario.steps]
+        row_result = {
+            'row_index': row_index,
+            'variables': variables,
+            'steps': steps,
+            'extracted': {k: v for r in steps for k, v in (r.get('extracted') or {}).items()},
+            'success': _scenario_success(steps),
+        }
+        if any(r.get('status') == 'timeout' for r in steps):
+            row_result['status'] = 'timeout'
+        return row_result
+
+    # 分布式 worker 据此重建同样的场景执行函数
+    run_row.task = {'scenario': scenario.definition, 'options': options}
+    return run_row
+
+
+# ==== 响应体存储 ====
+# 响应只保存一份 body（stdout 与 body 相同，raw 可由 body + stderr 还原），
+# 超过 BODY_INLINE_LIMIT 的 body 写入按 sha256 寻址的 blob 目录，结果文件中只保留哈希引用，相同 body 自动去重。
+
+def _response_raw(response: dict) -> str:
+    """按需还原旧版 raw 字段：stdout（即 body）与 stderr 拼接"""
+    return ((response.get('body') or '') + "\n" + (response.get('stderr') or '')).strip()
+
+
+def _blob_path(digest: str) -> str:
+    return os.path.join(app.config['BLOB_FOLDER'], digest[:2], digest)
+
+
+def _put_blob(data: bytes) -> str:
+    """写入内容寻址 blob（已存在则跳过），返回 sha256 十六进制摘要"""
+    digest = hashlib.sha256(data).hexdigest()
+    path = _blob_path(digest)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+            _metrics.inc('curl_executor_persisted_bytes_total', len(data), kind='blob')
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+    return digest
+
+
+def _read_blob(digest: str) -> str:
+    with open(_blob_path(digest), 'rb') as f:
+        return f.read().decode('utf-8', errors='replace')
+
+
+def _storable_row(row_result: dict) -> dict:
+    """写文件前把大 body 移入 blob 存储，返回可直接序列化的行（不修改传入的行）；场景行逐步处理"""
+    if row_result.get('steps'):
+        row_result = {**row_result, 'steps': [_storable_row(step) for step in row_result['steps']]}
+    response = row_result.get('response')
+    if not response:
+        return row_result
+    return {**row_result, 'response': _storable_response(response)}
+
+
+def _storable_response(response: dict) -> dict:
+    body = response.get('body')
+    if not body or len(body) * 4 <= app.config['BODY_INLINE_LIMIT']:
+        return response  # utf-8 最多 4 字节/字符，足够小的 body 无需编码即可判断
+    data = body.encode('utf-8')
+    if len(data) <= app.config['BODY_INLINE_LIMIT']:
+        return response
+    stored = {k: v for k, v in response.items() if k != 'body'}
+    stored['body_blob'] = _put_blob(data)
+    stored['body_size'] = len(data)
+    return stored
+
+
+def _expand_response(response: dict, fields) -> dict:
+    """读取结果时按需展开：body 从 blob 读回，raw 现算"""
+    if not response:
+        return response
+    response = dict(response)
+    if ('body' in fields or 'raw' in fields) and 'body_blob' in response:
+        try:
+            response['body'] = _read_blob(response['body_blob'])
+        except OSError:
+            pass
+    if 'raw' in fields:
+        response['raw'] = _response_raw(response)
+    return response
+
+
+def _expand_row(row: dict, fields) -> dict:
+    """按需展开一行（含场景行的各步骤）的响应"""
+    if row.get('steps'):
+        row = {**row, 'steps': [_expand_row(step, fields) for step in row['steps']]}
+    if row.get('response'):
+        row = {**row, 'response': _expand_response(row['response'], fields)}
+    return row
+
+
+def _expand_fields(args):
+    return {f.strip() for f in (args.get('expand') or '').split(',') if f.strip()}
+
+
+@app.route('/blobs/<digest>', methods=['GET'])
+def get_blob(digest):
+    if not re.fullmatch(r'[0-9a-f]{64}', digest):
+        return jsonify({'error': 'Invalid blob id'}), 400
+    if not os.path.exists(_blob_path(digest)):
+        return jsonify({'error': 'Blob not found'}), 404
+    return send_from_directory(os.path.dirname(_blob_path(digest)), digest, mimetype='application/octet-stream')
+
+
+# ==== 结果索引（SQLite）====
+# 写结果文件时同步更新一张汇总表，历史列表一次查询即可得到，按 id 查找也不再需要扫描目录。
+# 索引丢失或首次启用时会根据 results 目录自动重建，也可以手动执行 `python curl_executor.py rebuild-index`。
+
+_RESULTS_INDEX_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS results (
+    id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    timestamp REAL,
+    is_batch INTEGER NOT NULL,
+    success INTEGER,
+    total_rows INTEGER,
+    success_count INTEGER,
+    failure_count INTEGER,
+    complete INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS results_timestamp ON results (timestamp);
+CREATE TABLE IF NOT EXISTS result_rows (
+    batch_id TEXT NOT NULL,
+    row_index INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    success INTEGER,
+    code INTEGER,
+    error INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (batch_id, row_index)
+);
+CREATE TABLE IF NOT EXISTS result_row_scan (
+    batch_id TEXT PRIMARY KEY,
+    scanned_bytes INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    batch_id TEXT NOT NULL,
+    created_at REAL,
+    finished_at REAL,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    snapshot TEXT NOT NULL
+);
+'''
+
+_index_local = threading.local()
+
+
+def _results_index_path() -> str:
+    return app.config['RESULTS_INDEX'] or os.path.join(app.config['RESULTS_FOLDER'], '.results_index.sqlite3')
+
+
+def _results_index():
+    """返回当前线程的索引连接；表不存在时建表并从 results 目录重建"""
+    path = _results_index_path()
+    conn = getattr(_index_local, 'conn', None)
+    if conn is not None and _index_local.path == path:
+        return conn
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    created = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='results'").fetchone() is None
+    conn.executescript(_RESULTS_INDEX_SCHEMA)
+    _index_local.conn = conn
+    _index_local.path = path
+    if created:
+        _rebuild_results_index(conn)
+    return conn
+
+
+def _upsert_result_summary(conn, summary: dict, filename: str):
+    # 只执行写入，事务与版本号由调用方负责
+    success = summary.get('success')
+    conn.execute(
+        'INSERT OR REPLACE INTO results (id, filename, timestamp, is_batch, success, total_rows, '
+        'success_count, failure_count, complete) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        (summary.get('id'), filename, summary.get('timestamp'), 1 if summary.get('is_batch') else 0,
+         None if success is None else int(bool(success)), summary.get('total_rows'),
+         summary.get('success_count'), summary.get('failure_count'),
+         0 if summary.get('complete') is False else 1))
+
+
+def _index_result(summary: dict, filename: str, conn=None):
+    """写入/更新一条结果汇总（一个事务，版本号加一）；索引失败不影响结果文件本身"""
+    try:
+        conn = conn or _results_index()
+        with conn:
+            _upsert_result_summary(conn, summary, filename)
+        _touch_results_version()
+    except Exception as e:
+        app.logger.warning('Failed to index result %s: %s', filename, e)
+
+
+def _results_version_path() -> str:
+    return os.path.join(app.config['RESULTS_FOLDER'], '.results_version')
+
+
+_results_version_lock = threading.Lock()
+
+
+def _read_results_version(path: str):
+    try:
+        with open(path, 'r') as f:
+            return int(f.read().strip())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _touch_results_version():
+    """索引每次变化都把版本计数器加一（读-改-写在文件锁内，多进程下同样单调）；计数器即 /get_results 的 ETag"""
+    path = _results_version_path()
+    with _results_version_lock, open(path + '.lock', 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        current = _read_results_version(path)
+        # 标记丢失（旧数据目录或被清理）时从当前纳秒时间起步，不会回到以前发出过的值
+        version = time.time_ns() if current is None else current + 1
+        # 临时文件 + os.replace，读者不会读到写了一半的数字；计数器不要求持久，省掉 fsync
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(str(version))
+        os.replace(tmp_path, path)
+    return version
+
+
+def _results_etag():
+    # 只读一次版本文件；不存在（旧数据目录）时先创建
+    version = _read_results_version(_results_version_path())
+    if version is None:
+        version = _touch_results_version()
+    return f"v{version:x}"
+
+
+def _summarize_result_file(path: str):
+    """从结果文件读取汇总字段（NDJSON 批量或旧版/单次 .json）"""
+    if path.endswith('.ndjson'):
+        return _read_batch_summary(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return {
+        'id': data.get('id') or data.get('batch_id'),
+        'timestamp': data.get('timestamp'),
+        'is_batch': 'batch_id' in data,
+        'success': data.get('success'),
+        'total_rows': data.get('total_rows'),
+        'success_count': data.get('success_count'),
+        'failure_count': data.get('failure_count'),
+    }
+
+
+def _rebuild_results_index(conn=None):
+    """扫描 results 目录重建索引，并删除文件已不存在的条目；返回索引的结果数。
+    先读完所有文件的汇总，再在一个事务里写入，整个重建只让版本号加一"""
+    conn = conn or _results_index()
+    results_dir = app.config['RESULTS_FOLDER']
+    summaries = {}
+    for file in os.listdir(results_dir):
+        if not file.endswith(('.json', '.ndjson')):
+            continue
+        try:
+            summary = _summarize_result_file(os.path.join(results_dir, file))
+        except Exception:
+            continue
+        if summary and summary.get('id'):
+            summaries[file] = summary
+    seen = {summary['id'] for summary in summaries.values()}
+    with conn:
+        for file, summary in summaries.items():
+            _upsert_result_summary(conn, summary, file)
+        stale = [(row['id'],) for row in conn.execute('SELECT id FROM results') if row['id'] not in seen]
+        conn.executemany('DELETE FROM results WHERE id = ?', stale)
+        # 行偏移索引在下次分页读取时按需重建
+        conn.execute('DELETE FROM result_rows')
+        conn.execute('DELETE FROM result_row_scan')
+    _touch_results_version()
+    return len(seen)
+
+
+def _row_to_summary(row):
+    return {
+        'id': row['id'],
+        'timestamp': row['timestamp'],
+        'is_batch': bool(row['is_batch']),
+        'success': None if row['success'] is None else bool(row['success']),
+        'total_rows': row['total_rows'],
+        'success_count': row['success_count'],
+        'failure_count': row['failure_count'],
+        'complete': bool(row['complete']),
+        'filename': row['filename']
+    }
+
+
+# ==== 批量结果的 NDJSON 流式持久化 ====
+# results/<batch_id>.ndjson：首行 header（模板、断言等元信息），每完成一行追加一条 row，
+# 正常结束或取消时追加 footer（计数）。进程中途崩溃时文件里保留已完成的行，可用 resume 续跑。
+
+def _batch_result_path(batch_id: str) -> str:
+    return os.path.join(app.config['RESULTS_FOLDER'], f"{batch_id}.ndjson")
+
+
+def _iter_ndjson(path: str):
+    """逐行读取 NDJSON 记录，跳过崩溃时可能残留的半行"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.endswith('\n'):
+                break
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def _read_batch_header(batch_id: str):
+    path = _batch_result_path(batch_id)
+    if not os.path.exists(path):
+        return None
+    for record in _iter_ndjson(path):
+        return record if record.get('record') == 'header' else None
+    return None
+
+
+def _load_batch_document(path: str):
+    """把 NDJSON 批量结果还原为与旧版 .json 相同结构的文档（结果按 row_index 排序、同一行以最后一次为准）"""
+    header = {}
+    footer = {}
+    rows = {}
+    for record in _iter_ndjson(path):
+        kind = record.pop('record', None)
+        if kind == 'header':
+            header = record
+        elif kind == 'footer':
+            footer = record
+        elif kind == 'row':
+            rows[record.get('row_index')] = record
+    batch_results = [rows[k] for k in sorted(rows, key=lambda k: k or 0)]
+    document = {**header, 'results': batch_results, **_batch_counters(batch_results)}
+    document['complete'] = bool(footer)
+    if footer.get('cancelled'):
+        document['cancelled'] = True
+    if footer.get('finished_at'):
+        document['finished_at'] = footer['finished_at']
+    for key in ('load_stats', 'timing_stats', 'deadline_exceeded'):
+        if footer.get(key):
+            document[key] = footer[key]
+    return document
+
+
+def _read_batch_summary(path: str):
+    """读取首行 header 与末行 footer 得到汇总；没有 footer（执行中或中断）时流式统计行数"""
+    header = None
+    with open(path, 'rb') as f:
+        first = f.readline()
+        try:
+            header = json.loads(first)
+        except ValueError:
+            return None
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(0, size - 4096))
+        tail = f.read().splitlines()
+    footer = None
+    if tail:
+        try:
+            last = json.loads(tail[-1])
+            if last.get('record') == 'footer':
+                footer = last
+        except ValueError:
+            pass
+    if footer is None:
+        done = set()
+        success_count = failure_count = 0
+        for record in _iter_ndjson(path):
+            if record.get('record') != 'row' or record.get('row_index') in done:
+                continue
+            done.add(record.get('row_index'))
+            if record.get('success', False):
+                success_count += 1
+            elif record.get('success') is False:
+                failure_count += 1
+        footer = {'total_rows': len(done), 'success_count': success_count, 'failure_count': failure_count}
+        complete = False
+    else:
+        complete = True
+    summary = {
+        'id': header.get('batch_id'),
+        'timestamp': header.get('timestamp'),
+        'is_batch': True,
+        'success': None,
+        'total_rows': footer.get('total_rows'),
+        'success_count': footer.get('success_count'),
+        'failure_count': footer.get('failure_count'),
+        'complete': complete,
+    }
+    for key in ('load_stats', 'timing_stats', 'deadline_exceeded'):
+        if footer.get(key):
+            summary[key] = footer[key]
+    return summary
+
+
+class _BatchWriter:
+    """把批量结果逐行追加写入 NDJSON 文件并维护计数；续跑时先读回已记录的行"""
+
+    def __init__(self, batch_id: str, header: dict):
+        self.path = _batch_result_path(batch_id)
+        self.done_indexes = set()
+        self.success_count = 0
+        self.failure_count = 0
+        self._lock = threading.Lock()
+        self._last_indexed = 0.0
+        self._timing = {}  # 阶段名 -> _LatencyHistogram
+        # 新文件连同头部一次性落位，已存在（续跑）时不覆盖；追加写入期间持有排他锁，同一批量只有一个写入者
+        header_line = json.dumps({'record': 'header', **header}, ensure_ascii=False, default=str) + '\n'
+        created = not os.path.exists(self.path) and _create_exclusive_text(self.path, header_line)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        try:
+            _lock_file_exclusive(self._file)
+        except RuntimeError:
+            self._file.close()
+            raise
+        if created:
+            self.header = header
+        else:
+            self._load_existing()
+            self.header = _read_batch_header(batch_id) or header
+        self._index(complete=False)
+
+    def _load_existing(self):
+        # 截掉崩溃时写了一半的最后一行，保证追加后仍是合法的 NDJSON
+        with open(self.path, 'rb+') as f:
+            data = f.read()
+            if data and not data.endswith(b'\n'):
+                f.truncate(data.rfind(b'\n') + 1)
+        for record in _iter_ndjson(self.path):
+            # skipped 的行视为未执行，续跑时重新执行
+            if record.get('record') == 'row' and record.get('status') != 'skipped':
+                self._count(record)
+
+    def _count(self, row_result):
+        row_index = row_result.get('row_index')
+        if row_index in self.done_indexes:
+            return
+        self.done_indexes.add(row_index)
+        if row_result.get('success', False):
+            self.success_count += 1
+        elif row_result.get('success') is False:
+            self.failure_count += 1
+        timing = (row_result.get('response') or {}).get('timing')
+        if timing:
+            for phase in _TIMING_PHASES:
+                value = timing.get(phase)
+                if isinstance(value, (int, float)):
+                    histogram = self._timing.get(phase)
+                    if histogram is None:
+                        histogram = self._timing[phase] = _LatencyHistogram()
+                    histogram.record(value)
+
+    def _write(self, record):
+        line = json.dumps(record, ensure_ascii=False, default=str) + '\n'
+        with _metrics.timer('curl_executor_result_write_seconds', kind='batch'):
+            self._file.write(line)
+            self._file.flush()
+        _metrics.inc('curl_executor_persisted_bytes_total', len(line.encode('utf-8')), kind='batch')
+
+    def _index(self, complete: bool):
+        self._last_indexed = time.monotonic()
+        _index_result({
+            'id': self.header.get('batch_id'),
+            'timestamp': self.header.get('timestamp'),
+            'is_batch': True,
+            'success': None,
+            'complete': complete,
+            **self.counters()
+        }, os.path.basename(self.path))
+
+    def append(self, row_result):
+        with self._lock:
+            self._write({'record': 'row', **_storable_row(row_result)})
+            self._count(row_result)
+            # 执行中的计数最多每秒同步一次到索引
+            if time.monotonic() - self._last_indexed >= 1.0:
+                self._index(complete=False)
+
+    def counters(self):
+        return {
+            'total_rows': len(self.done_indexes),
+            'success_count': self.success_count,
+            'failure_count': self.failure_count
+        }
+
+    def timing_stats(self):
+        """各阶段耗时的汇总表（毫秒）：count / min / mean / p50 / p90 / p99 / p999 / max"""
+        stats = {}
+        for phase in _TIMING_PHASES:
+            if phase in self._timing:
+                summary = self._timing[phase].to_dict()
+                summary.pop('buckets')
+                stats[phase] = summary
+        return stats
+
+    def close(self, cancelled: bool = False, extra=None):
+        with self._lock:
+            footer = {'record': 'footer', 'finished_at': time.time(), **self.counters(), **(extra or {})}
+            timing_stats = self.timing_stats()
+            if timing_stats:
+                footer['timing_stats'] = timing_stats
+            if cancelled:
+                footer['cancelled'] = True
+            self._write(footer)
+            self._file.close()
+            self._index(complete=True)
+
+    def abort(self):
+        # 异常退出时不写 footer，保留为可续跑状态
+        with self._lock:
+            self._file.close()
+
+
+def _execute_batch_rows(batch_id, meta, curl_command, assertions, items, row_fn, options,
+                        job=None, resume: bool = False, collect: bool = True, total=None):
+    """执行一个批量任务，逐行写入 NDJSON 结果文件，返回批量结果文档。
+
+    items 为 (row_index, variables) 的可迭代对象（可以是流式数据源），total 为其行数（未知时为 None）。
+    resume 为 True 时跳过结果文件中已记录的行；collect 为 False 时不在内存中保留行结果（后台任务）。
+    """
+    writer = _BatchWriter(batch_id, {
+        'batch_id': batch_id,
+        'timestamp': time.time(),
+        **meta,
+        'curl_command_template': curl_command,
+        'assertions': assertions,
+    })
+    if resume:
+        done_indexes = set(writer.done_indexes)
+        items = ((row_index, variables) for row_index, variables in items if row_index not in done_indexes)
+        if total is not None:
+            total = max(0, total - len(done_indexes))
+    if job is not None:
+        job.total = total
+    budget = _RowBudget(options['timeout'], options['deadline'], job.cancel_event if job is not None else None)
+    extra = {}
+    try:
+        with _metrics.in_flight('curl_executor_active_batches'):
+            if options.get('distributed'):
+                batch_results = _run_distributed(batch_id, items, row_fn.task, job, sink=writer.append,
+                                                 collect=collect, budget=budget)
+            elif options.get('load'):
+                batch_results, extra['load_stats'] = _run_load(
+                    items, row_fn, options['load'], options['concurrency'], options['per_host'], job,
+                    sink=writer.append, collect=collect, budget=budget)
+            else:
+                batch_results = _run_rows(items, row_fn, options['concurrency'], options['per_host'], job,
+                                          sink=writer.append, collect=collect, budget=budget)
+    except BaseException:
+        writer.abort()
+        raise
+    cancelled = job is not None and job.cancel_event.is_set()
+    if budget.expired():
+        extra['deadline_exceeded'] = True
+    writer.close(cancelled, extra)
+    timing_stats = writer.timing_stats()
+    if timing_stats:
+        extra['timing_stats'] = timing_stats
+
+    if collect and resume:
+        # 续跑时返回包含之前已完成行在内的完整结果
+        return _load_batch_document(writer.path)
+    document = {
+        'batch_id': batch_id,
+        **meta,
+        'curl_command_template': curl_command,
+        'assertions': assertions,
+        'results': batch_results,
+        **writer.counters(),
+        **extra
+    }
+    if cancelled:
+        document['cancelled'] = True
+    return document
+
+
+def _dispatch_batch(data, meta, curl_command, assertions, items, row_fn, options, total=None):
+    """同步执行批量并返回全部结果；请求体 async=true 时改为排入后台任务队列，立即返回 job_id。
+    请求体 resume=<batch_id> 时续跑该批量中尚未记录的行。items 按需惰性读取，total 为行数（未知时为 None）。
+    """
+    resume_id = data.get('resume')
+    if resume_id and options.get('load'):
+        return jsonify({'error': 'Load runs cannot be resumed'}), 400
+    if options.get('distributed') and (options.get('load') or getattr(row_fn, 'task', None) is None):
+        return jsonify({'error': 'Distributed runs do not support load mode or prerender'}), 400
+    if resume_id:
+        header = _read_batch_header(secure_filename(str(resume_id)))
+        if header is None:
+            return jsonify({'error': 'Batch to resume not found'}), 404
+        if header.get('curl_command_template') != curl_command:
+            return jsonify({'error': 'curl command differs from the batch being resumed'}), 400
+        batch_id = header['batch_id']
+    else:
+        batch_id = _generate_result_id(is_batch=True)
+
+    if data.get('async'):
+        try:
+            priority = int(data.get('priority') or 0)
+        except (TypeError, ValueError):
+            priority = 0
+        job = _BatchJob(batch_id, total, priority)
+        job.run = lambda: _execute_batch_rows(batch_id, meta, curl_command, assertions, items, row_fn, options,
+                                              job, resume=bool(resume_id), collect=False, total=total)
+        try:
+            _job_queue.submit(job)
+        except queue.Full:
+            return jsonify({'success': False, 'error': 'Job queue is full, try again later'}), 429
+        return jsonify({'success': True, **job.snapshot()}), 202
+
+    document = _execute_batch_rows(batch_id, meta, curl_command, assertions, items, row_fn, options,
+                                   resume=bool(resume_id), total=total)
+    response = {
+        'success': True,
+        'batch_id': batch_id,
+        'total_rows': document['total_rows'],
+        'success_count': document['success_count'],
+        'failure_count': document['failure_count'],
+        'results': document['results']
+    }
+    for key in ('load_stats', 'timing_stats', 'deadline_exceeded'):
+        if document.get(key):
+            response[key] = document[key]
+    return jsonify(response)
+
+
+# ==== 后台批量任务队列 ====
+
+class _BatchJob:
+    """一个排队/执行中的批量任务及其进度计数"""
+
+    def __init__(self, batch_id: str, total: int, priority: int = 0):
+        self.id = uuid.uuid4().hex[:16]
+        self.batch_id = batch_id
+        self.total = total
+        self.priority = priority
+        self.status = 'queued'
+        self.error = None
+        self.done = 0
+        self.success_count = 0
+        self.failure_count = 0
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self.run = None
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)  # 有新行完成或任务结束时通知事件流
+        self._synced_at = 0.0
+
+    def _sync_due(self) -> bool:
+        # 调用方持有 self._lock；执行中的进度最多每秒同步一次到 jobs 表
+        now = time.monotonic()
+        if now - self._synced_at < 1.0:
+            return False
+        self._synced_at = now
+        return True
+
+    def record(self, row_result):
+        with self._lock:
+            self.done += 1
+            if row_result.get('success', False):
+                self.success_count += 1
+            elif row_result.get('success') is False:
+                self.failure_count += 1
+            self._changed.notify_all()
+            sync = self._sync_due()
+        if sync:
+            _sync_job(self)
+
+    def finish(self, status: str, error=None):
+        with self._lock:
+            self.status = status
+            self.error = error
+            self.finished_at = time.time()
+            self._changed.notify_all()
+        _sync_job(self)
+
+    def wait_progress(self, seen_done: int, timeout: float) -> bool:
+        """等待完成行数变化或任务结束；超时返回 False"""
+        with self._lock:
+            return self._changed.wait_for(lambda: self.done != seen_done or self.finished_at is not None, timeout)
+
+    def snapshot(self):
+        with self._lock:
+            end = self.finished_at or time.time()
+            elapsed = (end - self.started_at) if self.started_at else 0.0
+            return {
+                'job_id': self.id,
+                'batch_id': self.batch_id,
+                'status': self.status,
+                'priority': self.priority,
+                'total': self.total,
+                'done': self.done,
+                'success_count': self.success_count,
+                'failure_count': self.failure_count,
+                'rows_per_second': round(self.done / elapsed, 3) if elapsed > 0 else 0.0,
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+                'error': self.error,
+            }
+
+
+class _StoredJob:
+    """其他进程登记的任务（多 worker 部署时请求可能落到任意进程）：状态从结果索引的 jobs 表读取"""
+
+    def __init__(self, row):
+        self._apply(row)
+
+    def _apply(self, row):
+        self.id = row['id']
+        self.batch_id = row['batch_id']
+        self.created_at = row['created_at']
+        self.finished_at = row['finished_at']
+        self._snapshot = json.loads(row['snapshot'])
+
+    @classmethod
+    def load(cls, job_id: str):
+        row = _results_index().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return cls(row) if row is not None else None
+
+    def refresh(self):
+        row = _results_index().execute('SELECT * FROM jobs WHERE id = ?', (self.id,)).fetchone()
+        if row is not None:
+            self._apply(row)
+
+    def snapshot(self):
+        return dict(self._snapshot)
+
+    def wait_progress(self, seen_done: int, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while True:
+            self.refresh()
+            if self.finished_at is not None or self._snapshot.get('done') != seen_done:
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(0.5, remaining))
+
+
+def _sync_job(job: _BatchJob):
+    """把任务快照写入 jobs 表供其他进程查询，同时取回其他进程转来的取消请求；失败不影响任务本身"""
+    try:
+        snapshot = job.snapshot()
+        conn = _results_index()
+        with conn:
+            conn.execute(
+                'INSERT INTO jobs (id, batch_id, created_at, finished_at, snapshot) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT(id) DO UPDATE SET finished_at = excluded.finished_at, snapshot = excluded.snapshot',
+                (job.id, job.batch_id, job.created_at, snapshot['finished_at'],
+                 json.dumps(snapshot, ensure_ascii=False, default=str)))
+            row = conn.execute('SELECT cancel_requested FROM jobs WHERE id = ?', (job.id,)).fetchone()
+        if row is not None and row['cancel_requested']:
+            job.cancel_event.set()
+    except Exception as e:
+        app.logger.warning('Failed to store job %s: %s', job.id, e)
+
+
+class _JobQueue:
+    """有界优先级队列 + 固定数量的后台工作线程；priority 越大越先执行，同优先级先进先出"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue = None
+        self._seq = itertools.count()
+        self._jobs = OrderedDict()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._queue is not None:
+                return
+            self._queue = queue.PriorityQueue(maxsize=app.config['JOB_QUEUE_SIZE'])
+            for n in range(app.config['JOB_WORKERS']):
+                threading.Thread(target=self._worker, name=f'batch-job-{n}', daemon=True).start()
+
+    def submit(self, job: _BatchJob):
+        self._ensure_started()
+        self._queue.put_nowait((-job.priority, next(self._seq), job))
+        with self._lock:
+            self._jobs[job.id] = job
+            # 只保留最近的已结束任务，避免注册表无限增长
+            finished = [j for j in self._jobs.values() if j.finished_at]
+            for old in finished[:max(0, len(finished) - app.config['JOB_HISTORY'])]:
+                self._jobs.pop(old.id, None)
+        _sync_job(job)
+        try:
+            conn = _results_index()
+            with conn:
+                conn.execute(
+                    'DELETE FROM jobs WHERE finished_at IS NOT NULL AND id NOT IN '
+                    '(SELECT id FROM jobs WHERE finished_at IS NOT NULL ORDER BY finished_at DESC LIMIT ?)',
+                    (app.config['JOB_HISTORY'],))
+        except Exception as e:
+            app.logger.warning('Failed to trim job history: %s', e)
+
+    def get(self, job_id: str):
+        """本进程的任务，找不到时回退到 jobs 表中其他进程登记的任务"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job if job is not None else _StoredJob.load(job_id)
+
+    def list(self):
+        """本进程的任务"""
+        with self._lock:
+            return list(self._jobs.values())
+
+    def list_all(self):
+        """所有进程的任务：本进程的取内存中的实时状态，其余取 jobs 表"""
+        jobs = {job.id: job for job in self.list()}
+        rows = _results_index().execute(
+            'SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?', (app.config['JOB_HISTORY'],)).fetchall()
+        for row in rows:
+            if row['id'] not in jobs:
+                jobs[row['id']] = _StoredJob(row)
+        return list(jobs.values())
+
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _worker(self):
+        while True:
+            _, _, job = self._queue.get()
+            try:
+                _sync_job(job)  # 排队期间其他进程可能已请求取消
+                if job.cancel_event.is_set():
+                    if job.finished_at is None:
+                        job.finish('cancelled')
+                    continue
+                job.status = 'running'
+                job.started_at = time.time()
+                _sync_job(job)
+                try:
+                    job.run()
+                    job.finish('cancelled' if job.cancel_event.is_set() else 'completed')
+                except Exception as e:
+                    job.finish('failed', str(e))
+                job.run = None  # 释放闭包里持有的行数据
+            finally:
+                self._queue.task_done()
+
+
+_job_queue = _JobQueue()
+
+
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    jobs = sorted(_job_queue.list_all(), key=lambda j: j.created_at, reverse=True)
+    return jsonify({'success': True, 'queue_depth': _job_queue.depth(), 'jobs': [j.snapshot() for j in jobs]})
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = _job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({'success': True, **job.snapshot()})
+
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job = _job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if isinstance(job, _StoredJob):
+        # 任务属于其他进程：登记取消请求，由所属进程在下次同步时取消
+        if job.finished_at is None:
+            conn = _results_index()
+            with conn:
+                conn.execute('UPDATE jobs SET cancel_requested = 1 WHERE id = ?', (job_id,))
+        return jsonify({'success': True, 'cancel_requested': job.finished_at is None, **job.snapshot()})
+    if job.finished_at is None:
+        job.cancel_event.set()
+        if job.status == 'queued':
+            job.finish('cancelled')
+    return jsonify({'success': True, **job.snapshot()})
+
+
+def _sse_event(event: str, data, event_id=None) -> str:
+    lines = [f'event: {event}']
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append('data: ' + json.dumps(data, ensure_ascii=False, default=str))
+    return '\n'.join(lines) + '\n\n'
+
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Server-Sent Events：逐行推送任务结果（event: row）与进度计数（event: progress），结束时推送 event: done。
+    行事件的 id 是结果文件中的字节偏移，断线重连时浏览器带上 Last-Event-ID 即从该位置继续，不会重复或遗漏。
+    """
+    job = _job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    try:
+        position = int(request.headers.get('Last-Event-ID') or request.args.get('from') or 0)
+    except ValueError:
+        position = 0
+    path = _batch_result_path(job.batch_id)
+    heartbeat = app.config['SSE_HEARTBEAT']
+
+    def stream():
+        nonlocal position
+        f = None
+        seen = None
+        yield 'retry: 2000\n\n'
+        try:
+            while True:
+                # 先取结束标志再读文件：任务结束前所有行都已写入，结束后读到的一定是完整结果
+                finished = job.finished_at is not None
+                if f is None and os.path.exists(path):
+                    f = open(path, 'rb')
+                if f is not None:
+                    f.seek(position)
+                    for line in f:
+                        if not line.endswith(b'\n'):
+                            break
+                        position += len(line)
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            continue
+                        if record.pop('record', None) == 'row':
+                            yield _sse_event('row', record, position)
+                snapshot = job.snapshot()
+                if finished:
+                    yield _sse_event('done', snapshot)
+                    return
+                if snapshot['done'] != seen:
+                    seen = snapshot['done']
+                    yield _sse_event('progress', snapshot)
+                if not job.wait_progress(seen, heartbeat):
+                    yield ': keep-alive\n\n'
+        finally:
+            if f is not None:
+                f.close()
+
+    return app.response_class(stream(), mimetype='text/event-stream',
+                              headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+# ==== 分布式执行：SQLite 工作队列 + worker 进程 ====
+# 请求体 distributed=true 时，协调者（处理请求的进程）把行按 WORK_CHUNK_ROWS 分块写入工作队列，
+# worker 进程租用（lease）分块、在本地按 concurrency 执行后提交结果，协调者按分块顺序合并写入结果文件。
+# worker 持有租约期间定期续租；进程死掉后租约过期，分块自动重新分配给其他 worker。
+# 本机 worker 直接读写队列库；其他主机上的 worker 通过 /work/* 接口连到协调者，运行中随时可以加入。
+
+_WORK_QUEUE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS work_tasks (
+    batch_id TEXT PRIMARY KEY,
+    spec TEXT NOT NULL,
+    created_at REAL
+);
+CREATE TABLE IF NOT EXISTS work_chunks (
+    batch_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    rows TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    worker TEXT,
+    leased_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    results TEXT,
+    PRIMARY KEY (batch_id, seq)
+);
+CREATE INDEX IF NOT EXISTS work_chunks_status ON work_chunks (status, leased_until);
+'''
+
+
+class _WorkQueue:
+    """分块工作队列：queued → leased（租约到期可被重新租用）→ done（结果取走后删除）；
+    租用次数达到上限后租约再次过期的分块记为 failed，不再分配"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # 自动提交模式，租用时显式 BEGIN IMMEDIATE 保证多个 worker 不会租到同一分块
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(_WORK_QUEUE_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def register(self, batch_id: str, task: dict):
+        self._conn().execute('INSERT OR REPLACE INTO work_tasks (batch_id, spec, created_at) VALUES (?, ?, ?)',
+                             (batch_id, json.dumps(task, ensure_ascii=False, default=str), time.time()))
+
+    def put(self, batch_id: str, seq: int, rows):
+        self._conn().execute(
+            'INSERT OR REPLACE INTO work_chunks (batch_id, seq, rows) VALUES (?, ?, ?)',
+            (batch_id, seq, json.dumps(rows, ensure_ascii=False, default=str)))
+
+    def reap(self, max_attempts: int):
+        """把租约已过期且租用次数达到上限的分块标记为 failed"""
+        self._conn().execute(
+            "UPDATE work_chunks SET status = 'failed' WHERE status = 'leased' AND leased_until < ? AND attempts >= ?",
+            (time.time(), max_attempts))
+
+    def active(self) -> bool:
+        """是否有 worker 正持有分块（租约未过期）；worker 忙于其他批量时同样说明 worker 在工作"""
+        return self._conn().execute(
+            "SELECT 1 FROM work_chunks WHERE status = 'leased' AND leased_until >= ? LIMIT 1",
+            (time.time(),)).fetchone() is not None
+
+    def lease(self, worker: str, lease_seconds: float):
+        """租用最早的可用分块（排队中或租约已过期），没有时返回 None"""
+        conn = self._conn()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                "UPDATE work_chunks SET status = 'failed' WHERE status = 'leased' AND leased_until < ? AND attempts >= ?",
+                (now, app.config['WORK_MAX_ATTEMPTS']))
+            row = conn.execute(
+                "SELECT c.batch_id, c.seq, c.rows, t.spec FROM work_chunks c JOIN work_tasks t USING (batch_id) "
+                "WHERE c.status = 'queued' OR (c.status = 'leased' AND c.leased_until < ?) "
+                "ORDER BY c.rowid LIMIT 1", (now,)).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE work_chunks SET status = 'leased', worker = ?, leased_until = ?, attempts = attempts + 1 "
+                    "WHERE batch_id = ? AND seq = ?", (worker, now + lease_seconds, row['batch_id'], row['seq']))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        if row is None:
+            return None
+        return {'batch_id': row['batch_id'], 'seq': row['seq'],
+                'rows': json.loads(row['rows']), 'task': json.loads(row['spec'])}
+
+    def heartbeat(self, worker: str, batch_id: str, seq: int, lease_seconds: float) -> bool:
+        """续租；分块已被取消或改派给其他 worker 时返回 False"""
+        cursor = self._conn().execute(
+            "UPDATE work_chunks SET leased_until = ? WHERE batch_id = ? AND seq = ? AND status = 'leased' AND worker = ?",
+            (time.time() + lease_seconds, batch_id, seq, worker))
+        return cursor.rowcount > 0
+
+    def complete(self, worker: str, batch_id: str, seq: int, results) -> bool:
+        # 同一分块先提交的结果生效（租约过期后原 worker 与新 worker 可能都会提交）
+        cursor = self._conn().execute(
+            "UPDATE work_chunks SET status = 'done', worker = ?, results = ? "
+            "WHERE batch_id = ? AND seq = ? AND status != 'done'",
+            (worker, json.dumps(results, ensure_ascii=False, default=str), batch_id, seq))
+        return cursor.rowcount > 0
+
+    def take(self, batch_id: str, seq: int):
+        """取走已完成分块的结果；未完成时返回 None。失败的分块返回每行一条 error 结果"""
+        conn = self._conn()
+        row = conn.execute("SELECT rows, status, attempts, results FROM work_chunks "
+                           "WHERE batch_id = ? AND seq = ? AND status IN ('done', 'failed')",
+                           (batch_id, seq)).fetchone()
+        if row is None:
+            return None
+        conn.execute('DELETE FROM work_chunks WHERE batch_id = ? AND seq = ?', (batch_id, seq))
+        if row['status'] == 'done':
+            return json.loads(row['results'])
+        error = f"Chunk abandoned after {row['attempts']} attempts (worker crashed or lost its lease)"
+        return [{'row_index': row_index, 'variables': variables, 'error': error, 'success': False}
+                for row_index, variables in json.loads(row['rows'])]
+
+    def drop(self, batch_id: str):
+        conn = self._conn()
+        conn.execute('DELETE FROM work_chunks WHERE batch_id = ?', (batch_id,))
+        conn.execute('DELETE FROM work_tasks WHERE batch_id = ?', (batch_id,))
+
+
+_work_queues = {}
+_work_queues_lock = threading.Lock()
+
+
+def _work_queue() -> _WorkQueue:
+    path = app.config['WORK_QUEUE'] or os.path.join(app.config['RESULTS_FOLDER'], '.work_queue.sqlite3')
+    with _work_queues_lock:
+        work_queue = _work_queues.get(path)
+        if work_queue is None:
+            work_queue = _work_queues[path] = _WorkQueue(path)
+        return work_queue
+
+
+_local_workers = []
+_local_workers_lock = threading.Lock()
+# 本机 worker 沿用协调者实际生效的配置（可能在启动后被修改过，而不只是环境变量默认值），经环境变量以 JSON 传递
+_WORKER_CONFIG_KEYS = (
+    'UPLOAD_FOLDER', 'RESULTS_FOLDER', 'BLOB_FOLDER', 'UPLOAD_CACHE_FOLDER', 'ROW_TIMEOUT', 'DEFAULT_ENGINE',
+    'MAX_CONCURRENCY', 'PARALLEL_CHUNK_SIZE', 'PARALLEL_MAX', 'PARALLEL_LINGER', 'PARALLEL_PROCESSES',
+    'BREAKER_THRESHOLD', 'BREAKER_COOLDOWN', 'RETRY_BACKOFF', 'RETRY_MAX_BACKOFF', 'BODY_INLINE_LIMIT', 'WORK_LEASE',
+)
+_WORKER_CONFIG_ENV = 'CURL_EXECUTOR_WORKER_CONFIG'
+
+
+def _ensure_local_workers():
+    """按 LOCAL_WORKERS 启动本机 worker 进程（已退出的重新拉起），worker 随本进程退出"""
+    with _local_workers_lock:
+        _local_workers[:] = [p for p in _local_workers if p.poll() is None]
+        missing = app.config['LOCAL_WORKERS'] - len(_local_workers)
+        if missing <= 0:
+            return
+        env = dict(os.environ)
+        env[_WORKER_CONFIG_ENV] = json.dumps({key: app.config[key] for key in _WORKER_CONFIG_KEYS})
+        for _ in range(missing):
+            _local_workers.append(subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), 'worker', '--queue', _work_queue().path,
+                 '--parent', str(os.getpid())], env=env))
+
+
+def _run_distributed(batch_id, items, task, job=None, sink=None, collect: bool = True, budget=None):
+    """协调者：分块写入工作队列并按顺序合并结果；未完成的分块最多 WORK_MAX_PENDING 个，数据源按需读取"""
+    work_queue = _work_queue()
+    if budget is not None and budget.deadline is not None:
+        # 截止时间换算为墙钟时间交给 worker（可能在其他主机上）
+        task = {**task, 'deadline_at': time.time() + (budget.deadline - time.monotonic())}
+    work_queue.register(batch_id, task)
+    _ensure_local_workers()
+    items = iter(items)
+    chunk_rows = app.config['WORK_CHUNK_ROWS']
+    chunks = iter(lambda: list(itertools.islice(items, chunk_rows)), [])
+    results = []
+    pending = {}  # 已分发未合并的分块：seq -> 行，截止时间到达时据此记为 skipped
+    queued = merged = 0
+    exhausted = False
+    poll = 0.02
+    last_progress = last_check = time.monotonic()
+
+    def emit(row_result):
+        if sink is not None:
+            sink(row_result)
+        if job is not None:
+            job.record(row_result)
+        if collect:
+            results.append(row_result)
+
+    try:
+        while True:
+            if job is not None and job.cancel_event.is_set():
+                break
+            while not exhausted and queued - merged < app.config['WORK_MAX_PENDING']:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    exhausted = True
+                elif budget is not None and budget.expired():
+                    # 截止时间已过，剩余的行不再分发
+                    for row_index, variables in chunk:
+                        emit(_skipped_row(row_index, variables))
+                else:
+                    work_queue.put(batch_id, queued, chunk)
+                    pending[queued] = chunk
+                    queued += 1
+            if exhausted and merged == queued:
+                break
+            chunk_results = work_queue.take(batch_id, merged)
+            if chunk_results is None and budget is not None and budget.expired():
+                # 截止时间已过：不再等待未完成的分块，其中的行记为 skipped
+                chunk_results = [_skipped_row(row_index, variables) for row_index, variables in pending[merged]]
+            if chunk_results is None:
+                now = time.monotonic()
+                if now - last_check >= 1.0:
+                    last_check = now
+                    # 重新拉起已退出的本机 worker，回收反复失败的分块
+                    _ensure_local_workers()
+                    work_queue.reap(app.config['WORK_MAX_ATTEMPTS'])
+                    if work_queue.active():
+                        last_progress = now
+                    elif now - last_progress >= app.config['WORK_IDLE_TIMEOUT']:
+                        raise RuntimeError(f"No worker picked up batch chunks for {app.config['WORK_IDLE_TIMEOUT']:g}s "
+                                           '(no local workers and no remote worker attached)')
+                time.sleep(poll)
+                poll = min(poll * 2, 0.5)
+                continue
+            poll = 0.02
+            last_progress = time.monotonic()
+            del pending[merged]
+            for row_result in sorted(chunk_results, key=lambda r: r.get('row_index') or 0):
+                emit(row_result)
+            merged += 1
+    finally:
+        work_queue.drop(batch_id)
+    return results
+
+
+class _HttpWorkClient:
+    """其他主机上的 worker 通过协调者的 /work/* 接口访问工作队列"""
+
+    def __init__(self, base_url: str, token: str):
+        self.base_url = base_url.rstrip('/')
+        self.token = token
+
+    def _post(self, path: str, payload: dict):
+        req = urllib.request.Request(self.base_url + path, data=json.dumps(payload, default=str).encode('utf-8'),
+                                     headers={'Content-Type': 'application/json',
+                                              'Authorization': f'Bearer {self.token}'}, method='POST')
+        with urllib.request.urlopen(req, timeout=60) as resp:
+            return json.loads(resp.read() or b'{}')
+
+    def lease(self, worker, lease_seconds):
+        return self._post('/work/lease', {'worker': worker, 'lease': lease_seconds}).get('chunk')
+
+    def heartbeat(self, worker, batch_id, seq, lease_seconds):
+        return self._post('/work/heartbeat', {'worker': worker, 'batch_id': batch_id, 'seq': seq,
+                                              'lease': lease_seconds}).get('active', False)
+
+    def complete(self, worker, batch_id, seq, results):
+        return self._post('/work/complete', {'worker': worker, 'batch_id': batch_id, 'seq': seq,
+                                             'results': results}).get('accepted', False)
+
+
+def _run_worker(client, parent_pid: int = 0):
+    """worker 主循环：租用分块 → 执行 → 提交；执行期间后台线程续租，分块被取消或改派时终止在途的行"""
+    worker = f"{socket.gethostname()}-{os.getpid()}"
+    lease_seconds = app.config['WORK_LEASE']
+    row_fns = OrderedDict()  # batch_id -> row_fn，同一批量的分块共用模板与熔断器
+    while True:
+        if parent_pid and os.getppid() != parent_pid:
+            return
+        try:
+            chunk = client.lease(worker, lease_seconds)
+        except Exception as e:
+            app.logger.warning('Failed to lease work: %s', e)
+            chunk = None
+        if chunk is None:
+            time.sleep(0.2)
+            continue
+
+        batch_id, seq, task = chunk['batch_id'], chunk['seq'], chunk['task']
+        options = task['options']
+        cancel = threading.Event()
+        stop = threading.Event()
+
+        def keep_lease():
+            while not stop.wait(lease_seconds / 3):
+                try:
+                    if not client.heartbeat(worker, batch_id, seq, lease_seconds):
+                        cancel.set()
+                        return
+                except Exception as e:
+                    app.logger.warning('Failed to renew lease: %s', e)
+
+        heartbeat = threading.Thread(target=keep_lease, daemon=True)
+        heartbeat.start()
+        rows = [(row_index, variables) for row_index, variables in chunk['rows']]
+        try:
+            row_fn = row_fns.get(batch_id)
+            if row_fn is None and task.get('scenario') is not None:
+                row_fn = row_fns[batch_id] = _make_scenario_row_fn(_Scenario(task['scenario']), options)
+            elif row_fn is None:
+                row_fn = row_fns[batch_id] = _make_row_fn(
+                    task['curl_command'], task['assertions'], options, _RESPONSE_VIEWS.get(task.get('view')),
+                    task.get('capture_errors', True))
+                while len(row_fns) > 8:
+                    row_fns.popitem(last=False)
+            deadline_at = task.get('deadline_at')
+            budget = _RowBudget(options['timeout'], max(deadline_at - time.time(), 1e-6) if deadline_at else 0,
+                                cancel)
+            results = _run_rows(rows, row_fn, options['concurrency'], options['per_host'], budget=budget)
+        except Exception as e:
+            results = [{'row_index': row_index, 'variables': variables, 'error': str(e), 'success': False}
+                       for row_index, variables in rows]
+        finally:
+            stop.set()
+        if cancel.is_set():
+            continue
+        try:
+            client.complete(worker, batch_id, seq, results)
+        except Exception as e:
+            # 提交失败时租约会过期，分块由其他 worker 重新执行
+            app.logger.warning('Failed to submit results: %s', e)
+
+
+def _worker_main(argv):
+    import argparse
+    parser = argparse.ArgumentParser(prog='curl_executor.py worker', description='Run a batch worker process')
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--queue', help='path of the local SQLite work queue')
+    target.add_argument('--coordinator', help='base URL of a remote coordinator, e.g. http://host:5000')
+    parser.add_argument('--parent', type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    inherited = os.environ.get(_WORKER_CONFIG_ENV)
+    if inherited:
+        app.config.update(json.loads(inherited))
+    if args.coordinator:
+        if not app.config['WORK_TOKEN']:
+            parser.error('--coordinator requires the shared token in CURL_EXECUTOR_WORK_TOKEN')
+        client = _HttpWorkClient(args.coordinator, app.config['WORK_TOKEN'])
+    else:
+        if args.queue:
+            app.config['WORK_QUEUE'] = args.queue
+        client = _work_queue()
+    try:
+        _run_worker(client, args.parent)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def _work_auth_error():
+    """校验远程 worker 的共享令牌；未配置令牌时 /work/* 接口整体关闭。通过时返回 None"""
+    token = app.config['WORK_TOKEN']
+    if not token:
+        return jsonify({'error': 'Remote workers are disabled (CURL_EXECUTOR_WORK_TOKEN is not set)'}), 404
+    supplied = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(supplied.encode('utf-8'), f'Bearer {token}'.encode('utf-8')):
+        return jsonify({'error': 'Invalid worker token'}), 401
+    return None
+
+
+@app.route('/work/lease', methods=['POST'])
+def work_lease():
+    error = _work_auth_error()
+    if error:
+        return error
+    data = request.json or {}
+    worker = str(data.get('worker') or request.remote_addr)
+    lease_seconds = _option_number(data, 'lease', app.config['WORK_LEASE'])
+    return jsonify({'success': True, 'chunk': _work_queue().lease(worker, lease_seconds)})
+
+
+@app.route('/work/heartbeat', methods=['POST'])
+def work_heartbeat():
+    error = _work_auth_error()
+    if error:
+        return error
+    data = request.json or {}
+    active = _work_queue().heartbeat(str(data.get('worker')), str(data.get('batch_id')), int(data.get('seq') or 0),
+                                     _option_number(data, 'lease', app.config['WORK_LEASE']))
+    return jsonify({'success': True, 'active': active})
+
+
+@app.route('/work/complete', methods=['POST'])
+def work_complete():
+    error = _work_auth_error()
+    if error:
+        return error
+    data = request.json or {}
+    accepted = _work_queue().complete(str(data.get('worker')), str(data.get('batch_id')), int(data.get('seq') or 0),
+                                      data.get('results') or [])
+    return jsonify({'success': True, 'accepted': accepted})
+
+
+@app.route('/execute_curl', methods=['POST'])
+def execute_curl():
+    data = request.json or {}
+    curl_command = data.get('curl_command', '')
+    variables = data.get('variables', {})
     assertions = data.get('assertions', [])
     iterations = int(data.get('iterations') or 1)
     if iterations < 1:
         iterations = 1
+    options = _batch_options(data)
 
     if not curl_command:
         return jsonify({'error': 'No curl command provided'}), 400
+    try:
+        compiled_assertions = _compile_assertions(assertions)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        load = _load_options(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid load options: {e}'}), 400
 
     # 支持 JSON 根为数组：批量执行
     try:
+        if load is not None:
+            # 压测模式：按目标 RPS 的固定时钟发送 load['requests'] 个请求；variables 为数组时循环取用。
+            # 未指定 concurrency 时在途请求上限取 MAX_CONCURRENCY
+            pool_vars = variables if isinstance(variables, list) and variables else [variables]
+            if not data.get('concurrency'):
+                options['concurrency'] = app.config['MAX_CONCURRENCY']
+            options['load'] = load
+            return _dispatch_batch(
+                data, {'source': 'load', 'load': load}, curl_command, assertions,
+                ((k + 1, pool_vars[k % len(pool_vars)]) for k in range(load['requests'])),
+                _make_row_fn(curl_command, assertions, options), options, total=load['requests'])
+
         if isinstance(variables, list):
-            batch_id = _generate_result_id(is_batch=True)
-            batch_results = []
-            loop_items = variables[:iterations] if iterations and iterations <= len(variables) else variables
-            for index, vars_item in enumerate(loop_items):
-                try:
-                    current_cmd = replace_variables(curl_command, vars_item)
-                    parsed_req = _parse_curl_request(current_cmd)
-                    result = _run_curl_script(current_cmd)
-                    stdout = result.stdout or ''
-                    stderr = result.stderr or ''
-                    status_code = _extract_status_code(stdout, stderr)
-                    resp_headers, resp_body = _parse_response_parts(stdout, stderr)
-                    response_data = {
-                        'code': status_code,
-                        'stdout': stdout,
-                        'stderr': stderr,
-                        'returncode': result.returncode,
-                        'raw': (stdout + "\n" + stderr).strip(),
-                        'headers': resp_headers,
-                        'body': resp_body
-                    }
-                    assertion_results = []
-                    for assertion in assertions:
-                        if isinstance(assertion, str) and assertion.strip():
-                            assertion_results.append(evaluate_assertion(assertion, response_data))
-                    row_result = {
-                        'row_index': index + 1,
-                        'variables': vars_item,
-                        'curl_command': current_cmd,
-                        'request': parsed_req,
-                        'response': response_data,
-                        'assertions': assertion_results,
-                        'success': all(a.get('success', False) for a in assertion_results) if assertion_results else None
-                    }
-                    batch_results.append(row_result)
-                except Exception as e:
-                    batch_results.append({
-                        'row_index': index + 1,
-                        'variables': vars_item,
-                        'error': str(e),
-                        'success': False
-                    })
-
-            # 保存批量结果（标记为 batch 以复用前端/历史逻辑）
-            batch_result_file = os.path.join(app.config['RESULTS_FOLDER'], f"{batch_id}.json")
-            with open(batch_result_file, 'w', encoding='utf-8') as f:
-                json.dump({
-                    'batch_id': batch_id,
-                    'timestamp': time.time(),
-                    'source': 'json_array',
-                    'curl_command_template': curl_command,
-                    'assertions': assertions,
-                    'results': batch_results,
-                    'total_rows': len(batch_results),
-                    'success_count': sum(1 for r in batch_results if r.get('success', False)),
-                    'failure_count': sum(1 for r in batch_results if r.get('success') is False)
-                }, f, indent=2, ensure_ascii=False)
-
-            return jsonify({
-                'success': True,
-                'batch_id': batch_id,
-                'total_rows': len(batch_results),
-                'success_count': sum(1 for r in batch_results if r.get('success', False)),
-                'failure_count': sum(1 for r in batch_results if r.get('success') is False),
-                'results': batch_results
-            })
+            # 保存批量结果（标记为 batch 以复用前端/历史逻辑）；iterations 限制执行的行数
+            source = _ListRowSource(variables)
+            return _dispatch_batch(
+                data, {'source': 'json_array'}, curl_command, assertions,
+                source.items(iterations), _make_row_fn(curl_command, assertions, options), options,
+                total=source.count(iterations))
 
         # 单次/重复执行（KV 或 JSON 对象）
         if iterations > 1:
-            batch_id = _generate_result_id(is_batch=True)
-            batch_results = []
-            for i in range(iterations):
-                current_cmd = replace_variables(curl_command, variables)
-                parsed_req = _parse_curl_request(current_cmd)
-                result = _run_curl_script(current_cmd)
-                stdout = result.stdout or ''
-                stderr = result.stderr or ''
-                status_code = _extract_status_code(stdout, stderr)
-                resp_headers, resp_body = _parse_response_parts(stdout, stderr)
-                response_data = {
-                    'code': status_code,
-                    'stdout': stdout,
-                    'stderr': stderr,
-                    'returncode': result.returncode,
-                    'raw': (stdout + "\n" + stderr).strip(),
-                    'headers': resp_headers,
-                    'body': resp_body
-                }
-                assertion_results = []
-                for assertion in assertions:
-                    if isinstance(assertion, str) and assertion.strip():
-                        assertion_results.append(evaluate_assertion(assertion, response_data))
-                batch_results.append({
-                    'row_index': i + 1,
-                    'variables': variables,
-                    'curl_command': current_cmd,
-                    'request': parsed_req,
-                    'response': response_data,
-                    'assertions': assertion_results,
-                    'success': all(a.get('success', False) for a in assertion_results) if assertion_results else None
-                })
-
-            batch_result_file = os.path.join(app.config['RESULTS_FOLDER'], f"{batch_id}.json")
-            with open(batch_result_file, 'w', encoding='utf-8') as f:
-                json.dump({
-                    'batch_id': batch_id,
-                    'timestamp': time.time(),
-                    'source': 'repeat_single',
-                    'curl_command_template': curl_command,
-                    'assertions': assertions,
-                    'results': batch_results,
-                    'total_rows': len(batch_results),
-                    'success_count': sum(1 for r in batch_results if r.get('success', False)),
-                    'failure_count': sum(1 for r in batch_results if r.get('success') is False)
-                }, f, indent=2, ensure_ascii=False)
-
-            return jsonify({
-                'success': True,
-                'batch_id': batch_id,
-                'total_rows': len(batch_results),
-                'success_count': sum(1 for r in batch_results if r.get('success', False)),
-                'failure_count': sum(1 for r in batch_results if r.get('success') is False),
-                'results': batch_results
-            })
+            return _dispatch_batch(
+                data, {'source': 'repeat_single'}, curl_command, assertions,
+                ((i + 1, variables) for i in range(iterations)),
+                _make_row_fn(curl_command, assertions, options, capture_errors=False), options, total=iterations)
 
         curl_command = replace_variables(curl_command, variables)
         parsed_req = _parse_curl_request(curl_command)
-        result = _run_curl_script(curl_command)
-
-        stdout = result.stdout or ''
-        stderr = result.stderr or ''
-        status_code = _extract_status_code(stdout, stderr)
-        resp_headers, resp_body = _parse_response_parts(stdout, stderr)
-
-        response_data = {
-            'code': status_code,
-            'stdout': stdout,
-            'stderr': stderr,
-            'returncode': result.returncode,
-            'raw': (stdout + "\n" + stderr).strip(),
-            'headers': resp_headers,
-            'body': resp_body
-        }
-
-        # 执行断言
-        assertion_results = []
-        for assertion in assertions:
-            if isinstance(assertion, str) and assertion.strip():
-                assertion_results.append(evaluate_assertion(assertion, response_data))
+        result, response_data, assertion_results = _execute_rendered(
+            curl_command, compiled_assertions, parsed_req=parsed_req, engine=options['engine'],
+            verbose=options['verbose'], timeout=options['timeout'] or None)
+        stdout = response_data['body']
+        stderr = response_data['stderr']
+        status_code = response_data['code']
 
         # 生成唯一的结果ID
         result_id = _generate_result_id(is_batch=False)
 
         # 保存结果到文件
         result_file = os.path.join(app.config['RESULTS_FOLDER'], f"result_{result_id}.json")
-        with open(result_file, 'w', encoding='utf-8') as f:
-            json.dump({
-                'id': result_id,
-                'timestamp': time.time(),
-                'curl_command': curl_command,
-                'request': parsed_req,
-                'variables': variables,
-                'response': response_data,
-                'assertions': assertion_results,
-                'success': all(a.get('success', False) for a in assertion_results) if assertion_results else None
-            }, f, indent=2, ensure_ascii=False)
+        text = json.dumps({
+            'id': result_id,
+            'timestamp': time.time(),
+            'curl_command': curl_command,
+            'request': parsed_req,
+            'variables': variables,
+            'response': _storable_response(response_data),
+            'assertions': assertion_results,
+            'success': _assertions_passed(assertion_results)
+        }, indent=2, ensure_ascii=False)
+        with _metrics.timer('curl_executor_result_write_seconds', kind='single'):
+            _atomic_write_text(result_file, text)
+        _metrics.inc('curl_executor_persisted_bytes_total', len(text.encode('utf-8')), kind='single')
+        _index_result({
+            'id': result_id,
+            'timestamp': time.time(),
+            'is_batch': False,
+            'success': _assertions_passed(assertion_results)
+        }, os.path.basename(result_file))
 
         return jsonify({
             'success': True,
@@ -523,8 +4277,9 @@ def execute_curl():
             'stderr': stderr,
             'returncode': result.returncode,
             'status_code': status_code,
+            'timing': response_data['timing'],
             'assertions': assertion_results,
-            'all_assertions_passed': all(a.get('success', False) for a in assertion_results) if assertion_results else None
+            'all_assertions_passed': _assertions_passed(assertion_results)
         })
 
     except Exception as e:
@@ -538,134 +4293,135 @@ def execute_batch():
     curl_command_template = data.get('curl_command')
     assertions = data.get('assertions', [])
     limit = data.get('iterations')  # 可选限制执行次数
+    options = _batch_options(data)
 
     if not excel_file or not curl_command_template:
         return jsonify({'error': 'Missing excel file or curl command'}), 400
+    try:
+        _compile_assertions(assertions)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], excel_file)
-    if not os.path.exists(filepath):
+    filepath = _uploaded_file_path(excel_file)
+    if not os.path.isfile(filepath):
         return jsonify({'error': 'Excel file not found'}), 404
 
+    limit = limit if isinstance(limit, int) and limit > 0 else None
+    offset = data.get('offset')  # 可选：跳过前 offset 行，与 iterations 组合即可只执行某一段
+    offset = offset if isinstance(offset, int) and offset > 0 else 0
     try:
-        df = pd.read_excel(filepath)
-        if isinstance(limit, int) and limit > 0:
-            df = df.head(limit)
+        source = _cached_row_source(filepath)
     except Exception as e:
         return jsonify({'error': f'Failed to read Excel: {e}'}), 500
 
-    batch_id = _generate_result_id(is_batch=True)
-    batch_results = []
-
     try:
-        for index, row in df.iterrows():
-            variables = row.to_dict()
-            # 填充模板
-            current_cmd = replace_variables(curl_command_template, variables)
+        prepared = None
+        items = source.items(limit, offset)
+        if data.get('prerender'):
+            # 按列一次性渲染整张表，逐行只剩执行与断言（需要把选中的行全部读入内存）
+            rows = list(source.rows(limit, offset))
+            prepared = dict(enumerate(_compile_template(curl_command_template).render_rows(source.columns, rows),
+                                      start=offset + 1))
+            items = enumerate(rows, start=offset + 1)
+        # 行从数据源流式读取，逐行写入结果文件
+        meta = {'excel_file': excel_file, 'offset': offset} if offset else {'excel_file': excel_file}
+        return _dispatch_batch(
+            data, meta, curl_command_template, assertions, items,
+            _make_row_fn(curl_command_template, assertions, options, _excel_response_view, prepared=prepared),
+            options, total=source.count(limit, offset))
 
-            try:
-                result = _run_curl_script(current_cmd)
-
-                stdout = result.stdout or ''
-                stderr = result.stderr or ''
-                status_code = _extract_status_code(stdout, stderr)
-
-                resp_headers, resp_body = _parse_response_parts(stdout, stderr)
-                response_data = {
-                    'code': status_code,
-                    'stdout': stdout,
-                    'stderr': stderr,
-                    'returncode': result.returncode,
-                    'raw': (stdout + "\n" + stderr).strip(),
-                    'headers': resp_headers,
-                    'body': resp_body
-                }
-
-                assertion_results = []
-                for assertion in assertions:
-                    if isinstance(assertion, str) and assertion.strip():
-                        assertion_results.append(evaluate_assertion(assertion, response_data))
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
 
-                row_result = {
-                    'row_index': index + 1,
-                    'variables': variables,
-                    'curl_command': current_cmd,
-                    'request': _parse_curl_request(current_cmd),
-                    'response': {
-                        'stdout': stdout,
-                        'stderr': stderr,
-                        'returncode': result.returncode,
-                        'status_code': status_code,
-                        'headers': resp_headers,
-                        'body': resp_body
-                    },
-                    'assertions': assertion_results,
-                    'success': all(a.get('success', False) for a in assertion_results) if assertion_results else None
-                }
-                batch_results.append(row_result)
 
-            except Exception as e:
-                batch_results.append({
-                    'row_index': index + 1,
-                    'variables': variables,
-                    'error': str(e),
-                    'success': False
-                })
-
-        # 循环结束后统一保存与返回
-        batch_result_file = os.path.join(app.config['RESULTS_FOLDER'], f"{batch_id}.json")
-        with open(batch_result_file, 'w', encoding='utf-8') as f:
-            json.dump({
-                'batch_id': batch_id,
-                'timestamp': time.time(),
-                'excel_file': excel_file,
-                'curl_command_template': curl_command_template,
-                'assertions': assertions,
-                'results': batch_results,
-                'total_rows': len(batch_results),
-                'success_count': sum(1 for r in batch_results if r.get('success', False)),
-                'failure_count': sum(1 for r in batch_results if r.get('success') is False)
-            }, f, indent=2, ensure_ascii=False)
+@app.route('/execute_scenario', methods=['POST'])
+def execute_scenario():
+    """多步场景（见“多步场景”一节）：请求体 scenario 为场景定义，行数据来自 excel_file（已上传的文件）
+    或 variables（对象或数组，对象时按 iterations 重复）；iterations / offset 以及 concurrency、engine、
+    timeout、async、resume、distributed 等参数与批量执行相同"""
+    data = request.json or {}
+    options = _batch_options(data)
+    try:
+        scenario = _Scenario(data.get('scenario'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-        return jsonify({
-            'success': True,
-            'batch_id': batch_id,
-            'total_rows': len(batch_results),
-            'success_count': sum(1 for r in batch_results if r.get('success', False)),
-            'failure_count': sum(1 for r in batch_results if r.get('success') is False),
-            'results': batch_results
-        })
+    limit = data.get('iterations')
+    limit = limit if isinstance(limit, int) and limit > 0 else None
+    offset = data.get('offset')
+    offset = offset if isinstance(offset, int) and offset > 0 else 0
+    excel_file = data.get('excel_file')
+    variables = data.get('variables', {})
+    meta = {'source': 'scenario', 'scenario': scenario.definition}
+    if excel_file:
+        filepath = _uploaded_file_path(excel_file)
+        if not os.path.isfile(filepath):
+            return jsonify({'error': 'Excel file not found'}), 404
+        try:
+            source = _cached_row_source(filepath)
+        except Exception as e:
+            return jsonify({'error': f'Failed to read Excel: {e}'}), 500
+        meta['excel_file'] = excel_file
+    elif isinstance(variables, list):
+        source = _ListRowSource(variables)
+    elif isinstance(variables, dict):
+        source = _ListRowSource([variables] * (limit or 1))
+    else:
+        return jsonify({'error': 'variables must be an object or an array'}), 400
+    if offset:
+        meta['offset'] = offset
 
+    try:
+        # 场景定义的规范化 JSON 充当模板：写入结果头部，续跑时用来校验场景未被修改
+        return _dispatch_batch(data, meta, scenario.signature(), [], source.items(limit, offset),
+                               _make_scenario_row_fn(scenario, options), options,
+                               total=source.count(limit, offset))
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
 @app.route('/get_results', methods=['GET'])
 def get_results():
-    results_dir = app.config['RESULTS_FOLDER']
-    result_files = [f for f in os.listdir(results_dir) if f.endswith('.json')]
-    results = []
+    # 从索引读取汇总，最新的在前；支持 since/until（时间戳）、success=true|false、limit 过滤
+    # 带 ETag：索引未变化时 If-None-Match 命中直接返回 304，不查询索引
+    conn = _results_index()  # 首次打开时可能重建索引，需在取版本之前
+    etag = _results_etag()
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
 
-    for file in result_files:
-        try:
-            with open(os.path.join(results_dir, file), 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                results.append({
-                    'id': data.get('id') or data.get('batch_id'),
-                    'timestamp': data.get('timestamp'),
-                    'is_batch': 'batch_id' in data,
-                    'success': data.get('success'),
-                    'total_rows': data.get('total_rows'),
-                    'success_count': data.get('success_count'),
-                    'failure_count': data.get('failure_count'),
-                    'filename': file
-                })
-        except Exception:
-            pass
+    clauses = []
+    params = []
+    for arg, op in (('since', '>='), ('until', '<=')):
+        value = request.args.get(arg, type=float)
+        if value is not None:
+            clauses.append(f'timestamp {op} ?')
+            params.append(value)
+    success = (request.args.get('success') or '').lower()
+    if success in ('true', '1'):
+        clauses.append('(success = 1 OR (is_batch = 1 AND complete = 1 AND failure_count = 0))')
+    elif success in ('false', '0'):
+        clauses.append('(success = 0 OR failure_count > 0)')
+    sql = 'SELECT * FROM results'
+    if clauses:
+        sql += ' WHERE ' + ' AND '.join(clauses)
+    sql += ' ORDER BY timestamp DESC'
+    limit = request.args.get('limit', type=int)
+    if limit:
+        sql += ' LIMIT ?'
+        params.append(limit)
+
+    rows = conn.execute(sql, params).fetchall()
+    response = jsonify({'success': True, 'results': [_row_to_summary(row) for row in rows]})
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
-    # 按时间戳排序，最新的在前
-    results.sort(key=lambda x: x.get('timestamp', 0) or 0, reverse=True)
 
-    return jsonify({'success': True, 'results': results})
+@app.route('/rebuild_index', methods=['POST'])
+def rebuild_index():
+    return jsonify({'success': True, 'indexed': _rebuild_results_index()})
 
 
 @app.route('/clear_results', methods=['POST'])
@@ -674,8 +4430,11 @@ def clear_results():
     removed = 0
     errors = []
     results_dir = app.config['RESULTS_FOLDER']
+    index_path = _results_index_path()
     for name in os.listdir(results_dir):
         path = os.path.join(results_dir, name)
+        if path.startswith(index_path) or path.startswith(_work_queue().path):
+            continue  # 索引库（含 -wal/-shm）保留，下面清空表；工作队列库可能正被 worker 使用
         try:
             if os.path.isfile(path):
                 os.remove(path)
@@ -701,32 +4460,412 @@ def clear_results():
         except Exception as e:
             errors.append(str(e))
 
+    conn = _results_index()
+    with conn:
+        conn.execute('DELETE FROM results')
+        conn.execute('DELETE FROM result_rows')
+        conn.execute('DELETE FROM result_row_scan')
+    _touch_results_version()
+
     return jsonify({'success': True, 'removed': removed, 'errors': errors})
 
 
-@app.route('/get_result/<result_id>', methods=['GET'])
-def get_result(result_id):
+def _find_result_file(result_id: str):
+    """查找结果文件名：先查索引，再按约定文件名直接定位，最后回退到模糊匹配"""
     results_dir = app.config['RESULTS_FOLDER']
-
-    # 查找匹配的结果文件
-    result_file = None
+    row = _results_index().execute('SELECT filename FROM results WHERE id = ?', (result_id,)).fetchone()
+    if row is not None and os.path.exists(os.path.join(results_dir, row['filename'])):
+        return row['filename']
+    for candidate in (f"{result_id}.ndjson", f"{result_id}.json", f"result_{result_id}.json"):
+        if candidate == secure_filename(candidate) and os.path.exists(os.path.join(results_dir, candidate)):
+            return candidate
     for file in os.listdir(results_dir):
-        if result_id in file and file.endswith('.json'):
-            result_file = file
-            break
+        if result_id in file and file.endswith(('.json', '.ndjson')):
+            return file
+    return None
+
+
+def _row_status_code(row_result):
+    response = row_result.get('response') or {}
+    code = response.get('code', response.get('status_code'))
+    return code if isinstance(code, int) else None
+
+
+def _sync_row_offsets(batch_id: str, path: str):
+    """把 NDJSON 中尚未建立偏移索引的行追加进 result_rows 表（只扫描上次之后新增的字节）"""
+    conn = _results_index()
+    size = os.path.getsize(path)
+    row = conn.execute('SELECT scanned_bytes FROM result_row_scan WHERE batch_id = ?', (batch_id,)).fetchone()
+    position = row['scanned_bytes'] if row else 0
+    if position > size:
+        # 文件被截断或替换，重新建立索引
+        with conn:
+            conn.execute('DELETE FROM result_rows WHERE batch_id = ?', (batch_id,))
+        position = 0
+    if position == size:
+        return
+
+    entries = []
+    with open(path, 'rb') as f:
+        f.seek(position)
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            offset = position
+            position += len(line)
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get('record') != 'row':
+                continue
+            success = record.get('success')
+            entries.append((batch_id, record.get('row_index'), offset, len(line),
+                            None if success is None else int(bool(success)),
+                            _row_status_code(record), 1 if 'error' in record else 0))
+    with conn:
+        conn.executemany(
+            'INSERT OR REPLACE INTO result_rows (batch_id, row_index, offset, length, success, code, error) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)', entries)
+        conn.execute('INSERT OR REPLACE INTO result_row_scan (batch_id, scanned_bytes) VALUES (?, ?)',
+                     (batch_id, position))
+
+
+def _filter_rows_sql(args):
+    """把 status / code / row_index 查询参数转换为 result_rows 的 WHERE 条件"""
+    clauses = []
+    params = []
+    status = (args.get('status') or '').lower()
+    if status in ('passed', 'success'):
+        clauses.append('success = 1')
+    elif status in ('failed', 'failure'):
+        clauses.append('success = 0')
+    elif status == 'error':
+        clauses.append('error = 1')
+    elif status == 'none':
+        clauses.append('success IS NULL')
+    code = args.get('code', type=int)
+    if code is not None:
+        clauses.append('code = ?')
+        params.append(code)
+    row_index = args.get('row_index', type=int)
+    if row_index is not None:
+        clauses.append('row_index = ?')
+        params.append(row_index)
+    return clauses, params
+
 
+@app.route('/get_result/<result_id>/summary', methods=['GET'])
+def get_result_summary(result_id):
+    # 只返回元信息与计数，不含逐行结果
+    result_file = _find_result_file(result_id)
     if not result_file:
         return jsonify({'error': 'Result not found'}), 404
-
+    path = os.path.join(app.config['RESULTS_FOLDER'], result_file)
     try:
-        with open(os.path.join(results_dir, result_file), 'r', encoding='utf-8') as f:
+        if result_file.endswith('.ndjson'):
+            header = {}
+            for record in _iter_ndjson(path):
+                record.pop('record', None)
+                header = record
+                break
+            return jsonify({'success': True, 'data': {**header, **_read_batch_summary(path)}})
+        with open(path, 'r', encoding='utf-8') as f:
             data = json.load(f)
-            return jsonify({'success': True, 'data': data})
+        data.pop('results', None)
+        return jsonify({'success': True, 'data': data})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/get_result/<result_id>/rows', methods=['GET'])
+def get_result_rows(result_id):
+    # 分页读取批量结果的行：offset/limit，可按 status=passed|failed|error|none、code 与 row_index 过滤
+    result_file = _find_result_file(result_id)
+    if not result_file:
+        return jsonify({'error': 'Result not found'}), 404
+    path = os.path.join(app.config['RESULTS_FOLDER'], result_file)
+    offset = max(0, request.args.get('offset', 0, type=int))
+    limit = max(1, min(request.args.get('limit', 100, type=int), app.config['MAX_ROWS_PAGE']))
+    clauses, params = _filter_rows_sql(request.args)
+    expand = _expand_fields(request.args)
+
+    try:
+        if not result_file.endswith('.ndjson'):
+            # 旧版 .json 结果没有偏移索引，只能整体读取后切片
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            rows = data.get('results') or []
+            status = (request.args.get('status') or '').lower()
+            code = request.args.get('code', type=int)
+            if status in ('passed', 'success'):
+                rows = [r for r in rows if r.get('success') is True]
+            elif status in ('failed', 'failure'):
+                rows = [r for r in rows if r.get('success') is False]
+            elif status == 'error':
+                rows = [r for r in rows if 'error' in r]
+            elif status == 'none':
+                rows = [r for r in rows if r.get('success') is None]
+            if code is not None:
+                rows = [r for r in rows if _row_status_code(r) == code]
+            row_index = request.args.get('row_index', type=int)
+            if row_index is not None:
+                rows = [r for r in rows if r.get('row_index') == row_index]
+            total = len(rows)
+            rows = rows[offset:offset + limit]
+            if expand:
+                rows = [_expand_row(r, expand) for r in rows]
+            return jsonify({'success': True, 'total': total, 'offset': offset, 'limit': limit,
+                            'rows': rows})
+
+        batch_id = result_file[:-len('.ndjson')]
+        _sync_row_offsets(batch_id, path)
+        where = ' AND '.join(['batch_id = ?'] + clauses)
+        conn = _results_index()
+        total = conn.execute(f'SELECT COUNT(*) FROM result_rows WHERE {where}', [batch_id] + params).fetchone()[0]
+        entries = conn.execute(
+            f'SELECT offset, length FROM result_rows WHERE {where} ORDER BY row_index LIMIT ? OFFSET ?',
+            [batch_id] + params + [limit, offset]).fetchall()
+        rows = []
+        with open(path, 'rb') as f:
+            for entry in entries:
+                f.seek(entry['offset'])
+                record = json.loads(f.read(entry['length']))
+                record.pop('record', None)
+                rows.append(_expand_row(record, expand) if expand else record)
+        return jsonify({'success': True, 'total': total, 'offset': offset, 'limit': limit, 'rows': rows})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/get_result/<result_id>', methods=['GET'])
+def get_result(result_id):
+    result_file = _find_result_file(result_id)
+    if not result_file:
+        return jsonify({'error': 'Result not found'}), 404
+
+    results_dir = app.config['RESULTS_FOLDER']
+    expand = _expand_fields(request.args)  # 例如 ?expand=body,raw
+    try:
+        if result_file.endswith('.ndjson'):
+            data = _load_batch_document(os.path.join(results_dir, result_file))
+        else:
+            with open(os.path.join(results_dir, result_file), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        if expand:
+            if data.get('results'):
+                data['results'] = [_expand_row(item, expand) for item in data['results']]
+            else:
+                data = _expand_row(data, expand)
+        return jsonify({'success': True, 'data': data})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+def _cli_main(argv):
+    """无界面批量执行：python -m curl_executor run --template cmd.sh --data rows.xlsx --assert EXPR --concurrency 32
+    与 /execute_batch 共用渲染 → 执行 → 断言流程（--scenario 时按多步场景执行），不启动 HTTP 服务、不写 results 目录。
+    每行完成即向 stdout 输出一行 JSON（NDJSON，按完成顺序，以 row_index 区分），结束时向 stderr 输出汇总，
+    其中没有断言可判定的行单独计为 unchecked。
+    退出码：没有行失败为 0，有行断言失败、出错、超时或被跳过为 1（--require-assertions 时 unchecked 的行也算），
+    参数错误为 2，Ctrl-C 中断为 130，stdout 的读取方提前关闭管道（如 | head）时停止执行并返回 141。
+    """
+    import argparse
+    parser = argparse.ArgumentParser(prog='curl_executor.py run', description='Run a batch without the web server')
+    command = parser.add_mutually_exclusive_group(required=True)
+    command.add_argument('--template', help="file containing the curl command template ('-' reads stdin)")
+    command.add_argument('--curl', help='curl command template')
+    command.add_argument('--scenario', help='JSON file with a multi-step scenario (see /execute_scenario)')
+    parser.add_argument('--data', help='rows file (.xlsx, .xls, .csv, .jsonl); without it the command runs once')
+    parser.add_argument('--var', action='append', default=[], metavar='NAME=VALUE',
+                        help='variable applied to every row, overridden by columns of the same name (repeatable)')
+    parser.add_argument('--assert', dest='assertions', action='append', default=[], metavar='EXPR',
+                        help='assertion evaluated against every response (repeatable)')
+    parser.add_argument('--iterations', type=int, help='run at most N rows (without --data: repeat N times)')
+    parser.add_argument('--offset', type=int, default=0, help='skip the first N rows of --data')
+    parser.add_argument('--concurrency', type=int, help='rows executed in parallel')
+    parser.add_argument('--per-host', type=int, help='parallel requests per host (0 = unlimited)')
+    parser.add_argument('--engine', choices=('curl', 'native', 'parallel'))
+    parser.add_argument('--timeout', type=float, help='per-row timeout in seconds (0 = none)')
+    parser.add_argument('--deadline', type=float, help='whole-run deadline in seconds; later rows are skipped')
+    parser.add_argument('--retries', type=int, help='retries for idempotent requests on transient failures')
+    parser.add_argument('--verbose', action='store_true', help='keep the curl -v trace in stderr of each row')
+    parser.add_argument('--require-assertions', action='store_true',
+                        help='treat rows without any assertion result as failures')
+    args = parser.parse_args(argv)
+
+    scenario = None
+    if args.scenario:
+        if args.assertions:
+            parser.error('--assert cannot be combined with --scenario; put assertions on the steps')
+        try:
+            with open(args.scenario, 'r', encoding='utf-8') as f:
+                scenario = _Scenario(json.load(f))
+        except (OSError, ValueError) as e:
+            parser.error(f'invalid scenario: {e}')
+    elif args.template:
+        if args.template == '-':
+            curl_command = sys.stdin.read()
+        else:
+            try:
+                with open(args.template, 'r', encoding='utf-8') as f:
+                    curl_command = f.read()
+            except OSError as e:
+                parser.error(f'cannot read template: {e}')
+    else:
+        curl_command = args.curl
+    if scenario is None:
+        curl_command = curl_command.strip()
+    defaults = {}
+    for item in args.var:
+        name, sep, value = item.partition('=')
+        if not sep or not name:
+            parser.error(f'--var expects NAME=VALUE, got {item!r}')
+        defaults[name] = value
+    try:
+        _compile_assertions(args.assertions)
+    except ValueError as e:
+        parser.error(str(e))
+    options = _batch_options({
+        'concurrency': args.concurrency,
+        'per_host_concurrency': args.per_host,
+        'engine': args.engine,
+        'timeout': args.timeout,
+        'deadline': args.deadline,
+        'retries': args.retries,
+        'verbose': args.verbose,
+    })
+
+    limit = args.iterations if args.iterations and args.iterations > 0 else None
+    if args.data:
+        try:
+            source = _open_row_source(args.data)
+        except Exception as e:
+            parser.error(f'cannot read {args.data}: {e}')
+        items = ((row_index, {**defaults, **variables})
+                 for row_index, variables in source.items(limit, max(0, args.offset)))
+    else:
+        items = ((i + 1, defaults) for i in range(limit or 1))
+
+    # Ctrl-C 只设置取消标志：执行中的 curl 进程被终止，尚未开始的行不再读取
+    cancel = threading.Event()
+    signal.signal(signal.SIGINT, lambda signum, frame: cancel.set())
+    items = itertools.takewhile(lambda item: not cancel.is_set(), items)
+
+    outcomes = {}
+    output_lock = threading.Lock()
+    broken_pipe = threading.Event()
+
+    def emit(row_result):
+        line = json.dumps(row_result, ensure_ascii=False, default=str)
+        with output_lock:
+            if broken_pipe.is_set():
+                return
+            try:
+                sys.stdout.write(line + '\n')
+                sys.stdout.flush()
+            except BrokenPipeError:
+                # 读取方已关闭管道：停止执行；stdout 指向 /dev/null，避免退出时再次 flush 报错
+                broken_pipe.set()
+                cancel.set()
+                os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+                return
+            outcome = _row_outcome(row_result)
+            outcome = 'unchecked' if outcome == 'none' else outcome
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    started = time.monotonic()
+    row_fn = (_make_scenario_row_fn(scenario, options) if scenario is not None
+              else _make_row_fn(curl_command, args.assertions, options))
+    _run_rows(items, row_fn, options['concurrency'],
+              options['per_host'], sink=emit, collect=False,
+              budget=_RowBudget(options['timeout'], options['deadline'], cancel))
+    elapsed = time.monotonic() - started
+    total = sum(outcomes.values())
+    print(json.dumps({
+        'total_rows': total,
+        'outcomes': outcomes,
+        'elapsed': round(elapsed, 3),
+        'rows_per_second': round(total / elapsed, 3) if elapsed > 0 else 0.0,
+        'cancelled': cancel.is_set(),
+    }, ensure_ascii=False), file=sys.stderr)
+    if broken_pipe.is_set():
+        return 141
+    if cancel.is_set():
+        return 130
+    accepted = ('passed',) if args.require_assertions else ('passed', 'unchecked')
+    return 1 if any(outcome not in accepted for outcome in outcomes) else 0
+
+
+def _serve_main(argv):
+    """生产模式入口：优先用 gunicorn 多进程（gthread worker，SSE 长连接只占一个线程），
+    未安装时依次退回 waitress、werkzeug 多线程服务器（都是单进程）。
+    结果 ID、结果文件写入与任务状态（jobs 表）在多进程间都是安全的；/metrics 只反映处理该次抓取的进程。
+    """
+    import argparse
+    parser = argparse.ArgumentParser(prog='curl_executor.py serve', description='Run the app under a production server')
+    parser.add_argument('--bind', default=app.config['SERVER_BIND'], help='host:port to listen on')
+    parser.add_argument('--workers', type=int, default=app.config['SERVER_WORKERS'],
+                        help='worker processes (gunicorn only; 0 = one per CPU)')
+    parser.add_argument('--threads', type=int, default=app.config['SERVER_THREADS'], help='threads per worker')
+    args = parser.parse_args(argv)
+    _ensure_data_folders()
+    host, _, port = args.bind.rpartition(':')
+    host, port = host or '0.0.0.0', int(port)
+    workers = args.workers or os.cpu_count() or 1
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        BaseApplication = None
+    if BaseApplication is not None:
+        class _Server(BaseApplication):
+            def load_config(self):
+                for key, value in {
+                    'bind': f'{host}:{port}',
+                    'workers': workers,
+                    'threads': args.threads,
+                    'worker_class': 'gthread',
+                    # 批量同步执行可能持续很久，不按请求耗时杀 worker
+                    'timeout': 0,
+                    'graceful_timeout': 30,
+                }.items():
+                    self.cfg.set(key, value)
+
+            def load(self):
+                return app
+
+        _Server().run()
+        return 0
+    try:
+        import waitress
+    except ImportError:
+        waitress = None
+    if workers > 1:
+        app.logger.warning('gunicorn is not installed; serving from a single process')
+    if waitress is not None:
+        waitress.serve(app, host=host, port=port, threads=args.threads, channel_timeout=3600)
+        return 0
+    from werkzeug.serving import run_simple
+    run_simple(host, port, app, threaded=True)
+    return 0
+
+
 if __name__ == '__main__':
+    if sys.argv[1:2] == ['run']:
+        # 无界面批量执行，结果以 NDJSON 输出到 stdout：python -m curl_executor run --help
+        sys.exit(_cli_main(sys.argv[2:]))
+    if sys.argv[1:2] == ['worker']:
+        # 分布式执行的 worker：python curl_executor.py worker [--queue 路径 | --coordinator http://host:5000]
+        # worker 只读写工作队列，不创建上传 / 结果目录
+        sys.exit(_worker_main(sys.argv[2:]))
+    _ensure_data_folders()
+    if sys.argv[1:2] == ['rebuild-index']:
+        with app.app_context():
+            print(f"indexed {_rebuild_results_index()} results into {_results_index_path()}")
+        sys.exit(0)
+    if sys.argv[1:2] == ['serve']:
+        # 生产模式：python curl_executor.py serve [--bind 0.0.0.0:5000] [--workers N] [--threads N]
+        sys.exit(_serve_main(sys.argv[2:]))
     # Flask 3.x 默认不再支持 use_reloader=True 与 debug=1 的某些旧行为；
     # 在容器或生产中建议 debug=False。这里保持和你原来一致。
     app.run(debug=False, host='0.0.0.0', port=5000)
@@ -3,6 +3,16 @@ let currentVariables = {};
 let currentExcelFile = null;
 let curlEditor, jsonEditor;
 let historyAutoRefreshTimer = null;
+let historyEtag = null;
+let batchEvents = null;
+let batchTable = null;
+let batchRenderPending = false;
+
+// 批量结果虚拟表格：固定行高，只渲染滚动区域内可见的行
+const BATCH_ROW_HEIGHT = 36;
+const BATCH_OVERSCAN = 10;
+const BATCH_PAGE_SIZE = 100;
+const BATCH_MAX_PAGES = 50;
 
 // 初始化页面
 document.addEventListener('DOMContentLoaded', function() {
@@ -99,6 +109,15 @@ function bindEventHandlers() {
         }
     });
 
+    // 批量结果表：滚动时重新渲染可见行，查看详情用事件委托
+    const batchScroll = document.getElementById('batchResultsScroll');
+    if (batchScroll) batchScroll.addEventListener('scroll', scheduleBatchRender);
+    const batchBody = document.getElementById('batchResultsBody');
+    if (batchBody) batchBody.addEventListener('click', function(e) {
+        const btn = e.target.closest('button[data-position]');
+        if (btn) showBatchRowDetail(parseInt(btn.dataset.position, 10));
+    });
+
     // 主Tab切换时，确保批量结果面板只在“变量设置”页可见
     const mainTabs = document.getElementById('mainTabs');
     if (mainTabs) {
@@ -320,54 +339,7 @@ function executeCurl() {
                 document.getElementById('successCountResult').textContent = data.success_count;
                 document.getElementById('failureCountResult').textContent = data.failure_count;
 
-                const tableBody = document.getElementById('batchResultsBody');
-                tableBody.innerHTML = '';
-
-                data.results.forEach(result => {
-                    const tr = document.createElement('tr');
-
-                    const tdRow = document.createElement('td');
-                    tdRow.textContent = result.row_index;
-                    tr.appendChild(tdRow);
-
-                    const tdVars = document.createElement('td');
-                    tdVars.innerHTML = `<pre class="m-0" style="max-height: 100px; overflow: auto;">${JSON.stringify(result.variables, null, 2)}</pre>`;
-                    tr.appendChild(tdVars);
-
-                    const tdStatus = document.createElement('td');
-                    if (result.response && result.response.code) {
-                        tdStatus.textContent = result.response.code;
-                    } else if (result.response && result.response.status_code) {
-                        tdStatus.textContent = result.response.status_code;
-                    } else if (result.error) {
-                        tdStatus.innerHTML = `<span class="text-danger">错误</span>`;
-                    } else {
-                        tdStatus.textContent = '未知';
-                    }
-                    tr.appendChild(tdStatus);
-
-                    const tdAssert = document.createElement('td');
-                    if (result.success === true) {
-                        tdAssert.innerHTML = `<span class="result-success">通过</span>`;
-                    } else if (result.success === false) {
-                        tdAssert.innerHTML = `<span class="result-failure">失败</span>`;
-                    } else {
-                        tdAssert.textContent = '无断言';
-                    }
-                    tr.appendChild(tdAssert);
-
-                    const tdAction = document.createElement('td');
-                    const viewBtn = document.createElement('button');
-                    viewBtn.className = 'btn btn-sm btn-info';
-                    viewBtn.textContent = '查看详情';
-                    viewBtn.addEventListener('click', () => {
-                        showDetail(result);
-                    });
-                    tdAction.appendChild(viewBtn);
-                    tr.appendChild(tdAction);
-
-                    tableBody.appendChild(tr);
-                });
+                resetBatchTable(data.batch_id, data.results.length, data.results.map(compactBatchRow));
                 // 显示变量页下方批量结果面板
                 const variablesTab = new bootstrap.Tab(document.getElementById('variables-tab'));
                 variablesTab.show();
@@ -500,7 +472,9 @@ function executeBatch() {
     const hasExcel = !!currentExcelFile && source === 'excel';
 
     const iterations = Math.max(1, parseInt((document.getElementById('iterationsInput') || {}).value || '1', 10));
-    const payload = { curl_command: curlCommand, assertions, iterations };
+    const concurrency = Math.max(1, parseInt((document.getElementById('concurrencyInput') || {}).value || '1', 10));
+    // 以后台任务提交，结果通过事件流逐行推送
+    const payload = { curl_command: curlCommand, assertions, iterations, concurrency, async: true };
     let url = '';
     if (useJsonArray) {
         url = '/execute_curl';
@@ -527,71 +501,15 @@ function executeBatch() {
     })
     .then(response => response.json())
     .then(data => {
-        if (data.success) {
-            // 显示批量结果统计（变量页下方）
+        if (data.success && data.job_id) {
+            streamJob(data.job_id);
+        } else if (data.success) {
+            // 同步返回的完整结果
             document.getElementById('totalRowsResult').textContent = data.total_rows;
             document.getElementById('successCountResult').textContent = data.success_count;
             document.getElementById('failureCountResult').textContent = data.failure_count;
-            
-            // 显示批量结果详情
-            const tableBody = document.getElementById('batchResultsBody');
-            tableBody.innerHTML = '';
-            
-            data.results.forEach(result => {
-                const tr = document.createElement('tr');
-                
-                // 行号
-                const tdRow = document.createElement('td');
-                tdRow.textContent = result.row_index;
-                tr.appendChild(tdRow);
-                
-                // 变量
-                const tdVars = document.createElement('td');
-                tdVars.innerHTML = `<pre class="m-0" style="max-height: 100px; overflow: auto;">${JSON.stringify(result.variables, null, 2)}</pre>`;
-                tr.appendChild(tdVars);
-                
-                // 状态码
-                const tdStatus = document.createElement('td');
-                if (result.response && result.response.status_code) {
-                    tdStatus.textContent = result.response.status_code;
-                } else if (result.error) {
-                    tdStatus.innerHTML = `<span class="text-danger">错误</span>`;
-                } else {
-                    tdStatus.textContent = '未知';
-                }
-                tr.appendChild(tdStatus);
-                
-                // 断言结果
-                const tdAssert = document.createElement('td');
-                if (result.success === true) {
-                    tdAssert.innerHTML = `<span class="result-success">通过</span>`;
-                } else if (result.success === false) {
-                    tdAssert.innerHTML = `<span class="result-failure">失败</span>`;
-                } else {
-                    tdAssert.textContent = '无断言';
-                }
-                tr.appendChild(tdAssert);
-                
-                // 操作
-                const tdAction = document.createElement('td');
-                const viewBtn = document.createElement('button');
-                viewBtn.className = 'btn btn-sm btn-info';
-                viewBtn.textContent = '查看详情';
-                viewBtn.addEventListener('click', () => {
-                    showDetail(result);
-                });
-                tdAction.appendChild(viewBtn);
-                tr.appendChild(tdAction);
-                
-                tableBody.appendChild(tr);
-            });
-            // 切回变量Tab并展示批量结果面板
-            const variablesTabBtn = document.getElementById('variables-tab');
-            if (variablesTabBtn) new bootstrap.Tab(variablesTabBtn).show();
-            const panel = document.getElementById('batchResultsPanel');
-            if (panel) { panel.classList.add('show'); panel.classList.add('active'); }
-            
-            // 加载历史记录
+            resetBatchTable(data.batch_id, data.results.length, data.results.map(compactBatchRow));
+            showBatchResultsPanel();
             loadHistory();
         } else {
             alert('批量执行失败: ' + data.error);
@@ -609,6 +527,230 @@ function executeBatch() {
     });
 }
 
+// 订阅后台任务的事件流：执行中的行按 row_index 插入内存表，结束后改为按页从服务端读取
+function streamJob(jobId) {
+    if (batchEvents) batchEvents.close();
+    resetBatchTable(null, 0, []);
+    setJobCounters({ done: 0, success_count: 0, failure_count: 0 });
+    showBatchResultsPanel();
+
+    // 断线时 EventSource 自动重连，并用 Last-Event-ID 从上次的位置继续
+    const events = new EventSource(`/jobs/${jobId}/events`);
+    batchEvents = events;
+    const table = batchTable;
+    events.addEventListener('row', e => {
+        const row = compactBatchRow(JSON.parse(e.data));
+        const rows = table.rows;
+        let i = rows.length;
+        while (i > 0 && rows[i - 1].row_index > row.row_index) i--;
+        rows.splice(i, 0, row);
+        if (table === batchTable) scheduleBatchRender();
+    });
+    events.addEventListener('progress', e => {
+        const job = JSON.parse(e.data);
+        table.batchId = job.batch_id;
+        setJobCounters(job);
+    });
+    events.addEventListener('done', e => {
+        const job = JSON.parse(e.data);
+        setJobCounters(job);
+        events.close();
+        batchEvents = null;
+        if (table === batchTable) {
+            // 释放内存中的行，滚动位置不变
+            batchTable.batchId = job.batch_id;
+            batchTable.total = batchTable.rows.length;
+            batchTable.rows = null;
+            scheduleBatchRender();
+        }
+        if (job.status === 'failed') alert('批量执行失败: ' + job.error);
+        loadHistory();
+    });
+}
+
+function setJobCounters(job) {
+    const running = job.total && !job.finished_at;
+    document.getElementById('totalRowsResult').textContent = running ? `${job.done}/${job.total}` : job.done;
+    document.getElementById('successCountResult').textContent = job.success_count;
+    document.getElementById('failureCountResult').textContent = job.failure_count;
+}
+
+// 切回变量Tab并展示批量结果面板
+function showBatchResultsPanel() {
+    const variablesTabBtn = document.getElementById('variables-tab');
+    if (variablesTabBtn) new bootstrap.Tab(variablesTabBtn).show();
+    const panel = document.getElementById('batchResultsPanel');
+    if (panel) { panel.classList.add('show'); panel.classList.add('active'); }
+    scheduleBatchRender();
+}
+
+// 表格只保留展示需要的字段，请求/响应详情在查看时再从服务端读取
+function compactBatchRow(result) {
+    const response = result.response || {};
+    return {
+        row_index: result.row_index,
+        variables: result.variables,
+        code: response.status_code || response.code,
+        error: result.error,
+        success: result.success
+    };
+}
+
+// rows 为内存中的行（执行中或同步返回的结果）；为 null 时按页从 /get_result/<batchId>/rows 读取
+function resetBatchTable(batchId, total, rows) {
+    batchTable = {
+        batchId: batchId || null,
+        total: total || 0,
+        rows: rows || null,
+        pages: new Map(),
+        loading: new Set()
+    };
+    const scroll = document.getElementById('batchResultsScroll');
+    if (scroll) scroll.scrollTop = 0;
+    scheduleBatchRender();
+}
+
+function scheduleBatchRender() {
+    if (batchRenderPending) return;
+    batchRenderPending = true;
+    requestAnimationFrame(() => {
+        batchRenderPending = false;
+        renderBatchTable();
+    });
+}
+
+function getBatchRow(position) {
+    if (batchTable.rows) return batchTable.rows[position];
+    const page = Math.floor(position / BATCH_PAGE_SIZE);
+    const rows = batchTable.pages.get(page);
+    if (rows) return rows[position - page * BATCH_PAGE_SIZE];
+    loadBatchPage(page);
+    return null;
+}
+
+function loadBatchPage(page) {
+    const table = batchTable;
+    if (!table.batchId || table.loading.has(page)) return;
+    table.loading.add(page);
+    fetch(`/get_result/${encodeURIComponent(table.batchId)}/rows?offset=${page * BATCH_PAGE_SIZE}&limit=${BATCH_PAGE_SIZE}`)
+    .then(response => response.json())
+    .then(data => {
+        if (!data.success) return;
+        table.total = data.total;
+        table.pages.set(page, data.rows.map(compactBatchRow));
+        // 只缓存最近读取的若干页
+        if (table.pages.size > BATCH_MAX_PAGES) table.pages.delete(table.pages.keys().next().value);
+        if (table === batchTable) scheduleBatchRender();
+    })
+    .catch(error => console.error('加载结果行出错: ' + error))
+    .finally(() => table.loading.delete(page));
+}
+
+function renderBatchTable() {
+    const tableBody = document.getElementById('batchResultsBody');
+    const scroll = document.getElementById('batchResultsScroll');
+    if (!tableBody || !scroll || !batchTable) return;
+    const total = batchTable.rows ? batchTable.rows.length : batchTable.total;
+    const visible = Math.ceil(scroll.clientHeight / BATCH_ROW_HEIGHT) || 20;
+    const first = Math.max(0, Math.min(Math.floor(scroll.scrollTop / BATCH_ROW_HEIGHT), total) - BATCH_OVERSCAN);
+    const last = Math.min(total, first + visible + 2 * BATCH_OVERSCAN);
+
+    const fragment = document.createDocumentFragment();
+    fragment.appendChild(batchSpacerRow(first * BATCH_ROW_HEIGHT));
+    for (let i = first; i < last; i++) {
+        fragment.appendChild(batchRowElement(i, getBatchRow(i)));
+    }
+    fragment.appendChild(batchSpacerRow((total - last) * BATCH_ROW_HEIGHT));
+    tableBody.replaceChildren(fragment);
+}
+
+function batchSpacerRow(height) {
+    const tr = document.createElement('tr');
+    tr.className = 'batch-spacer';
+    const td = document.createElement('td');
+    td.colSpan = 5;
+    td.style.height = height + 'px';
+    tr.appendChild(td);
+    return tr;
+}
+
+function batchRowElement(position, row) {
+    const tr = document.createElement('tr');
+    if (!row) {
+        const td = document.createElement('td');
+        td.colSpan = 5;
+        td.className = 'text-muted';
+        td.textContent = '加载中…';
+        tr.appendChild(td);
+        return tr;
+    }
+
+    // 行号
+    const tdRow = document.createElement('td');
+    tdRow.textContent = row.row_index;
+    tr.appendChild(tdRow);
+
+    // 变量（单行显示，完整内容见详情）
+    const tdVars = document.createElement('td');
+    tdVars.className = 'batch-vars';
+    tdVars.textContent = JSON.stringify(row.variables);
+    tr.appendChild(tdVars);
+
+    // 状态码
+    const tdStatus = document.createElement('td');
+    if (row.code) {
+        tdStatus.textContent = row.code;
+    } else if (row.error) {
+        tdStatus.innerHTML = `<span class="text-danger">错误</span>`;
+    } else {
+        tdStatus.textContent = '未知';
+    }
+    tr.appendChild(tdStatus);
+
+    // 断言结果
+    const tdAssert = document.createElement('td');
+    if (row.success === true) {
+        tdAssert.innerHTML = `<span class="result-success">通过</span>`;
+    } else if (row.success === false) {
+        tdAssert.innerHTML = `<span class="result-failure">失败</span>`;
+    } else {
+        tdAssert.textContent = '无断言';
+    }
+    tr.appendChild(tdAssert);
+
+    // 操作
+    const tdAction = document.createElement('td');
+    const viewBtn = document.createElement('button');
+    viewBtn.className = 'btn btn-sm btn-info';
+    viewBtn.textContent = '查看详情';
+    viewBtn.dataset.position = position;
+    tdAction.appendChild(viewBtn);
+    tr.appendChild(tdAction);
+    return tr;
+}
+
+// 查看某一行时才读取完整结果（含响应 body）
+function showBatchRowDetail(position) {
+    const row = batchTable && getBatchRow(position);
+    if (!row) return;
+    if (!batchTable.batchId) {
+        showDetail(row);
+        return;
+    }
+    fetch(`/get_result/${encodeURIComponent(batchTable.batchId)}/rows?row_index=${row.row_index}&limit=1&expand=body`)
+    .then(response => response.json())
+    .then(data => {
+        if (data.success && data.rows.length) {
+            showDetail(data.rows[0]);
+        } else {
+            alert('加载结果详情失败: ' + (data.error || '行不存在'));
+        }
+    })
+    .catch(error => {
+        alert('加载结果详情出错: ' + error);
+    });
+}
+
 function clearHistory() {
     if (!confirm('确定清理所有历史记录吗？')) return;
     fetch('/clear_results', { method: 'POST' })
@@ -635,11 +777,17 @@ function stopHistoryAutoRefresh() {
     }
 }
 
-// 加载历史记录
+// 加载历史记录：带上次的 ETag 条件请求，历史没有变化时服务端返回 304，不重新渲染
 function loadHistory() {
-    fetch('/get_results')
-    .then(response => response.json())
+    const headers = historyEtag ? { 'If-None-Match': historyEtag } : {};
+    fetch('/get_results', { headers, cache: 'no-store' })
+    .then(response => {
+        if (response.status === 304) return null;
+        historyEtag = response.headers.get('ETag');
+        return response.json();
+    })
     .then(data => {
+        if (!data) return;
         if (data.success) {
             const tableBody = document.getElementById('historyTableBody');
             tableBody.innerHTML = '';
@@ -682,7 +830,7 @@ function loadHistory() {
                 viewBtn.className = 'btn btn-sm btn-info';
                 viewBtn.textContent = '查看';
                 viewBtn.addEventListener('click', () => {
-                    loadResultDetail(result.id);
+                    loadResultDetail(result);
                 });
                 tdAction.appendChild(viewBtn);
                 tr.appendChild(tdAction);
@@ -698,9 +846,21 @@ function loadHistory() {
     });
 }
 
-// 加载结果详情
-function loadResultDetail(resultId) {
-    fetch(`/get_result/${resultId}`)
+// 加载结果详情：批量结果在结果表中按页浏览，单次结果在详情框中展示
+function loadResultDetail(result) {
+    if (result.is_batch) {
+        if (batchEvents) {
+            batchEvents.close();
+            batchEvents = null;
+        }
+        document.getElementById('totalRowsResult').textContent = result.total_rows || 0;
+        document.getElementById('successCountResult').textContent = result.success_count || 0;
+        document.getElementById('failureCountResult').textContent = result.failure_count || 0;
+        resetBatchTable(result.id, result.total_rows || 0, null);
+        showBatchResultsPanel();
+        return;
+    }
+    fetch(`/get_result/${encodeURIComponent(result.id)}?expand=body`)
     .then(response => response.json())
     .then(data => {
         if (data.success) {
@@ -714,47 +874,59 @@ function loadResultDetail(resultId) {
     });
 }
 
-// 显示详情模态框
+// 显示详情模态框：请求、响应头、响应体等分区展示，每个分区在首次展开时才渲染
 function showDetail(data) {
-    // 优化显示：将请求与响应分区展示，headers/body/params 等
     const detailContent = document.getElementById('detailContent');
-    let viewModel;
-    // 批量
-    if (data && data.results && Array.isArray(data.results)) {
-        viewModel = {
-            type: 'batch',
-            batch_id: data.batch_id,
-            timestamp: data.timestamp,
-            curl_command_template: data.curl_command_template,
-            assertions: data.assertions,
-            total_rows: data.total_rows,
-            success_count: data.success_count,
-            failure_count: data.failure_count,
-            results: data.results.map(r => ({
-                row_index: r.row_index,
-                variables: r.variables,
-                request: r.request || {},
-                response: r.response || {},
-                assertions: r.assertions || [],
-                success: r.success
-            }))
-        };
-    } else {
-        // 单次
-        viewModel = {
-            type: 'single',
+    detailContent.replaceChildren();
+    const response = data.response || {};
+    const sections = [
+        ['概要', () => ({
             id: data.id,
+            row_index: data.row_index,
             timestamp: data.timestamp,
             curl_command: data.curl_command,
-            request: data.request || {},
             variables: data.variables,
-            response: data.response || {},
-            assertions: data.assertions || [],
-            success: data.success
+            success: data.success,
+            error: data.error,
+            assertions: data.assertions || []
+        })],
+        ['请求', () => data.request || {}],
+        ['响应头', () => response.headers || {}],
+        ['响应体', () => response.body],
+        ['其他', () => {
+            const rest = Object.assign({}, response);
+            delete rest.headers;
+            delete rest.body;
+            return rest;
+        }]
+    ];
+    sections.forEach(([title, build], i) => {
+        const details = document.createElement('details');
+        details.className = 'mb-2';
+        const summary = document.createElement('summary');
+        summary.textContent = title;
+        details.appendChild(summary);
+        const render = () => {
+            if (details.dataset.rendered) return;
+            details.dataset.rendered = '1';
+            const value = build();
+            const pre = document.createElement('pre');
+            pre.className = 'border p-2 bg-light';
+            if (value === undefined || value === null) {
+                pre.textContent = '(无)';
+            } else {
+                pre.textContent = typeof value === 'string' ? value : JSON.stringify(value, null, 2);
+            }
+            details.appendChild(pre);
         };
-    }
-    detailContent.textContent = JSON.stringify(viewModel, null, 2);
-    
+        details.addEventListener('toggle', () => { if (details.open) render(); });
+        if (i === 0) {
+            details.open = true;
+            render();
+        }
+        detailContent.appendChild(details);
+    });
+
     const modal = new bootstrap.Modal(document.getElementById('detailModal'));
     modal.show();
-}
\ No newline at end of file
+}
@@ -0,0 +1,251 @@
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import curl_executor as ce
+
+MODULE_PATH = os.path.abspath(ce.__file__)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # /slow 等待 2 秒；/status/<code> 返回指定状态码；/login?user=x 返回 token；其余返回 200 与请求路径
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        code = 200
+        payload = {'path': self.path}
+        if self.path.startswith('/slow'):
+            time.sleep(2)
+        elif self.path.startswith('/status/'):
+            code = int(self.path.split('/')[2])
+        elif self.path.startswith('/login'):
+            payload = {'token': 'tok-' + self.path.rsplit('=', 1)[-1]}
+        body = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{httpd.server_address[1]}'
+    httpd.shutdown()
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    # 结果与上传写到临时目录
+    for key, path in (('RESULTS_FOLDER', tmp_path / 'results'), ('UPLOAD_FOLDER', tmp_path / 'uploads'),
+                      ('BLOB_FOLDER', tmp_path / 'results' / 'blobs'),
+                      ('UPLOAD_CACHE_FOLDER', tmp_path / 'uploads' / '.cache')):
+        monkeypatch.setitem(ce.app.config, key, str(path))
+    monkeypatch.setitem(ce.app.config, 'RESULTS_INDEX', '')
+    os.makedirs(ce.app.config['RESULTS_FOLDER'])
+    os.makedirs(ce.app.config['UPLOAD_FOLDER'])
+    return tmp_path
+
+
+# ==== _run_rows ====
+
+def test_run_rows_returns_rows_in_index_order():
+    completed = []
+
+    def row_fn(row_index, variables, limiter, budget):
+        time.sleep(random.uniform(0, 0.02))
+        return {'row_index': row_index, 'variables': variables, 'success': True}
+
+    items = [(i, {'i': i}) for i in range(1, 41)]
+    results = ce._run_rows(items, row_fn, concurrency=8, sink=lambda r: completed.append(r['row_index']))
+    assert [r['row_index'] for r in results] == list(range(1, 41))
+    assert sorted(completed) == list(range(1, 41))
+
+
+def test_run_rows_skips_rows_after_deadline():
+    def row_fn(row_index, variables, limiter, budget):
+        time.sleep(0.2)
+        return {'row_index': row_index, 'variables': variables, 'success': True}
+
+    results = ce._run_rows([(i, {}) for i in range(1, 6)], row_fn, budget=ce._RowBudget(deadline=0.3))
+    statuses = [r.get('status') for r in results]
+    assert statuses[:2] == [None, None]
+    assert statuses[2:] == ['skipped'] * 3
+
+
+def test_run_rows_row_timeout_kills_the_request(server):
+    row_fn = ce._make_row_fn(f"curl -s '{server}/slow/{{{{i}}}}'", [], ce._batch_options({'timeout': 0.5}))
+    started = time.monotonic()
+    results = ce._run_rows([(1, {'i': 1}), (2, {'i': 2})], row_fn, concurrency=2,
+                           budget=ce._RowBudget(row_timeout=0.5))
+    assert time.monotonic() - started < 1.8
+    assert [(r['row_index'], r['status'], r['success']) for r in results] == [(1, 'timeout', False),
+                                                                               (2, 'timeout', False)]
+
+
+# ==== NDJSON 续跑 ====
+
+def test_batch_resume_runs_only_missing_rows(data_dir):
+    calls = []
+
+    def row_fn(row_index, variables, limiter, budget):
+        calls.append(row_index)
+        if row_index == 4 and len(calls) == 4:
+            raise RuntimeError('worker crashed')  # 模拟进程中途退出：不写 footer
+        return {'row_index': row_index, 'variables': variables, 'success': True}
+
+    items = [(i, {'i': i}) for i in range(1, 7)]
+    options = ce._batch_options({})
+    with pytest.raises(RuntimeError):
+        ce._execute_batch_rows('BATCH-T', {}, 'curl x', [], items, row_fn, options)
+    partial = ce._load_batch_document(ce._batch_result_path('BATCH-T'))
+    assert partial['complete'] is False
+    assert [r['row_index'] for r in partial['results']] == [1, 2, 3]
+
+    calls.clear()
+    document = ce._execute_batch_rows('BATCH-T', {}, 'curl x', [], items, row_fn, options, resume=True)
+    assert calls == [4, 5, 6]
+    assert document['complete'] is True
+    assert [r['row_index'] for r in document['results']] == [1, 2, 3, 4, 5, 6]
+    assert document['success_count'] == 6
+
+
+# ==== 模板 ====
+
+@pytest.mark.parametrize('template', [
+    "curl -X {{method}} '{{base}}/items/{{id}}?q={{q}}' -H 'Authorization: Bearer {{token}}' -d '{{body}}'",
+    'curl "{{base}}/x" -H "X-Id: {{id}}" --data-raw {{payload}}',
+    'curl -X POST ^"{{base}}/api^" -H ^"Content-Type: application/json^" --data-raw {{payload}}',
+    "curl {{base}}/plain {{extra}}",
+])
+@pytest.mark.parametrize('variables', [
+    {'method': 'put', 'base': 'http://h', 'id': 7, 'q': 'a b', 'token': 't', 'body': 'x', 'payload': {'k': [1, 'v']},
+     'extra': '-v'},
+    {'base': 'https://h:8443', 'id': "it's", 'payload': 'a"b', 'extra': 'http://other/'},
+    {},
+])
+def test_compiled_template_matches_replace_and_parse(template, variables):
+    rendered = ce.replace_variables(template, variables)
+    assert ce._compile_template(template).prepare(variables) == (rendered, ce._parse_curl_request(rendered))
+
+
+def test_render_rows_matches_prepare():
+    template = "curl '{{base}}/u/{{user}}' -d {{data}}"
+    rows = [{'base': 'http://h', 'user': 'a', 'data': {'n': 1}}, {'base': 'http://h', 'user': 'b', 'data': 'x'}]
+    compiled = ce._compile_template(template)
+    assert compiled.render_rows(['base', 'user', 'data'], rows) == [compiled.prepare(row) for row in rows]
+
+
+# ==== 熔断 ====
+
+def test_circuit_breaker_transitions():
+    breaker = ce._CircuitBreaker(threshold=2, cooldown=0.1)
+    url = 'http://svc/a'
+    assert breaker.acquire(url) == 'closed'
+    breaker.record(url, False)
+    assert breaker.acquire(url) == 'closed'
+    breaker.record(url, False)
+    assert breaker.acquire('http://svc/other') == 'open'  # 按主机熔断
+    assert breaker.acquire('http://elsewhere/') == 'closed'
+
+    time.sleep(0.12)
+    assert breaker.acquire(url) == 'half_open'
+    assert breaker.acquire(url) == 'open'  # 同一时刻只放行一个探测请求
+    breaker.record(url, False)
+    assert breaker.acquire(url) == 'open'  # 探测失败重新计时
+
+    time.sleep(0.12)
+    assert breaker.acquire(url) == 'half_open'
+    breaker.record(url, True)
+    assert breaker.acquire(url) == 'closed'
+
+
+def test_circuit_breaker_is_opt_in():
+    assert ce._batch_options({})['breaker']['threshold'] == 0
+    assert ce._batch_options({'circuit_breaker': True})['breaker']['threshold'] > 0
+
+
+# ==== 多步场景 ====
+
+def test_scenario_order_follows_dependencies():
+    scenario = ce._Scenario({'steps': [
+        {'name': 'report', 'curl': 'curl http://h/r/{{item}}', 'depends_on': ['audit']},
+        {'name': 'create', 'curl': 'curl http://h/c -H "T: {{token}}"', 'extract': {'item': 'json:id'}},
+        {'name': 'audit', 'curl': 'curl http://h/a'},
+        {'name': 'login', 'curl': 'curl http://h/login', 'extract': {'token': 'json:token'}},
+    ]})
+    order = [step.name for step in scenario.order]
+    assert order.index('login') < order.index('create') < order.index('report')
+    assert order.index('audit') < order.index('report')
+    assert {step.name: step.deps for step in scenario.steps}['report'] == {'audit', 'create'}
+
+
+@pytest.mark.parametrize('steps, message', [
+    ([{'name': 'a', 'curl': 'curl {{y}}', 'extract': {'x': 'json:a'}},
+      {'name': 'b', 'curl': 'curl {{x}}', 'extract': {'y': 'json:a'}}], 'cycle'),
+    ([{'name': 'a', 'curl': 'curl x', 'depends_on': ['a']}], 'itself'),
+    ([{'name': 'a', 'curl': 'curl x', 'depends_on': ['zz']}], 'unknown step'),
+    ([{'name': 'a', 'curl': 'curl x'}, {'name': 'a', 'curl': 'curl y'}], 'duplicate'),
+])
+def test_scenario_rejects_invalid_graphs(steps, message):
+    with pytest.raises(ValueError, match=message):
+        ce._Scenario({'steps': steps})
+
+
+def test_scenario_runs_steps_and_skips_dependents_of_failures(server):
+    scenario = ce._Scenario({'steps': [
+        {'name': 'login', 'curl': f"curl -s '{server}/login?user={{{{user}}}}'", 'extract': {'token': 'json:token'},
+         'cache': True},
+        {'name': 'profile', 'curl': f"curl -s '{server}/profile/{{{{token}}}}'",
+         'assertions': ['response.code == 200']},
+        {'name': 'broken', 'curl': f"curl -s '{server}/status/500'", 'assertions': ['response.code == 200'],
+         'depends_on': ['login']},
+        {'name': 'after', 'curl': f"curl -s '{server}/after'", 'depends_on': ['broken']},
+    ]})
+    row_fn = ce._make_scenario_row_fn(scenario, ce._batch_options({}))
+    results = ce._run_rows([(1, {'user': 'al'}), (2, {'user': 'al'})], row_fn, concurrency=2)
+    for row in results:
+        steps = {step['name']: step for step in row['steps']}
+        assert row['extracted']['token'] == 'tok-al'
+        assert steps['profile']['success'] is True
+        assert steps['broken']['success'] is False
+        assert steps['after']['status'] == 'skipped'
+        assert row['success'] is False
+    # 同一用户的登录只执行一次，另一行命中缓存
+    assert sorted(bool(row['steps'][0].get('cached')) for row in results) == [False, True]
+
+
+# ==== 命令行 ====
+
+def _cli(*args):
+    return subprocess.run([sys.executable, MODULE_PATH, 'run', *args], capture_output=True, text=True, timeout=60)
+
+
+@pytest.mark.parametrize('extra, code', [
+    ([], 0),
+    (['--require-assertions'], 1),
+    (['--assert', 'response.code == 200'], 0),
+    (['--assert', 'response.code == 201'], 1),
+])
+def test_cli_exit_codes(server, extra, code):
+    proc = _cli('--curl', f"curl -s '{server}/items/{{{{i}}}}'", '--var', 'i=1', '--iterations', '2', *extra)
+    assert proc.returncode == code, proc.stderr
+    rows = [json.loads(line) for line in proc.stdout.splitlines()]
+    assert sorted(row['row_index'] for row in rows) == [1, 2]
+    assert json.loads(proc.stderr.strip().splitlines()[-1])['total_rows'] == 2
+
+
+def test_cli_rejects_bad_arguments():
+    assert _cli('--curl', 'curl http://h', '--var', 'novalue').returncode == 2